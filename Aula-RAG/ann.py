@@ -0,0 +1,112 @@
+# ann.py
+"""
+Índice aproximado IVF (inverted file) en numpy puro, para corpus grandes.
+
+Se agrupan los vectores en `nlist` listas con k-means esférico. Al buscar,
+solo se puntúan las filas de las `nprobe` listas cuyos centroides están
+más cerca de la pregunta. Más nprobe = más recall y más latencia.
+"""
+import numpy as np
+
+from search import normalize_rows, top_k
+
+ANN_NPROBE = 16
+ANN_TRAIN_MAX = 200_000      # filas como mucho en la muestra de entrenamiento
+_ASSIGN_BLOCK_BYTES = 64 << 20
+
+
+def default_nlist(n: int) -> int:
+    """Regla habitual: unas 4·sqrt(n) listas (mínimo 1)."""
+    return max(1, int(4 * np.sqrt(n)))
+
+
+def _assign(matrix, centroids, batch: int | None = None) -> np.ndarray:
+    """
+    Lista (centroide más cercano) de cada fila, por lotes para acotar memoria:
+    por defecto, filas tales que el lote float32 y sus similitudes ocupen ~64 MB.
+    """
+    if batch is None:
+        batch = max(1, _ASSIGN_BLOCK_BYTES // (4 * (centroids.shape[1] + len(centroids))))
+    out = np.empty(len(matrix), dtype=np.int32)
+    for i in range(0, len(matrix), batch):
+        sims = np.asarray(matrix[i:i+batch], dtype=np.float32) @ centroids.T
+        out[i:i+batch] = sims.argmax(axis=1)
+    return out
+
+
+class IVFIndex:
+    """Centroides + filas agrupadas por lista (order[offsets[c]:offsets[c+1]])."""
+
+    def __init__(self, centroids, order, offsets):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def rows(self) -> int:
+        return len(self.order)
+
+    @classmethod
+    def build(cls, matrix, nlist: int | None = None, iters: int = 10,
+              sample: int | None = None, seed: int = 0):
+        """
+        Entrena k-means esférico sobre una muestra y asigna todas las filas.
+        `matrix` debe estar normalizada (como la escribe ingest).
+        """
+        n = len(matrix)
+        nlist = min(nlist or default_nlist(n), n)
+        rng = np.random.default_rng(seed)
+
+        # 64 filas por lista bastan para k-means; más solo alarga cada iteración
+        sample = min(n, sample or max(nlist, min(64 * nlist, ANN_TRAIN_MAX)))
+        idx = np.sort(rng.choice(n, size=sample, replace=False))
+        train = np.asarray(matrix[idx], dtype=np.float32)
+
+        centroids = train[rng.choice(len(train), size=nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = _assign(train, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, train)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            # Las listas vacías se re-siembran con puntos al azar
+            sums[empty] = train[rng.choice(len(train), size=int(empty.sum()))]
+            centroids = normalize_rows(sums)
+
+        assign = _assign(matrix, centroids)
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        counts = np.bincount(assign, minlength=nlist)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(centroids, order, offsets)
+
+    def _candidates(self, q, nprobe: int) -> np.ndarray:
+        probe = top_k(self.centroids @ q, nprobe)
+        return np.concatenate([self.order[self.offsets[c]:self.offsets[c+1]] for c in probe])
+
+    def search(self, matrix, qv, k: int = 3, nprobe: int = ANN_NPROBE, rows=None):
+        """
+        Como VectorIndex.search, pero solo sobre las listas más prometedoras.
+        Con `rows` (filtro por metadatos) se descartan los candidatos que no estén.
+        """
+        q = normalize_rows(np.asarray(qv).reshape(1, -1))[0]
+        cand = self._candidates(q, nprobe)
+        if rows is not None:
+            mask = np.zeros(self.rows, dtype=bool)
+            mask[rows] = True
+            cand = cand[mask[cand]]
+        rows = np.sort(cand)                          # lectura ordenada del memmap
+        scores = np.asarray(matrix[rows], dtype=np.float32) @ q
+        top = top_k(scores, k)
+        return rows[top], scores[top]
+
+    def save(self, path: str):
+        np.savez(path, centroids=self.centroids, order=self.order, offsets=self.offsets)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as z:
+            return cls(z["centroids"], z["order"], z["offsets"])
@@ -0,0 +1,148 @@
+# answer_cache.py
+import re
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from cache_utils import LRUCache, normalize_query
+from search import normalize_rows
+
+_NUMBERS = re.compile(r"\d+")
+
+
+class _SemGroup:
+    """
+    Vectores de las preguntas de un grupo en una matriz preasignada (crece
+    doblando): buscar es un producto matriz·vector, sin apilar nada.
+    """
+
+    def __init__(self, dim: int, capacity: int = 8):
+        self.vecs = np.empty((capacity, dim), dtype=np.float32)
+        self.expires = np.empty(capacity, dtype=np.float64)
+        self.keys = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, vec, expires: float) -> int:
+        n = len(self.keys)
+        if n == len(self.vecs):
+            self.vecs = np.concatenate([self.vecs, np.empty_like(self.vecs)])
+            self.expires = np.concatenate([self.expires, np.empty_like(self.expires)])
+        self.vecs[n] = vec
+        self.expires[n] = expires
+        self.keys.append(key)
+        return n
+
+    def remove(self, slot: int):
+        """Quita la fila `slot` moviendo ahí la última. Devuelve la clave movida (o None)."""
+        last = len(self.keys) - 1
+        moved = None
+        if slot != last:
+            self.vecs[slot] = self.vecs[last]
+            self.expires[slot] = self.expires[last]
+            self.keys[slot] = moved = self.keys[last]
+        self.keys.pop()
+        return moved
+
+
+class AnswerCache:
+    """
+    Caché de respuestas delante de run_rag, en dos niveles:
+      1. Exacto: (pregunta normalizada, tema, versión del prompt) → respuesta.
+      2. Semántico: si la pregunta nueva se parece (coseno >= threshold) a una
+         ya respondida con el mismo tema, versión de prompt y los mismos números,
+         se reutiliza. Los números van en el grupo porque "¿cuánto es 27+46?" y
+         "¿cuánto es 27+45?" tienen embeddings casi iguales y respuestas distintas.
+    Ambos niveles tienen TTL y un máximo de entradas (se expulsa la menos usada).
+    """
+
+    def __init__(self, max_items: int = 1024, ttl: float | None = 3600,
+                 threshold: float = 0.95):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.threshold = threshold
+        self.exact = LRUCache(max_items=max_items, ttl=ttl)
+        self._sem = OrderedDict()        # clave → [grupo, fila en el grupo, respuesta] (orden LRU)
+        self._groups = {}                # grupo → _SemGroup
+        self._lock = threading.Lock()
+        self.semantic_hits = 0
+
+    @staticmethod
+    def key(question: str, topic: str | None, version: str):
+        return (normalize_query(question), topic or "", version)
+
+    @staticmethod
+    def group(question: str, topic: str | None, version: str):
+        """Grupo semántico: tema, versión del prompt y números de la pregunta, en orden."""
+        return (topic or "", version, tuple(_NUMBERS.findall(question or "")))
+
+    def _drop(self, key):
+        """Quita `key` del nivel semántico (con el candado puesto)."""
+        group, slot, _ = self._sem.pop(key)
+        g = self._groups[group]
+        moved = g.remove(slot)
+        if moved is not None:
+            self._sem[moved][1] = slot
+        if not len(g):
+            del self._groups[group]
+
+    def get(self, question: str, topic: str | None, version: str, qv=None):
+        """Respuesta cacheada o None. Con `qv` (embedding de la pregunta) prueba también el nivel semántico."""
+        key = self.key(question, topic, version)
+        ans = self.exact.get(key)
+        if ans is not None or qv is None or self.threshold >= 1.0:
+            return ans
+
+        group = self.group(question, topic, version)
+        q = normalize_rows(np.asarray(qv).reshape(1, -1))[0]
+        now = time.monotonic()
+        with self._lock:
+            g = self._groups.get(group)
+            if g is None:
+                return None
+            n = len(g)
+            expired = np.flatnonzero(g.expires[:n] <= now)
+            for slot in expired[::-1]:          # de mayor a menor: las filas movidas ya están vistas
+                self._drop(g.keys[slot])
+            if group not in self._groups:
+                return None
+            sims = g.vecs[:len(g)] @ q
+            best = int(sims.argmax())
+            if sims[best] < self.threshold:
+                return None
+            best_key = g.keys[best]
+            self._sem.move_to_end(best_key)
+            self.semantic_hits += 1
+            return self._sem[best_key][2]
+
+    def put(self, question: str, topic: str | None, version: str, answer: str, qv=None):
+        key = self.key(question, topic, version)
+        self.exact.put(key, answer)
+        if qv is None:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else np.inf
+        group = self.group(question, topic, version)
+        vec = normalize_rows(np.asarray(qv).reshape(1, -1))[0]
+        with self._lock:
+            if key in self._sem:
+                self._drop(key)
+            g = self._groups.get(group)
+            if g is None:
+                g = self._groups[group] = _SemGroup(len(vec))
+            self._sem[key] = [group, g.add(key, vec, expires), answer]
+            while len(self._sem) > self.max_items:
+                self._drop(next(iter(self._sem)))
+
+    def clear(self):
+        self.exact.clear()
+        with self._lock:
+            self._sem.clear()
+            self._groups.clear()
+
+    def stats(self) -> dict:
+        st = self.exact.stats()
+        st["semantic_hits"] = self.semantic_hits
+        st["semantic_items"] = len(self._sem)
+        return st
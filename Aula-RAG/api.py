@@ -1,15 +1,23 @@
 # api.py
 import os
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
+import json
+import time
+import uuid
+import hmac
 import asyncio
+from fastapi import FastAPI, HTTPException, Header
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse
+from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from app import run_rag, ensure_tables, init_index, VIDEO_DIR
+from contextlib import asynccontextmanager
+from app import (arun_rag, arun_rag_stream, startup, cache_stats, VIDEO_DIR,
+                 get_async_client, close_async_client, limite, TIMEOUTS, INTERACTION_LOG,
+                 SNAPSHOTS, reload_index)
 from pydantic import BaseModel
-from uuid import uuid4
-from openai import OpenAI
+from audio_cache import AudioCache, audio_key
+import metrics
+from metrics import timed
 
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 AUDIO_DIR = os.path.join(APP_DIR, "audio")
@@ -21,23 +29,96 @@ os.makedirs(AUDIO_DIR, exist_ok=True)
 # =========================
 load_dotenv()
 
-# Inicializamos BD e índice RAG al arrancar
-# Nos aseguramos de que todo está inicializado al arrancar el servidor
-ensure_tables()
-init_index()
+# La BD y el índice RAG se inicializan en el lifespan (app.startup), no al importar
 
-# Cliente OpenAI (usa OPENAI_API_KEY del .env)
-client = OpenAI()
+# Los clientes OpenAI (usan OPENAI_API_KEY del .env) viven en app.py
 
 # Carpeta donde guardaremos los archivos de audio
 AUDIO_DIR = "audio"
 os.makedirs(AUDIO_DIR, exist_ok=True)
 
+# Token para /admin/reload (cabecera X-Admin-Token). Sin token, el endpoint está desactivado
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+TTS_MODEL = "gpt-4o-mini-tts"
+TTS_VOICE = "alloy"
+
+# Caché de audios por contenido, con presupuesto de disco (AUDIO_CACHE_MAX_MB) para
+# toda la carpeta, compartida entre workers (se relee cada AUDIO_CACHE_RESCAN s)
+AUDIO_CACHE = AudioCache(AUDIO_DIR, max_bytes=int(float(os.getenv("AUDIO_CACHE_MAX_MB", "500")) * 1024 * 1024),
+                         rescan=float(os.getenv("AUDIO_CACHE_RESCAN", "30")))
+
+
+@metrics.register_gauges
+def _audio_gauges():
+    st = AUDIO_CACHE.stats()
+    return [
+        ("aula_cache_hit_ratio", "Aciertos / consultas de cada caché.", {"cache": "audio"}, st["hit_ratio"]),
+        ("aula_cache_hits", "Aciertos acumulados de cada caché.", {"cache": "audio"}, st["hits"]),
+        ("aula_cache_misses", "Fallos acumulados de cada caché.", {"cache": "audio"}, st["misses"]),
+        ("aula_audio_cache_bytes", "Bytes ocupados por la caché de audio.", {}, st["bytes"]),
+    ]
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: da a cada petición un id (X-Request-Id, se respeta el del
+    cliente si lo manda), cuenta peticiones y errores por ruta, mide la duración
+    total y, al terminar la respuesta (también en streaming), imprime una línea
+    con el tiempo de cada etapa.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        rid = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex
+        metrics.start_request(rid)
+        t0 = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", rid.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            dt = time.perf_counter() - t0
+            route = getattr(scope.get("route"), "path", None) or "other"
+            metrics.REQUESTS.inc(route=route, method=scope["method"], status=status)
+            metrics.REQUEST_SECONDS.observe(dt, route=route)
+            if status >= 500:
+                metrics.ERRORS.inc(stage="http", route=route)
+            if route != "/metrics":
+                etapas = " ".join(f"{n}={d * 1000:.1f}ms" for n, d in metrics.request_stages())
+                print(f"[REQ] {rid} {scope['method']} {route} {status} {dt * 1000:.1f}ms {etapas}")
+
 
 #CREAR LA APP FASTAPI
 #=====================#
 
-app = FastAPI(title="AULA RAG API")
+@asynccontextmanager
+async def lifespan(app):
+    startup()                  # tablas e índice (si el maestro de gunicorn ya lo cargó, no hace nada)
+    INTERACTION_LOG.start()
+    SNAPSHOTS.start()          # vigila vecs/CURRENT y cambia de índice sin reiniciar
+    yield
+    # Al parar: cerrar el pool HTTP compartido con OpenAI y vaciar el registro pendiente
+    SNAPSHOTS.stop()
+    await close_async_client()
+    INTERACTION_LOG.stop()
+
+app = FastAPI(title="AULA RAG API", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 # Servir vídeos locales si los usas desde VIDEO_DIR
 
@@ -51,29 +132,35 @@ if os.path.isdir(VIDEO_DIR):
 #FUNCIÓN PARA GENERAR EL ARCHIVO DE AUDIO
 #========================================#
 
-def generar_audio(texto: str) -> str | None:
+async def generar_audio(texto: str) -> str | None:
     """
     Genera un MP3 con la respuesta usando OpenAI TTS.
     Devuelve SOLO el nombre del archivo (ej. 'abcd1234.mp3').
+    Si ese mismo texto ya se leyó con la misma voz y modelo, reutiliza el MP3.
     """
     if not texto:
         return None
 
-    filename = f"{uuid4().hex}.mp3"
-    filepath = os.path.join(AUDIO_DIR, filename)
-    print("[TTS] Guardando audio en:", filepath)
+    filename = audio_key(texto, TTS_VOICE, TTS_MODEL)
+    # La caché de audio toca el disco: fuera del bucle de eventos
+    if await asyncio.to_thread(AUDIO_CACHE.get, filename):
+        print("[TTS] Audio en caché:", filename)
+        return filename
+
+    print("[TTS] Guardando audio en:", os.path.join(AUDIO_DIR, filename))
 
     try:
         # Modelo TTS de OpenAI (ajusta si usas otro)
-        speech = client.audio.speech.create(
-            model="gpt-4o-mini-tts",
-            voice="alloy",
-            input=texto,
-        )
-        # En el client nuevo: speech.read() devuelve los bytes
-        with open(filepath, "wb") as f:
-            f.write(speech.read())
-        return filename
+        async with limite("tts"):
+            with timed("tts"):
+                speech = await get_async_client().audio.speech.create(
+                    model=TTS_MODEL,
+                    voice=TTS_VOICE,
+                    input=texto,
+                    timeout=TIMEOUTS["tts"],
+                )
+        # speech.content son los bytes del MP3
+        return await asyncio.to_thread(AUDIO_CACHE.put, filename, speech.content)
     except Exception as e:
         print("[TTS] Error generando audio:", e)
         return None
@@ -104,6 +191,36 @@ def home():
     """
     return {"status": "AulaWrite API OK", "version": "1.0"}
 
+#GET
+@app.get("/stats")
+def stats():
+    """
+    Aciertos y fallos de las cachés del RAG y contadores del registro de interacciones.
+    """
+    return {**cache_stats(), "audio": AUDIO_CACHE.stats(), "interaction_log": INTERACTION_LOG.stats(),
+            "index": SNAPSHOTS.stats()}
+
+#POST
+@app.post("/admin/reload")
+def admin_reload(force: bool = False, x_admin_token: str | None = Header(default=None)):
+    """
+    Carga ya la generación del índice que indica vecs/CURRENT (sin esperar
+    al hilo que la vigila). Con force=true la recarga aunque no haya cambiado.
+    Las preguntas en curso terminan con el índice anterior.
+    """
+    if not ADMIN_TOKEN or not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="No autorizado")
+    return reload_index(force=force)
+
+#GET
+@app.get("/metrics")
+def get_metrics():
+    """
+    Métricas en formato de texto de Prometheus: latencia por etapa
+    (aula_stage_seconds), peticiones y errores por ruta y ratios de las cachés.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 #GET
 @app.get("/audio/{filename}")
 def get_audio(filename:str):
@@ -131,11 +248,11 @@ async def ask_rag(q: RAGQuery):
       - video_url: vídeo educativo local (si hay)
       - audio_url: URL del mp3 con la respuesta leída
     """
-    # 1) Ejecutar el RAG en un hilo aparte
-    answer, video_url = await asyncio.to_thread(run_rag, q.question)
+    # 1) Ejecutar el RAG (asíncrono: no ocupa un hilo mientras espera a OpenAI)
+    answer, video_url = await arun_rag(q.question)
 
-    # 2) Generar el audio también en un hilo aparte
-    audio_filename = await asyncio.to_thread(generar_audio, answer)
+    # 2) Generar el audio
+    audio_filename = await generar_audio(answer)
 
     # 3) Construir la URL del audio (completa o relativa)
     audio_url = None
@@ -150,4 +267,41 @@ async def ask_rag(q: RAGQuery):
         answer=answer,
         video_url=video_url,
         audio_url=audio_url
-    )
\ No newline at end of file
+    )
+
+def _sse(event: str, data: dict) -> str:
+    """Formatea un evento Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+#ENDPOINT DEL RAG EN STREAMING (POST, Server-Sent Events)
+@app.post("/ask/stream")
+async def ask_rag_stream(q: RAGQuery):
+    """
+    Igual que /ask, pero la respuesta llega a trozos según se genera:
+      - event: token  → {"text": "..."}  (texto ya corregido)
+      - event: done   → {"answer", "video_url", "audio_url"}
+      - event: error  → {"detail": "..."}
+    """
+    async def eventos():
+        try:
+            async for ev in arun_rag_stream(q.question):
+                if ev[0] == "token":
+                    yield _sse("token", {"text": ev[1]})
+                else:
+                    _, answer, video_url = ev
+                    audio_filename = await generar_audio(answer)
+                    yield _sse("done", {
+                        "answer": answer,
+                        "video_url": video_url,
+                        "audio_url": f"/audio/{audio_filename}" if audio_filename else None,
+                    })
+        except Exception as e:
+            print("[STREAM] Error:", e)
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
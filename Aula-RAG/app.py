@@ -1,15 +1,32 @@
 # app.py
-import os, sqlite3, numpy as np
-import gradio as gr
+import os, numpy as np
+import asyncio
 import re
 import unicodedata
-from openai import OpenAI
 from dotenv import load_dotenv
-from sklearn.metrics.pairwise import cosine_similarity
 import time
-import pandas as pd
-import glob
-
+from vector_store import open_store
+from search import VectorIndex, reciprocal_rank_fusion
+from lexical import LexicalIndex, ensure_fts
+from partitions import RowPartitions
+from docstore import DocStore
+from index_snapshot import IndexSnapshot, SnapshotManager
+import sqlite3
+from ann import IVFIndex, ANN_NPROBE
+from quant import QuantizedVectors, QUANT_KINDS
+from emb_cache import QueryEmbeddingCache, text_hash
+from answer_cache import AnswerCache
+import db
+import atexit
+from interaction_log import InteractionLogger
+from metrics import timed, register_gauges, RETRIEVALS
+from video_catalog import VideoCatalog
+from correcciones import Corrector
+
+# Gradio y openai se importan solo cuando hacen falta (interfaz web, clientes):
+# importar app no cuesta segundos; startup() hace el resto.
+
+load_dotenv()   # antes de leer cualquier variable de entorno de este módulo
 
 
 USE_GRADIO=False #Esto es para activar Gradio (la versión web del RAG)
@@ -18,26 +35,187 @@ USE_GRADIO=False #Esto es para activar Gradio (la versión web del RAG)
 # --- al principio del archivo ---
 
 DB = "db.sqlite"
-VECS = "vecs/all_emb.npy"
+VECS_DIR = "vecs"                  # generaciones del índice (ver index_snapshot.py)
+VECS = "vecs/all_emb.npy"          # formato antiguo (np.save), solo como respaldo
+VECS_STORE = "vecs/all_emb.vst"    # almacén mmap (vector_store.py), sin generaciones
+ANN_PATH = "vecs/ivf.npz"          # índice aproximado opcional (ingest.py --ann), sin generaciones
+# Primera pasada sobre vectores cuantizados (ingest.py --quant): "", "int8" o "binary"
+VECS_QUANT = os.getenv("VECS_QUANT", "").strip().lower()
+QUANT_RESCORE = int(os.getenv("QUANT_RESCORE", "0")) or None    # lista corta = k · esto (0 = por defecto)
+
+def _load_snapshot(generation: str | None) -> IndexSnapshot:
+    """
+    Carga una generación completa (vectores + filas + BM25 de la misma carpeta).
+    Sin generaciones (índice anterior), usa vecs/ y las tablas de db.sqlite.
+    Si los ids de los vectores no cuadran con las filas, no se carga.
+    """
+    if generation is None:
+        store_path, npy_path, ann_path, db_path = VECS_STORE, VECS, ANN_PATH, DB
+        gen_dir = VECS_DIR
+    else:
+        gen_dir = os.path.join(VECS_DIR, generation)
+        store_path = os.path.join(gen_dir, "all_emb.vst")
+        npy_path = None
+        ann_path = os.path.join(gen_dir, "ivf.npz")
+        db_path = os.path.join(gen_dir, "index.sqlite")
+
+    matrix, normalized, ids = _load_vectors(store_path, npy_path)
+    con = sqlite3.connect(db_path)
+    try:
+        docs = _load_docs(con)
+    finally:
+        con.close()
+    if ids is not None and not np.array_equal(ids, docs.ids):
+        if generation is not None:
+            raise ValueError("los ids de los vectores no coinciden con las filas de la generación")
+        print("[INDEX] WARN: los ids del almacén de vectores no coinciden con la BD; "
+              "vuelve a ejecutar ingest.py")
+    ann = _load_ann(ann_path, len(matrix))
+    quant = _load_quant(gen_dir, ids, normalized)
+    if ann is not None and quant is not None:
+        print(f"[INDEX] WARN: hay índice ANN; se ignora VECS_QUANT={VECS_QUANT} (son excluyentes)")
+        quant = None
+    index = VectorIndex(matrix, normalized=normalized, ann=ann,
+                        nprobe=int(os.getenv("ANN_NPROBE", ANN_NPROBE)), quant=quant)
+    return IndexSnapshot(generation, docs, index, _load_lexical(db_path, docs), db_path)
+
+def _load_vectors(store_path: str, npy_path: str | None):
+    """
+    Abre el almacén de vectores con np.memmap (sin copiar a memoria: la
+    caché de páginas del SO se comparte entre workers). Si solo existe el
+    .npy antiguo, lo carga entero como antes.
+    Devuelve (matriz, normalizada, ids o None).
+    """
+    if os.path.exists(store_path) or npy_path is None:
+        store = open_store(store_path)
+        return store.matrix, store.normalized, np.asarray(store.ids)
+    return np.load(npy_path), False, None
+
+def _load_ann(path: str, rows: int):
+    """Carga el índice IVF si existe y corresponde a los vectores actuales."""
+    if not os.path.exists(path):
+        return None
+    ivf = IVFIndex.load(path)
+    if ivf.rows != rows:
+        print(f"[INDEX] WARN: el índice ANN tiene {ivf.rows} filas y hay {rows}; se ignora")
+        return None
+    print(f"[INDEX] Búsqueda aproximada IVF ({ivf.nlist} listas)")
+    return ivf
 
-DF_DOCS = None        # cache global
-VECS_M = None         # cache global (numpy array)
+def _load_quant(folder: str, ids, normalized: bool):
+    """Códigos cuantizados de VECS_QUANT si existen y corresponden a los vectores actuales."""
+    if not VECS_QUANT:
+        return None
+    if VECS_QUANT not in QUANT_KINDS:
+        print(f"[INDEX] WARN: VECS_QUANT={VECS_QUANT} desconocido (opciones: {', '.join(QUANT_KINDS)})")
+        return None
+    loaded = QuantizedVectors.load(folder, VECS_QUANT, rescore=QUANT_RESCORE) if normalized else None
+    if loaded is None:
+        print(f"[INDEX] WARN: no hay vectores {VECS_QUANT} en {folder} (ingest.py --quant); búsqueda exacta")
+        return None
+    quant, qids = loaded
+    if ids is None or not np.array_equal(qids, ids):
+        print(f"[INDEX] WARN: los vectores {VECS_QUANT} no coinciden con el almacén; se ignoran")
+        return None
+    print(f"[INDEX] Primera pasada {quant.kind} ({quant.nbytes / 2**20:.1f} MB), "
+          f"re-puntuación de k·{quant.rescore}")
+    return quant
+
+def _load_lexical(db_path: str, docs):
+    """Índice BM25 (FTS5) alineado con las filas. Si SQLite no trae FTS5, solo habrá búsqueda vectorial."""
+    try:
+        con = sqlite3.connect(db_path)
+        try:
+            ensure_fts(con)
+        finally:
+            con.close()
+    except sqlite3.Error as e:
+        print("[INDEX] WARN: sin búsqueda léxica (FTS5):", e)
+        return None
+    return LexicalIndex(db_path, ids=docs.ids)
+
+def _load_docs(con) -> DocStore:
+    """
+    Filas indexadas (alineadas con VECS): los trozos de `chunks` con los
+    metadatos de su documento padre. Si la BD es anterior al troceado,
+    se usan los documentos completos de `docs`.
+    """
+    has_chunks = con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='chunks'"
+    ).fetchone()
+    if has_chunks:
+        return DocStore.from_query(con, """
+            SELECT c.id, c.doc_id, d.kind, d.title, d.topic, d.grade, c.heading, c.text
+            FROM chunks c JOIN docs d ON d.id = c.doc_id
+            ORDER BY c.id
+        """)
+    return DocStore.from_query(con, "SELECT * FROM docs ORDER BY id")
+
+def _al_cambiar_indice(prev, snap):
+    # Las respuestas cacheadas se generaron con el contenido anterior
+    ANSWER_CACHE.clear()
+
+# Índice activo: se recarga en caliente cuando ingest.py publica una generación nueva
+SNAPSHOTS = SnapshotManager(_load_snapshot, VECS_DIR,
+                            interval=float(os.getenv("INDEX_POLL_INTERVAL", "10")),
+                            on_swap=_al_cambiar_indice)
 
 def init_index():
-    global DF_DOCS, VECS_M
-    if VECS_M is None:
-        VECS_M = np.load(VECS)              # <-- carga una vez
-    if DF_DOCS is None:
-        con = sqlite3.connect(DB)
-        DF_DOCS = pd.read_sql_query("SELECT * FROM docs ORDER BY id", con)
-        con.close()
+    """Carga el índice la primera vez (después lo mantiene SNAPSHOTS)."""
+    return SNAPSHOTS.get()
+
+def startup():
+    """
+    Inicialización explícita del servicio: tablas de la BD e índice RAG.
+    Importar este módulo no carga nada; la llaman el lifespan de api.py,
+    gunicorn.conf.py (en el maestro, con preload_app) y la interfaz Gradio.
+    Se puede llamar más de una vez.
+    """
+    t0 = time.perf_counter()
+    import openai  # noqa: F401  (se importa aquí, no en la primera pregunta)
+    ensure_tables()
+    snap = init_index()
+    print(f"[STARTUP] Listo: {len(snap)} filas en el índice ({time.perf_counter() - t0:.2f}s)")
+    return snap
+
+def reload_index(force: bool = False) -> dict:
+    """Carga ya la generación de vecs/CURRENT si ha cambiado (para /admin/reload)."""
+    return SNAPSHOTS.reload(force=force)
+
+_client = None
+
+def get_client() -> "OpenAI":
+    """Cliente síncrono (se crea la primera vez que se usa, con OPENAI_API_KEY del .env)."""
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI()
+    return _client
+
+EMB_MODEL = "text-embedding-3-small"
+
+# Caché de embeddings de preguntas: LRU en memoria + SQLite opcional (QUERY_CACHE_DB)
+QUERY_EMB_CACHE = QueryEmbeddingCache(
+    max_items=int(os.getenv("QUERY_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("QUERY_CACHE_TTL", "86400")) or None,
+    persist_path=os.getenv("QUERY_CACHE_DB") or None,
+)
 
-init_index()  # <-- llama una sola vez al arrancar
+# Registro de interacciones en segundo plano (cola acotada + escritor por lotes)
+INTERACTION_LOG = InteractionLogger(
+    DB,
+    max_queue=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+    batch_size=int(os.getenv("LOG_BATCH_SIZE", "200")),
+    interval=float(os.getenv("LOG_FLUSH_INTERVAL", "1.0")),
+)
+atexit.register(INTERACTION_LOG.stop)
 
-load_dotenv()
-DB = "db.sqlite"
-VECS = "vecs/all_emb.npy"
-client = OpenAI()
+# Caché de respuestas de run_rag: exacta + semántica (similitud >= ANSWER_CACHE_SIM)
+ANSWER_CACHE = AnswerCache(
+    max_items=int(os.getenv("ANSWER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")) or None,
+    threshold=float(os.getenv("ANSWER_CACHE_SIM", "0.95")),
+)
 
 
 def run_rag(question: str) -> tuple[str,str | None]:
@@ -52,6 +230,81 @@ def run_rag(question: str) -> tuple[str,str | None]:
     es algo como '/videos/archivo.mp4' o None si no hay vídeo.
     
     """
+    uid, tema_norm, qv, lexica = _preparar_pregunta(question)
+    with timed("answer_cache"):
+        resp = ANSWER_CACHE.get(question, tema_norm, PROMPT_VERSION, qv)
+
+    if resp is None:
+        # Generamos la respuesta igual que en on_duda
+        resp = generar_respuesta(q=question, intent="duda", topic=tema_norm, lexica=lexica)
+        ANSWER_CACHE.put(question, tema_norm, PROMPT_VERSION, resp, qv)
+
+    # Registramos la interacción si hay usuario
+    try:
+        if uid is not None:
+            registrar_interaccion(uid, question, resp, "duda", tema_norm or "", None)
+    except Exception as e:
+        print("[registrar_interaccion] WARN en run_rag:", e)
+
+    # Buscar vídeo igual que en on_duda
+    video_url = _video_url(tema_norm, question)
+
+    return resp, video_url
+
+
+def run_rag_stream(question: str):
+    """
+    Versión en streaming de run_rag (para /ask/stream).
+    Generador que produce ("token", texto) según llega la respuesta del modelo,
+    ya corregida por tramos, y al final ("done", respuesta_completa, video_url).
+    """
+    uid, tema_norm, qv, lexica = _preparar_pregunta(question)
+    with timed("answer_cache"):
+        resp = ANSWER_CACHE.get(question, tema_norm, PROMPT_VERSION, qv)
+
+    if resp is not None:
+        yield "token", resp
+    else:
+        partes = []
+        for texto in generar_respuesta_stream(q=question, intent="duda", topic=tema_norm, lexica=lexica):
+            partes.append(texto)
+            yield "token", texto
+        resp = "".join(partes)
+        ANSWER_CACHE.put(question, tema_norm, PROMPT_VERSION, resp, qv)
+
+    try:
+        if uid is not None:
+            registrar_interaccion(uid, question, resp, "duda", tema_norm or "", None)
+    except Exception as e:
+        print("[registrar_interaccion] WARN en run_rag_stream:", e)
+
+    yield "done", resp, _video_url(tema_norm, question)
+
+
+def _preparar_pregunta(question: str):
+    """
+    Pasos comunes de run_rag y run_rag_stream antes de generar la respuesta.
+    Devuelve (uid, tema_norm, qv, lexica); `lexica` (ver _lexica_pregunta)
+    se pasa a retrieve para no repetir la búsqueda BM25.
+    """
+    uid, tema_norm = _datos_pregunta(question)
+
+    # Embedding para la caché semántica de respuestas.
+    # Queda en QUERY_EMB_CACHE, así que retrieve no lo vuelve a pedir.
+    # Si basta con la búsqueda léxica no se pide (solo se usa la caché exacta).
+    lexica = _lexica_pregunta(question, topic=tema_norm)
+    if lexica[3] and LEXICAL_FAST_PATH:
+        return uid, tema_norm, None, lexica
+    try:
+        qv = embed(question)
+    except Exception as e:
+        print("[embed] WARN en run_rag:", e)
+        qv = None
+    return uid, tema_norm, qv, lexica
+
+
+def _datos_pregunta(question: str):
+    """Índice/tablas listos, usuario de la API y tema detectado. Devuelve (uid, tema_norm)."""
     # Asegura que el índice y las tablas están listos
     init_index()
     ensure_tables()
@@ -65,88 +318,407 @@ def run_rag(question: str) -> tuple[str,str | None]:
     # Inferimos tema a partir del texto
     tema_detectado = infer_topic_from_text(question)  # puede ser None
     tema_norm = normalize_topic_for_video(tema_detectado or "")
+    return uid, tema_norm
 
-    # Generamos la respuesta igual que en on_duda
-    resp = generar_respuesta(q=question, intent="duda", topic=tema_norm)
 
-    # Registramos la interacción si hay usuario
+def _video_url(tema_norm: str, question: str) -> str | None:
+    """URL relativa ('/videos/archivo.mp4') del vídeo más adecuado, o None."""
+    with timed("video"):
+        vid_path = find_local_video(tema_norm, question)
+    if vid_path is None:
+        return None
+    # Solo el nombre del archivo, la ruta la sirve FastAPI en /videos
+    return f"/videos/{os.path.basename(vid_path)}"
+
+
+# ============ Ruta asíncrona (FastAPI) ============
+# Un único AsyncOpenAI con pool HTTP compartido: cada /ask en vuelo es una
+# corrutina y no ocupa un hilo. Cada etapa tiene su timeout y su límite
+# de concurrencia (semáforo), configurables por entorno.
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+TIMEOUTS = {
+    "embed": float(os.getenv("TIMEOUT_EMBED", "10")),
+    "chat": float(os.getenv("TIMEOUT_CHAT", "60")),
+    "tts": float(os.getenv("TIMEOUT_TTS", "60")),
+}
+MAX_CONCURRENT = {
+    "embed": int(os.getenv("MAX_CONCURRENT_EMBED", "64")),
+    "chat": int(os.getenv("MAX_CONCURRENT_CHAT", "32")),
+    "tts": int(os.getenv("MAX_CONCURRENT_TTS", "16")),
+}
+
+_aclient = None
+_semaforos = {}
+
+def get_async_client() -> "AsyncOpenAI":
+    """Cliente asíncrono compartido (se crea la primera vez que se usa)."""
+    global _aclient
+    if _aclient is None:
+        import httpx
+        from openai import AsyncOpenAI
+        http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                                max_keepalive_connections=OPENAI_MAX_CONNECTIONS),
+            timeout=httpx.Timeout(max(TIMEOUTS.values()), connect=5.0),
+        )
+        _aclient = AsyncOpenAI(http_client=http)
+    return _aclient
+
+async def close_async_client():
+    global _aclient
+    if _aclient is not None:
+        await _aclient.close()
+        _aclient = None
+
+def limite(etapa: str) -> asyncio.Semaphore:
+    """Semáforo que acota cuántas llamadas de una etapa hay a la vez."""
+    if etapa not in _semaforos:
+        _semaforos[etapa] = asyncio.Semaphore(MAX_CONCURRENT[etapa])
+    return _semaforos[etapa]
+
+async def aembed(q: str) -> np.ndarray:
+    """Versión asíncrona de embed (misma caché)."""
+    with timed("embed"):
+        key = QUERY_EMB_CACHE.key(q)
+        v = await QUERY_EMB_CACHE.aget(EMB_MODEL, key)
+        if v is None:
+            async with limite("embed"):
+                r = await get_async_client().embeddings.create(
+                    model=EMB_MODEL, input=key or q, timeout=TIMEOUTS["embed"])
+            v = np.array(r.data[0].embedding, dtype=np.float32)
+            await QUERY_EMB_CACHE.aput(EMB_MODEL, key, v)
+    return v.reshape(1,-1)
+
+_embeds_en_vuelo = {}
+
+async def _aembed_con_plazo(q: str):
+    """
+    aembed con plazo (EMBED_BUDGET segundos). Si tarda más o falla devuelve
+    None; la llamada sigue en segundo plano y deja el vector en la caché.
+    Las peticiones a la vez para la misma pregunta comparten una sola llamada.
+    """
+    key = QUERY_EMB_CACHE.key(q)
+    tarea = _embeds_en_vuelo.get(key)
+    if tarea is None:
+        tarea = _embeds_en_vuelo[key] = asyncio.ensure_future(aembed(q))
+        tarea.add_done_callback(lambda t: (_embeds_en_vuelo.pop(key, None),
+                                           t.cancelled() or t.exception()))
+    try:
+        return await asyncio.wait_for(asyncio.shield(tarea), EMBED_BUDGET)
+    except asyncio.TimeoutError:
+        print(f"[embed] WARN: más de {EMBED_BUDGET}s, se sigue sin embedding")
+    except Exception as e:
+        print("[embed] WARN:", e)
+    return None
+
+async def aretrieve(q: str, k: int = 3, topic: str | None = None, grade: str | None = None,
+                    lexica=None) -> str:
+    # BM25 (FTS5, SQLite) en un hilo: no para el bucle de eventos
+    snap, filas, lex, segura = lexica or await asyncio.to_thread(_lexica_pregunta, q, k, topic, grade)
+    if segura and LEXICAL_FAST_PATH:
+        RETRIEVALS.inc(mode="lexical")
+        return _format_context(snap, lex[:k])
+    qv = await _aembed_con_plazo(q) if lex else await aembed(q)
+    if qv is None:
+        RETRIEVALS.inc(mode="lexical_fallback")
+        return _format_context(snap, lex[:k])
+    return _format_context(snap, _fusionar(snap, lex, qv, k, filas))
+
+async def agenerar_respuesta(q: str, intent: str, topic: str, grade: str | None = None, lexica=None):
+    prompt = construir_prompt(q, intent, topic,
+                              contexto=await aretrieve(q, k=3, topic=topic, grade=grade, lexica=lexica))
+    async with limite("chat"):
+        with timed("chat"):
+            r = await get_async_client().chat.completions.create(
+                timeout=TIMEOUTS["chat"], **_chat_args(prompt))
+    with timed("limpiar"):
+        return limpiar_texto_respuesta(r.choices[0].message.content)
+
+async def agenerar_respuesta_stream(q: str, intent: str, topic: str, grade: str | None = None,
+                                   lexica=None):
+    prompt = construir_prompt(q, intent, topic,
+                              contexto=await aretrieve(q, k=3, topic=topic, grade=grade, lexica=lexica))
+    limpiador = CORRECTOR.incremental()
+    async with limite("chat"):
+        with timed("chat"):
+            stream = await get_async_client().chat.completions.create(
+                stream=True, timeout=TIMEOUTS["chat"], **_chat_args(prompt))
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                texto = limpiador.feed(chunk.choices[0].delta.content or "")
+                if texto:
+                    yield texto
+    resto = limpiador.flush()
+    if resto:
+        yield resto
+
+async def _apreparar_pregunta(question: str):
+    # Usuario (SQLite) y búsqueda léxica (FTS5) bloquean: van a hilos del executor
+    uid, tema_norm = await asyncio.to_thread(_datos_pregunta, question)
+    lexica = await asyncio.to_thread(_lexica_pregunta, question, 3, tema_norm)
+    if lexica[3] and LEXICAL_FAST_PATH:
+        return uid, tema_norm, None, lexica
+    # Con plazo: si la API de embeddings va lenta, se sigue sin caché semántica
+    return uid, tema_norm, await _aembed_con_plazo(question), lexica
+
+async def arun_rag(question: str) -> tuple[str, str | None]:
+    """Versión asíncrona de run_rag (la que usa /ask)."""
+    uid, tema_norm, qv, lexica = await _apreparar_pregunta(question)
+    # La caché semántica compara con numpy: en un hilo, como SQLite
+    with timed("answer_cache"):
+        resp = await asyncio.to_thread(ANSWER_CACHE.get, question, tema_norm, PROMPT_VERSION, qv)
+    if resp is None:
+        resp = await agenerar_respuesta(q=question, intent="duda", topic=tema_norm, lexica=lexica)
+        await asyncio.to_thread(ANSWER_CACHE.put, question, tema_norm, PROMPT_VERSION, resp, qv)
+
     try:
         if uid is not None:
             registrar_interaccion(uid, question, resp, "duda", tema_norm or "", None)
     except Exception as e:
-        print("[registrar_interaccion] WARN en run_rag:", e)
+        print("[registrar_interaccion] WARN en arun_rag:", e)
 
-    # Buscar vídeo igual que en on_duda
-    vid_path = find_local_video(tema_norm, question)
-    video_url = None
-    if vid_path is not None:
-        # Solo el nombre del archivo, la ruta la sirve FastAPI en /videos
-        filename = os.path.basename(vid_path)
-        video_url = f"/videos/{filename}"
+    return resp, await asyncio.to_thread(_video_url, tema_norm, question)
+
+async def arun_rag_stream(question: str):
+    """Versión asíncrona de run_rag_stream (la que usa /ask/stream)."""
+    uid, tema_norm, qv, lexica = await _apreparar_pregunta(question)
+    # La caché semántica compara con numpy: en un hilo, como SQLite
+    with timed("answer_cache"):
+        resp = await asyncio.to_thread(ANSWER_CACHE.get, question, tema_norm, PROMPT_VERSION, qv)
+
+    if resp is not None:
+        yield "token", resp
+    else:
+        partes = []
+        async for texto in agenerar_respuesta_stream(q=question, intent="duda", topic=tema_norm,
+                                                     lexica=lexica):
+            partes.append(texto)
+            yield "token", texto
+        resp = "".join(partes)
+        await asyncio.to_thread(ANSWER_CACHE.put, question, tema_norm, PROMPT_VERSION, resp, qv)
 
     try:
         if uid is not None:
             registrar_interaccion(uid, question, resp, "duda", tema_norm or "", None)
     except Exception as e:
-        print("[registrar_interaccion] WARN en run_rag:", e)
+        print("[registrar_interaccion] WARN en arun_rag_stream:", e)
 
-    return resp, video_url
+    yield "done", resp, await asyncio.to_thread(_video_url, tema_norm, question)
     
 
 
 # ============ Utilidades de datos ============
 
 def ensure_tables():
-    con=sqlite3.connect(DB)
-    cur=con.cursor()
-    cur.execute("""CREATE TABLE IF NOT EXISTS users(
-        id INTEGER PRIMARY KEY, username TEXT UNIQUE, age INTEGER, grade TEXT,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP)""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS interactions(
-        id INTEGER PRIMARY KEY, user_id INTEGER, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-        prompt TEXT, response TEXT, intent TEXT, topic TEXT, difficulty INTEGER, solved INTEGER)""")
-    con.commit(); con.close()
+    # Solo crea las tablas la primera vez en este proceso (ver db.py)
+    db.ensure_schema(DB)
 
 def ensure_user(username, age, grade):
-    ensure_tables()
-    con=sqlite3.connect(DB)
-    cur=con.cursor()
-    cur.execute("SELECT id FROM users WHERE username=?", (username,))
-    row=cur.fetchone()
-    if row: uid=row[0]
-    else:
-        cur.execute("INSERT INTO users(username,age,grade) VALUES(?,?,?)", (username,age,grade))
-        con.commit(); uid=cur.lastrowid
-    con.close()
-    return uid
+    # El id se cachea en memoria tras la primera consulta
+    return db.get_user_id(username, age, grade, DB)
 
 def get_topics():
     """Lee temas distintos desde docs.topic para llenar el desplegable."""
-    con=sqlite3.connect(DB)
-    try:
-        cur=con.cursor()
-        rows = cur.execute("SELECT DISTINCT topic FROM docs WHERE topic IS NOT NULL AND topic!='' ORDER BY topic").fetchall()
-        topics = [r[0] for r in rows] or ["sumas","restas","problemas","fracciones"]
-        return topics
-    finally:
-        con.close()
+    rows = db.get_conn(DB).execute(
+        "SELECT DISTINCT topic FROM docs WHERE topic IS NOT NULL AND topic!='' ORDER BY topic"
+    ).fetchall()
+    topics = [r[0] for r in rows] or ["sumas","restas","problemas","fracciones"]
+    return topics
 
 def embed(q: str) -> np.ndarray:
-    r = client.embeddings.create(model="text-embedding-3-small", input=q)
-    return np.array(r.data[0].embedding, dtype=np.float32).reshape(1,-1)
-
-def retrieve(q: str, k: int = 3, max_chars: int = 400) -> str:
-    qv = embed(q)
-    sims = cosine_similarity(qv, VECS_M)[0]    # usa VECS_M en memoria
-    top = sims.argsort()[::-1][:k]
-
+    """Embedding de la pregunta (normalizada). Si ya se preguntó antes, sale de la caché."""
+    with timed("embed"):
+        key = QUERY_EMB_CACHE.key(q)
+        v = QUERY_EMB_CACHE.get(EMB_MODEL, key)
+        if v is None:
+            r = get_client().embeddings.create(model=EMB_MODEL, input=key or q)
+            v = np.array(r.data[0].embedding, dtype=np.float32)
+            QUERY_EMB_CACHE.put(EMB_MODEL, key, v)
+    return v.reshape(1,-1)
+
+def embed_many(qs: list[str]) -> np.ndarray:
+    """Embeddings de varias preguntas; las que no están en caché van en una sola llamada. Devuelve (n, d)."""
+    keys = [QUERY_EMB_CACHE.key(q) for q in qs]
+    vecs = [QUERY_EMB_CACHE.get(EMB_MODEL, k) for k in keys]
+    missing = list(dict.fromkeys(k or q for k, q, v in zip(keys, qs, vecs) if v is None))
+    if missing:
+        with timed("embed"):
+            r = get_client().embeddings.create(model=EMB_MODEL, input=missing)
+        new = {t: np.array(d.embedding, dtype=np.float32) for t, d in zip(missing, r.data)}
+        for i, (k, q) in enumerate(zip(keys, qs)):
+            if vecs[i] is None:
+                vecs[i] = new[k or q]
+                QUERY_EMB_CACHE.put(EMB_MODEL, k, vecs[i])
+    return np.vstack(vecs).astype(np.float32, copy=False)
+
+def cache_stats() -> dict:
+    """Contadores de las cachés del servicio (para /stats)."""
+    return {
+        "query_embeddings": QUERY_EMB_CACHE.stats(),
+        "answers": ANSWER_CACHE.stats(),
+    }
+
+@register_gauges
+def _cache_gauges():
+    """Ratios y contadores de las cachés para /metrics."""
+    out = []
+    for name, st in cache_stats().items():
+        out.append(("aula_cache_hit_ratio", "Aciertos / consultas de cada caché.", {"cache": name}, st["hit_ratio"]))
+        out.append(("aula_cache_hits", "Aciertos acumulados de cada caché.", {"cache": name}, st["hits"]))
+        out.append(("aula_cache_misses", "Fallos acumulados de cada caché.", {"cache": name}, st["misses"]))
+    out.append(("aula_query_embedding_disk_hits", "Embeddings de preguntas leídos de la caché en SQLite.",
+                {}, QUERY_EMB_CACHE.disk_hits))
+    out.append(("aula_answer_cache_semantic_hits", "Aciertos del nivel semántico de la caché de respuestas.",
+                {}, ANSWER_CACHE.semantic_hits))
+    for k, v in INTERACTION_LOG.stats().items():
+        out.append((f"aula_interaction_log_{k}", "Registro de interacciones en segundo plano.", {}, v))
+    idx = SNAPSHOTS.stats()
+    out.append(("aula_index_rows", "Filas del índice activo.", {}, idx.get("rows", 0)))
+    out.append(("aula_index_reloads", "Cargas del índice (la primera incluida).", {}, idx["reloads"]))
+    out.append(("aula_index_reload_errors", "Generaciones que no se pudieron cargar.", {}, idx["errors"]))
+    return out
+
+def _format_context(snap: IndexSnapshot, top) -> str:
     ctx = []
     for i in top:
-        row = DF_DOCS.iloc[i]                  # usa DF_DOCS en memoria
-        snippet = (row['text'] or '')[:max_chars]
+        row = snap.docs.row(i)                 # filas en memoria de la misma generación
+        snippet = row['text'] or ''
         ctx.append(f"[{row['kind']} | {row['title']} | {row['topic']} | {row['grade']}]\n{snippet}")
     return "\n\n---\n\n".join(ctx)
 
+# Búsqueda híbrida: BM25 (FTS5) + vectores, mezclados con RRF.
+# Si la búsqueda léxica es "segura" (todas las palabras clave aparecen en
+# al menos k filas) no se pide el embedding; si la API de embeddings falla
+# o tarda más de EMBED_BUDGET, se usa solo la léxica.
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+LEXICAL_FAST_PATH = os.getenv("LEXICAL_FAST_PATH", "1") != "0"
+EMBED_BUDGET = float(os.getenv("EMBED_BUDGET", "1.5"))
+
+def _topic_key(topic) -> str:
+    """Tema de un documento o pregunta como clave de partición ("sumas llevando" → "suma")."""
+    return (normalize_topic_for_video(topic or "").split() or [""])[0]
+
+def _grade_key(grade) -> str:
+    """Curso como clave de partición ("1º", "1primaria" → "1")."""
+    g = _norm(grade or "")
+    m = re.search(r"\d+", g)
+    return m.group() if m else g
+
+def _particiones(snap: IndexSnapshot) -> RowPartitions:
+    """Particiones por tema y curso de la generación (se calculan la primera vez que se filtra)."""
+    if snap.partitions is None:
+        snap.partitions = RowPartitions.from_store(
+            snap.docs, ["topic", "grade"], normalizers={"topic": _topic_key, "grade": _grade_key})
+        print("[INDEX] Particiones:", snap.partitions.stats())
+    return snap.partitions
+
+def _filas_filtradas(snap: IndexSnapshot, topic: str | None, grade: str | None, k: int):
+    """
+    Filas del índice del tema/curso pedidos (None = todas). Si el filtro deja
+    menos de k filas, se busca en todo el índice para no quedarse sin contexto.
+    """
+    if not topic and not grade:
+        return None
+    filas = _particiones(snap).select(topic=topic, grade=grade)
+    if filas is not None and len(filas) < k:
+        return None
+    return filas
+
+def _buscar_lexica(snap: IndexSnapshot, q: str, k: int, filas=None):
+    """
+    (filas, segura) de la búsqueda BM25: hasta HYBRID_CANDIDATES filas, segura si
+    todas las palabras clave aparecen juntas en al menos k. ([], False) si no hay índice léxico.
+    Con `filas` (filtro por tema/curso) se descartan las que no estén.
+    """
+    if snap.lexical is None:
+        return [], False
+    with timed("lexical"):
+        try:
+            rows, _, segura = snap.lexical.search(q, max(k, HYBRID_CANDIDATES), min_hits=k)
+        except sqlite3.Error as e:
+            print("[lexical] WARN:", e)
+            return [], False
+    if filas is not None and rows:
+        pos = np.minimum(np.searchsorted(filas, rows), len(filas) - 1)
+        rows = [r for r, p in zip(rows, pos) if filas[p] == r]
+        segura = segura and len(rows) >= k
+    return rows, segura
+
+def _lexica_pregunta(q: str, k: int = 3, topic: str | None = None, grade: str | None = None):
+    """
+    Búsqueda BM25 de la pregunta, una vez por petición: (snap, filas, lex, segura).
+    La preparación la usa para saber si basta con ella y retrieve la reutiliza
+    (sobre la misma generación del índice) en vez de repetir la consulta FTS5.
+    """
+    snap = SNAPSHOTS.get()                     # toda la búsqueda sobre la misma generación
+    filas = _filas_filtradas(snap, topic, grade, k)
+    lex, segura = _buscar_lexica(snap, q, k, filas)
+    return snap, filas, lex, segura
+
+def _fusionar(snap: IndexSnapshot, lex: list[int], qv, k: int, filas=None) -> list[int]:
+    """Mezcla (RRF) los candidatos vectoriales con los léxicos y se queda con k."""
+    with timed("search"):
+        vec, _ = snap.index.search(qv, max(k, HYBRID_CANDIDATES), rows=filas)   # producto escalar sobre VECS_M normalizado
+    if not lex:
+        RETRIEVALS.inc(mode="vector")
+        return list(vec[:k])
+    RETRIEVALS.inc(mode="hybrid")
+    rows, _ = reciprocal_rank_fusion([vec, lex], k=RRF_K, limit=k)
+    return rows
+
+def retrieve(q: str, k: int = 3, topic: str | None = None, grade: str | None = None,
+             lexica=None) -> str:
+    """
+    Devuelve como contexto los k trozos más relevantes para la pregunta (enteros, sin recortar).
+    Con topic/grade solo se buscan los trozos de ese tema y curso.
+    Con `lexica` (de _lexica_pregunta, mismos q/k/topic/grade) no se repite la búsqueda BM25.
+    """
+    snap, filas, lex, segura = lexica or _lexica_pregunta(q, k, topic, grade)
+    if segura and LEXICAL_FAST_PATH:
+        RETRIEVALS.inc(mode="lexical")
+        return _format_context(snap, lex[:k])
+    try:
+        qv = embed(q)
+    except Exception as e:
+        if not lex:
+            raise
+        print("[retrieve] WARN: sin embedding, solo búsqueda léxica:", e)
+        RETRIEVALS.inc(mode="lexical_fallback")
+        return _format_context(snap, lex[:k])
+    return _format_context(snap, _fusionar(snap, lex, qv, k, filas))
+
+def retrieve_many(questions: list[str], k: int = 3, topic: str | None = None,
+                  grade: str | None = None) -> list[str]:
+    """Como retrieve, pero los embeddings que falten se piden en una sola llamada y se puntúan de una vez."""
+    if not questions:
+        return []
+    n = max(k, HYBRID_CANDIDATES)
+    snap = SNAPSHOTS.get()
+    filas = _filas_filtradas(snap, topic, grade, k)
+    lex = [_buscar_lexica(snap, q, k, filas) for q in questions]
+    pend = [i for i, (_, segura) in enumerate(lex) if not (segura and LEXICAL_FAST_PATH)]
+    out = [_format_context(snap, rows[:k]) for rows, _ in lex]
+    if not pend:
+        RETRIEVALS.inc(len(questions), mode="lexical")
+        return out
+    RETRIEVALS.inc(len(questions) - len(pend), mode="lexical")
+    Q = embed_many([questions[i] for i in pend])
+    with timed("search"):
+        hits = snap.index.search_many(Q, n, rows=filas)
+    for i, (vec, _) in zip(pend, hits):
+        rows = lex[i][0]
+        if rows:
+            RETRIEVALS.inc(mode="hybrid")
+            rows, _ = reciprocal_rank_fusion([vec, rows], k=RRF_K, limit=k)
+        else:
+            RETRIEVALS.inc(mode="vector")
+            rows = vec[:k]
+        out[i] = _format_context(snap, rows)
+    return out
+
 SYSTEM_STYLE = (
     "Eres una profesora de matemáticas para alumnado de educación primaria."
     "Da respuestas muy breves: no más de 60 palabras"
@@ -163,9 +735,14 @@ SYSTEM_STYLE = (
     #Por ejemplo, usa este formato dentro de un bloque de texto:\n```text\n  27\n+ 46\n-----\n  73\n```\n"
 )
 
-def generar_respuesta(q: str, intent: str, topic: str):
-    contexto = retrieve(q, k=3, max_chars=400)
-    prompt = f"""{SYSTEM_STYLE}
+# Cambia solo al tocar SYSTEM_STYLE: invalida las respuestas cacheadas con el prompt anterior
+PROMPT_VERSION = text_hash(SYSTEM_STYLE)[:12]
+
+def construir_prompt(q: str, intent: str, topic: str, contexto: str | None = None,
+                     grade: str | None = None, lexica=None) -> str:
+    if contexto is None:
+        contexto = retrieve(q, k=3, topic=topic, grade=grade, lexica=lexica)
+    return f"""{SYSTEM_STYLE}
 
 Tema: {topic or 'general'} | Intención: {intent}
 Pregunta: {q}
@@ -176,7 +753,8 @@ Contexto (úsalo solo si ayuda):
 Responde claro y breve, con pasos numerados si hace falta.
 """
 
-    resp = client.chat.completions.create(
+def _chat_args(prompt: str) -> dict:
+    return dict(
         model="gpt-4o-mini",
         temperature=0.2,
         max_tokens=450,           # <-- limita longitud de salida
@@ -184,74 +762,49 @@ Responde claro y breve, con pasos numerados si hace falta.
             {"role":"system","content":"Eres un profesor de Primaria, claro y sin emoticonos."},
             {"role":"user","content": prompt}
         ]
-    ).choices[0].message.content
-    resp = limpiar_texto_respuesta(resp)
+    )
+
+def generar_respuesta(q: str, intent: str, topic: str, grade: str | None = None, lexica=None):
+    prompt = construir_prompt(q, intent, topic, grade=grade, lexica=lexica)
+    with timed("chat"):
+        resp = get_client().chat.completions.create(**_chat_args(prompt)).choices[0].message.content
+    with timed("limpiar"):
+        resp = limpiar_texto_respuesta(resp)
     return resp
 
+def generar_respuesta_stream(q: str, intent: str, topic: str, grade: str | None = None,
+                             lexica=None):
+    """
+    Igual que generar_respuesta, pero va devolviendo el texto mientras el
+    modelo lo genera. Las correcciones se aplican por tramos completos
+    (hasta el último punto o salto de línea), nunca a media frase.
+    """
+    prompt = construir_prompt(q, intent, topic, grade=grade, lexica=lexica)
+    limpiador = CORRECTOR.incremental()
+    with timed("chat"):
+        stream = get_client().chat.completions.create(stream=True, **_chat_args(prompt))
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            texto = limpiador.feed(chunk.choices[0].delta.content or "")
+            if texto:
+                yield texto
+    resto = limpiador.flush()
+    if resto:
+        yield resto
+
 def registrar_interaccion(user_id, q, resp, intent, topic, difficulty):
-    con=sqlite3.connect(DB)
-    cur=con.cursor()
-    cur.execute("INSERT INTO interactions(user_id,prompt,response,intent,topic,difficulty) VALUES(?,?,?,?,?,?)",
-                (user_id, q, resp, intent, topic, difficulty))
-    con.commit(); con.close()
+    # No escribe aquí: encola y el hilo de INTERACTION_LOG lo guarda por lotes
+    with timed("registrar"):
+        INTERACTION_LOG.log(user_id, q, resp, intent, topic, difficulty)
 
 # --- Correcciones automáticas de texto del modelo ---
 
-def _preserva_mayus(reemplazo: str, original: str) -> str:
-    """Conserva la capitalización inicial si el original empieza en mayúscula."""
-    return reemplazo.capitalize() if original and original[0].isupper() else reemplazo
+# Reglas de corrección (correcciones.json), compiladas una vez en una sola expresión
+CORRECTOR = Corrector.from_file()
 
 def limpiar_texto_respuesta(texto: str) -> str:
-    if texto is None:
-        return texto
-
-    texto = unicodedata.normalize("NFC", texto)
-
-    # ==============================
-    # 1️⃣ Corrige "sumas/restas con llamadas"
-    # ==============================
-    def _rep_suma_resta(m: re.Match) -> str:
-        op = m.group("op")
-        base = op.lower()
-        out = {
-            "suma": "suma llevando",
-            "sumas": "sumas llevando",
-            "resta": "resta llevando",
-            "restas": "restas llevando"
-        }.get(base, op)
-        return _preserva_mayus(out, op)
-
-    patron_suma_resta = re.compile(
-        r"\b(?P<op>suma|sumas|resta|restas)\s+con\s+(?:llamada|llamadas|llamado|llamados|llevada|llevadas)\b",
-        flags=re.IGNORECASE
-    )
-    texto = patron_suma_resta.sub(_rep_suma_resta, texto)
-
-    # ==============================
-    # 2️⃣ Corrige “reiniciar”, “quitar”, “eliminar”, “retirar” → “restar” en contexto numérico
-    # ==============================
-    patron_restar = re.compile(
-        r"\b(?P<verbo>reiniciar|reinicias|reiniciamos|reinician|"
-        r"quitar|quitas|quitamos|quitan|"
-        r"eliminar|eliminas|eliminamos|eliminan|"
-        r"retirar|retiras|retiramos|retiran)\b"
-        r"([^.\n]{0,20}\d+[^.\n]{0,20})?",  # busca si hay número cerca
-        flags=re.IGNORECASE
-    )
-
-    def _reemplazo_restar(m: re.Match) -> str:
-        verbo = m.group("verbo")
-        return _preserva_mayus("restar", verbo)
-
-    texto = patron_restar.sub(_reemplazo_restar, texto)
-
-    # ==============================
-    # 3️⃣ Limpieza de espacios
-    # ==============================
-    texto = re.sub(r"[ \t]{2,}", " ", texto)
-    texto = re.sub(r"[ \t]+\n", "\n", texto)
-
-    return texto
+    return CORRECTOR.aplicar(texto)
 
 # --- Importación de vídeos ---
 
@@ -282,34 +835,29 @@ def normalize_topic_for_video(tema: str) -> str:
     if t in {"problema", "problemas"}: return "problemas"
     return t
 
+# Catálogo de vídeos: se lista la carpeta una vez y se actualiza si cambia
+VIDEO_CATALOG = VideoCatalog(VIDEO_DIR, VIDEO_EXTS, norm=_norm,
+                             check_interval=float(os.getenv("VIDEO_CATALOG_CHECK", "2")))
+
 def find_local_video(topic: str | None, pregunta: str | None = None) -> str | None:
-    """Elige el mejor vídeo de assets/videos por puntuación."""
+    """Elige el mejor vídeo de assets/videos por puntuación (sobre el catálogo en memoria)."""
     if not topic:
         print("[VIDEO] topic vacío")
         return None
-    if not os.path.isdir(VIDEO_DIR):
+    VIDEO_CATALOG.refresh()
+    if not VIDEO_CATALOG.exists:
         print(f"[VIDEO] No existe carpeta: {VIDEO_DIR}")
         return None
 
     t = normalize_topic_for_video(topic)     # ej. “restas”→“resta”
     t_norm = _norm(t)
     q_keys = _keywords(pregunta or "")
+    bonus = ["llevando", "acarreo"] if t_norm == "suma" else []
 
-    try:
-        files = [f for f in os.listdir(VIDEO_DIR)
-                 if os.path.isfile(os.path.join(VIDEO_DIR, f))]
-    except Exception as e:
-        print("[VIDEO] No se pudo listar carpeta:", e)
-        return None
-
+    # Solo se puntúan los vídeos cuyo nombre contiene el tema, alguna palabra
+    # clave o un término de bonus; el resto tendría puntuación 0.
     candidates = []
-    for f in files:
-        path = os.path.join(VIDEO_DIR, f)
-        name_no_ext, ext = os.path.splitext(f)
-        if ext.lower() not in VIDEO_EXTS:
-            continue
-        name_norm = _norm(name_no_ext)
-
+    for name_norm, mtime, path in VIDEO_CATALOG.matches([t_norm, *q_keys, *bonus]).values():
         # --- scoring ---
         score = 0
         # 1) Contiene el tema normalizado
@@ -320,20 +868,21 @@ def find_local_video(topic: str | None, pregunta: str | None = None) -> str | No
             if kw and kw in name_norm:
                 score += 1
         # 3) Bonus por coincidencias fuertes muy comunes
-        if any(x in name_norm for x in ["llevando", "acarreo"]) and t_norm == "suma":
+        if any(x in name_norm for x in bonus):
             score += 2
         # 4) desempate: más reciente primero
-        mtime = os.path.getmtime(path)
-
         candidates.append((score, mtime, path))
 
     if not candidates:
-        print(f"[VIDEO] No hay match para topic='{t_norm}'. Archivos:", files)
-        return None
+        # Sin coincidencias gana el más reciente (como cuando todos puntuaban 0)
+        newest = VIDEO_CATALOG.newest()
+        if newest is None:
+            print(f"[VIDEO] No hay match para topic='{t_norm}'. Carpeta sin vídeos.")
+            return None
+        candidates.append((0, newest[1], newest[2]))
 
     # Ordena por score DESC, luego mtime DESC
-    candidates.sort(key=lambda x: (x[0], x[1]), reverse=True)
-    best = candidates[0]
+    best = max(candidates, key=lambda x: (x[0], x[1]))
     print(f"[VIDEO] elegido score={best[0]}, mtime={time.ctime(best[1])}, path={best[2]}")
     return best[2]
 
@@ -361,7 +910,7 @@ def on_duda(nombre, edad, curso, tema, pregunta):
     
 
     # Genera la respuesta
-    resp = generar_respuesta(q=q, intent="duda", topic=tema_eff)
+    resp = generar_respuesta(q=q, intent="duda", topic=tema_eff, grade=curso)
     registrar_interaccion(uid, q, resp, "duda", tema_eff or "", None)
 
     # 👇 ahora se pasa también la pregunta, para mejorar el score
@@ -402,7 +951,7 @@ def on_ejercicios(nombre, edad, curso, tema, dificultad):
     )
 
     try:
-        resp = generar_respuesta(q=prompt, intent="ejercicios", topic=tema)
+        resp = generar_respuesta(q=prompt, intent="ejercicios", topic=tema, grade=curso)
     except Exception as e:
         # Muestra el error al usuario y en consola
         print("[generar_respuesta] ERROR:", e)
@@ -701,14 +1250,15 @@ h1, h2, h3, .gr-markdown h1, .gr-markdown h2, .gr-markdown h3 {
 footer {display:none}
 """
 
-theme = gr.themes.Soft(primary_hue="blue", radius_size=gr.themes.sizes.radius_md)
-
-
 # ============ Construcción de la interfaz ============
 
 #DESACTIVO TODO GRADIO PORQUE VOY A HACERLO DENTRO DE LA APP
 
 if USE_GRADIO:
+    import gradio as gr   # solo con la interfaz web (on_duda, on_ejercicios... lo usan)
+    startup()
+
+    theme = gr.themes.Soft(primary_hue="blue", radius_size=gr.themes.sizes.radius_md)
 
     with gr.Blocks(title="AULA Mates – RAG", css=custom_css, theme=theme) as demo:
         demo.queue()  # 👈 necesario para spinner/progreso
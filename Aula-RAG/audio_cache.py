@@ -0,0 +1,135 @@
+# audio_cache.py
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def audio_key(text: str, voice: str, model: str) -> str:
+    """Nombre de archivo por contenido: mismo texto + voz + modelo → mismo MP3."""
+    h = hashlib.sha256(f"{model}\0{voice}\0{text}".encode("utf-8")).hexdigest()
+    return f"{h[:32]}.mp3"
+
+
+class AudioCache:
+    """
+    Caché de audios TTS en disco, direccionada por contenido.
+    - Un acierto evita la llamada a TTS: se devuelve el MP3 ya generado.
+    - Presupuesto de disco (max_bytes): al pasarse, se borran los menos usados.
+    - Al arrancar se reconcilia con lo que ya hay en la carpeta (incluidos los
+      MP3 antiguos con nombre aleatorio, que se expulsan antes por ser viejos).
+    - Con varios workers (gunicorn) la carpeta es compartida: cada `rescan`
+      segundos, al guardar, se vuelve a leer la carpeta, así el presupuesto se
+      aplica al total del disco y no a lo que ha escrito cada proceso.
+      Entre dos lecturas se puede pasar como mucho lo que escriban los demás.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, rescan: float = 30.0):
+        self.dir = directory
+        self.max_bytes = max_bytes
+        self.rescan = rescan
+        self._files = OrderedDict()          # nombre → tamaño (de menos a más reciente)
+        self._bytes = 0
+        self._scanned = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self.reconcile()
+
+    def reconcile(self, verbose: bool = True):
+        """Reconstruye el índice LRU a partir de los archivos (por fecha de último acceso/modificación)."""
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.dir):
+            path = os.path.join(self.dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:                  # lo ha borrado otro worker
+                continue
+            if name.endswith(".tmp"):
+                # Restos de una escritura interrumpida (las recientes pueden ser de otro worker)
+                if now - st.st_mtime > 600:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                continue
+            if not name.endswith(".mp3") or not os.path.isfile(path):
+                continue
+            entries.append((max(st.st_atime, st.st_mtime), name, st.st_size))
+        entries.sort()
+        with self._lock:
+            self._files = OrderedDict((name, size) for _, name, size in entries)
+            self._bytes = sum(self._files.values())
+            self._scanned = time.monotonic()
+            self._evict()
+        if verbose:
+            print(f"[TTS] Caché de audio: {len(self._files)} archivos, "
+                  f"{self._bytes / 2**20:.1f} MB de {self.max_bytes / 2**20:.0f} MB")
+
+    def get(self, name: str) -> str | None:
+        """Devuelve el nombre si el MP3 está en caché (y lo marca como usado)."""
+        with self._lock:
+            path = os.path.join(self.dir, name)
+            if name not in self._files and os.path.isfile(path):
+                # Lo ha generado otro worker
+                try:
+                    self._files[name] = os.path.getsize(path)
+                    self._bytes += self._files[name]
+                except OSError:
+                    pass
+            if name in self._files and os.path.exists(path):
+                self._files.move_to_end(name)
+                self.hits += 1
+                try:
+                    os.utime(path)           # la recencia sobrevive a un reinicio
+                except OSError:
+                    pass
+                return name
+            self._bytes -= self._files.pop(name, 0)
+            self.misses += 1
+            return None
+
+    def put(self, name: str, data: bytes) -> str:
+        """Guarda el MP3 de forma atómica (temporal + rename) y aplica el presupuesto."""
+        path = os.path.join(self.dir, name)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        if time.monotonic() - self._scanned > self.rescan:
+            self.reconcile(verbose=False)
+        with self._lock:
+            self._bytes -= self._files.pop(name, 0)
+            self._files[name] = len(data)
+            self._bytes += len(data)
+            self._evict(keep=name)
+        return name
+
+    def _evict(self, keep: str | None = None):
+        while self._bytes > self.max_bytes and self._files:
+            name, size = next(iter(self._files.items()))
+            if name == keep:
+                break
+            self._files.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.dir, name))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "files": len(self._files),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
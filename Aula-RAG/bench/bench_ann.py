@@ -0,0 +1,82 @@
+# bench/bench_ann.py
+"""
+Benchmark del índice aproximado IVF frente a la búsqueda exacta.
+
+Genera vectores sintéticos agrupados (parecidos a embeddings reales),
+y para varios tamaños de corpus mide recall@k frente a la búsqueda exacta
+y la latencia p50/p99 por pregunta con distintos nprobe. Solo CPU.
+
+Uso:
+    python bench/bench_ann.py
+    python bench/bench_ann.py --sizes 10000 100000 1000000 --dim 256 --nprobe 4 8 16 32
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import VectorIndex, normalize_rows    # noqa: E402
+from ann import IVFIndex                          # noqa: E402
+
+
+def synthetic(n, dim, clusters, rng):
+    """Vectores normalizados alrededor de `clusters` centros aleatorios."""
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    m = centers[labels] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return normalize_rows(m)
+
+
+def latencies(fn, queries):
+    out = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        out.append((time.perf_counter() - t0) * 1000)
+    return np.percentile(out, 50), np.percentile(out, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall y latencia del IVF frente a búsqueda exacta.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000, 200_000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"dim={args.dim} k={args.k} preguntas={args.queries}")
+    print(f"{'filas':>9} {'modo':>12} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8}")
+
+    for n in args.sizes:
+        m = synthetic(n, args.dim, clusters=max(8, n // 500), rng=rng)
+        queries = m[rng.choice(n, size=args.queries, replace=False)] \
+            + 0.3 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+        exact = VectorIndex(m, normalized=True)
+        truth = [set(exact.search(q, args.k)[0].tolist()) for q in queries]
+        p50, p99 = latencies(lambda q: exact.search(q, args.k), queries)
+        print(f"{n:>9} {'exacta':>12} {1.0:>9.3f} {p50:>8.2f} {p99:>8.2f}")
+
+        t0 = time.perf_counter()
+        ivf = IVFIndex.build(m)
+        build_s = time.perf_counter() - t0
+
+        for nprobe in args.nprobe:
+            if nprobe > ivf.nlist:
+                continue
+            idx = VectorIndex(m, normalized=True, ann=ivf, nprobe=nprobe)
+            found = [set(idx.search(q, args.k)[0].tolist()) for q in queries]
+            recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+            p50, p99 = latencies(lambda q: idx.search(q, args.k), queries)
+            print(f"{n:>9} {f'ivf np={nprobe}':>12} {recall:>9.3f} {p50:>8.2f} {p99:>8.2f}")
+        print(f"{'':>9} (IVF: {ivf.nlist} listas, construido en {build_s:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
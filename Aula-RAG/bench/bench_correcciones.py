@@ -0,0 +1,117 @@
+# bench/bench_correcciones.py
+"""
+Benchmark de limpiar_texto_respuesta: Corrector (cada regla se prueba solo
+donde empiezan sus prefijos y, con muchas reglas, se descartan antes las que
+no pueden casar) frente a una pasada (re.sub) por regla.
+
+Parte de las reglas de correcciones.json y le añade N reglas sintéticas
+(palabra → corrección) para ver cómo crece el coste al añadir correcciones.
+Mide µs por respuesta (texto parecido a una respuesta real de la profesora)
+y comprueba que da lo mismo que las pasadas por regla y que el modo
+incremental da lo mismo que el texto completo.
+
+Uso:
+    python bench/bench_correcciones.py
+    python bench/bench_correcciones.py --extra 0 16 64 256 1024 --repeat 200
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import re
+import unicodedata
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from correcciones import Corrector, RULES_PATH, _preserva_mayus    # noqa: E402
+
+TEXTO = (
+    "¡Muy bien! Vamos a hacer una suma con llevadas paso a paso.  Primero sumamos las unidades: "
+    "7 + 8 = 15. Escribimos el 5 y nos llevamos 1 a las decenas.   \n"
+    "Después sumamos las decenas: 4 + 3 + 1 = 8. Si en una resta con llamadas el número de arriba "
+    "es más pequeño, pedimos prestada una decena. Quitamos 5 de 12 y nos quedan 7.\t\t\n"
+    "Recuerda: en las sumas con llevadas siempre empezamos por la derecha. ¡Tú puedes!  "
+)
+
+
+def reglas_sinteticas(n, rng):
+    reglas = []
+    for k in range(n):
+        palabra = "".join(rng.choice("bcdfghjklmnpqrstvz") + rng.choice("aeiou") for _ in range(4))
+        reglas.append({"nombre": f"sintetica_{k}", "patron": rf"\b(?P<w>{palabra})\b",
+                       "grupo": "w", "reemplazo": f"corregido{k}"})
+    return reglas
+
+
+class Secuencial:
+    """Una pasada por regla (lo que se hacía antes, pero ya compilado)."""
+
+    def __init__(self, reglas):
+        self.pasos = []
+        for r in reglas:
+            flags = re.IGNORECASE if r.get("ignorar_mayus", True) else 0
+            self.pasos.append((re.compile(r["patron"], flags), r))
+
+    def aplicar(self, texto):
+        texto = unicodedata.normalize("NFC", texto)
+        for rx, r in self.pasos:
+            def rep(m, r=r):
+                original = m.group(r["grupo"]) if r.get("grupo") else m.group(0)
+                if "mapa" in r:
+                    out = r["mapa"].get(original.lower(), original)
+                else:
+                    out = r["reemplazo"]
+                return _preserva_mayus(out, original) if r.get("mayus", bool(r.get("grupo"))) else out
+            texto = rx.sub(rep, texto)
+        return texto
+
+
+def medir(fn, texto, repeat):
+    fn(texto)
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn(texto)
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+
+def en_trozos(corrector, texto, rng):
+    inc = corrector.incremental()
+    out, i = [], 0
+    while i < len(texto):
+        n = rng.randint(1, 8)
+        out.append(inc.feed(texto[i:i + n]))
+        i += n
+    out.append(inc.flush())
+    return "".join(out)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--extra", type=int, nargs="+", default=[0, 8, 32, 128, 512])
+    ap.add_argument("--repeat", type=int, default=300)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    with open(RULES_PATH, encoding="utf-8") as f:
+        cfg = json.load(f)
+    rng = random.Random(args.seed)
+    extra_max = reglas_sinteticas(max(args.extra), rng)
+
+    print(f"texto: {len(TEXTO)} caracteres, repeticiones: {args.repeat}")
+    print(f"{'reglas':>7} {'combinada µs':>13} {'secuencial µs':>14} {'x':>6}  streaming")
+    for n in args.extra:
+        reglas = cfg["reglas"] + extra_max[:n]
+        comb = Corrector(reglas, margen=cfg.get("margen", 64))
+        seq = Secuencial(reglas)
+        t_comb = medir(comb.aplicar, TEXTO, args.repeat)
+        t_seq = medir(seq.aplicar, TEXTO, args.repeat)
+        igual = comb.aplicar(TEXTO) == seq.aplicar(TEXTO)
+        ok = all(en_trozos(comb, TEXTO, rng) == comb.aplicar(TEXTO) for _ in range(20))
+        print(f"{len(reglas):>7} {t_comb:>13.1f} {t_seq:>14.1f} {t_seq / t_comb:>6.1f}  "
+              f"{'ok' if ok else 'DISTINTO'}{'' if igual else ' (distinto de la secuencial)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# bench/bench_docstore.py
+"""
+Benchmark de DocStore frente al DataFrame de pandas que se usaba antes (DF_DOCS).
+
+Genera N trozos sintéticos (temas, cursos y títulos repetidos; textos de
+varios cientos de caracteres con tildes) y mide:
+- memoria de las filas cargadas desde SQLite, como en app._load_docs (tracemalloc);
+- tiempo por resultado al leer una fila para el contexto
+  (df.iloc[i] frente a store.row(i)).
+
+Uso:
+    python bench/bench_docstore.py
+    python bench/bench_docstore.py --rows 10000 100000 500000
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd                       # noqa: E402
+from docstore import DocStore              # noqa: E402
+
+NAMES = ["id", "doc_id", "kind", "title", "topic", "grade", "heading", "text"]
+TOPICS = ["sumas", "restas", "sumas llevando", "restas llevando", "multiplicación", "división", "problemas"]
+GRADES = ["1º", "2º", "3º", "4º", "5º", "6º", ""]
+WORDS = ("número unidades decenas centenas llevamos quitamos sumamos restamos resultado "
+         "ejemplo paso después primero cuánto manzanas caramelos niños tiene más menos").split()
+
+
+def synthetic(n, rng):
+    rows, doc, idx = [], 0, 0
+    for i in range(n):
+        if idx == 0:
+            doc += 1
+            topic, grade = rng.choice(TOPICS), rng.choice(GRADES)
+            kind = rng.choice(["teoria", "ejercicio"])
+            title = f"{topic}_{grade}_{doc}"
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 90)))
+        rows.append((i + 1, doc, kind, title, topic, grade, f"Paso {idx + 1}", text))
+        idx = (idx + 1) % rng.randint(1, 6)
+    return rows
+
+
+def a_sqlite(rows):
+    con = sqlite3.connect(":memory:")
+    con.execute(f"CREATE TABLE t({', '.join(NAMES)})")
+    con.executemany(f"INSERT INTO t VALUES({', '.join('?' * len(NAMES))})", rows)
+    return con
+
+
+def memoria(build):
+    tracemalloc.start()
+    obj = build()
+    cur, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, cur
+
+
+def por_hit(fn, hits):
+    fn(hits[0])
+    t0 = time.perf_counter()
+    for i in hits:
+        fn(i)
+    return (time.perf_counter() - t0) / len(hits) * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    ap.add_argument("--hits", type=int, default=20000)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    rng = random.Random(args.seed)
+
+    print(f"{'filas':>8} {'pandas MB':>10} {'DocStore MB':>12} {'x':>5} {'iloc µs':>9} {'row µs':>8} {'x':>6}")
+    for n in args.rows:
+        con = a_sqlite(synthetic(n, rng))
+        sql = "SELECT * FROM t ORDER BY id"
+        df, m_df = memoria(lambda: pd.read_sql_query(sql, con))
+        store, m_st = memoria(lambda: DocStore.from_query(con, sql))
+        hits = [rng.randrange(n) for _ in range(args.hits)]
+        for i in hits[:200]:
+            assert df.iloc[i]["text"] == store.row(i)["text"]
+        t_df = por_hit(lambda i: (lambda r: (r["kind"], r["title"], r["topic"], r["grade"], r["text"]))(df.iloc[i]), hits)
+        t_st = por_hit(lambda i: (lambda r: (r["kind"], r["title"], r["topic"], r["grade"], r["text"]))(store.row(i)), hits)
+        print(f"{n:>8} {m_df / 2**20:>10.1f} {m_st / 2**20:>12.1f} {m_df / m_st:>5.1f} "
+              f"{t_df:>9.1f} {t_st:>8.2f} {t_df / t_st:>6.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# bench/bench_embed.py
+"""
+Benchmark del driver de embeddings de ingest.py (embedder.py) frente a los
+lotes fijos de 64 textos uno detrás de otro.
+
+Usa un cliente de mentira: cada petición tarda una latencia fija más un
+tiempo por token y, con probabilidad --error, responde 429 (como la API
+cuando se pasa del límite). Sin red ni coste.
+
+Uso:
+    python bench/bench_embed.py
+    python bench/bench_embed.py --texts 20000 --concurrency 1 4 8 16 --error 0.05
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+import contextlib
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedder import EmbeddingDriver, estimate_tokens     # noqa: E402
+
+DIM = 16
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+class FakeClient:
+    def __init__(self, latency, per_token, error, seed):
+        self.latency = latency
+        self.per_token = per_token
+        self.error = error
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.embeddings = SimpleNamespace(create=self.create)
+
+    def create(self, model, input):
+        with self.lock:
+            self.calls += 1
+            falla = self.rng.random() < self.error
+        time.sleep(self.latency + self.per_token * sum(estimate_tokens(input)))
+        if falla:
+            raise RateLimited("429 Too Many Requests")
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(t))] * DIM) for t in input])
+
+
+def secuencial(client, texts, batch_size=64):
+    """Lo de antes: lotes fijos, uno detrás de otro, sin reintentos."""
+    out = []
+    for i in range(0, len(texts), batch_size):
+        out.extend(d.embedding for d in client.embeddings.create(model="m", input=texts[i:i + batch_size]).data)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--texts", type=int, default=5000)
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    ap.add_argument("--latency", type=float, default=0.2, help="segundos fijos por petición")
+    ap.add_argument("--per-token", type=float, default=2e-6, help="segundos por token")
+    ap.add_argument("--error", type=float, default=0.02, help="probabilidad de 429 por petición")
+    ap.add_argument("--backoff", type=float, default=0.2, help="espera del primer reintento (s)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    palabras = "suma resta llevamos decenas unidades número resultado problema manzanas".split()
+    texts = [" ".join(rng.choice(palabras) for _ in range(rng.randint(30, 120))) for _ in range(args.texts)]
+    print(f"{len(texts)} textos, ~{sum(estimate_tokens(texts))} tokens estimados")
+
+    c = FakeClient(args.latency, args.per_token, 0.0, args.seed)
+    t0 = time.perf_counter()
+    secuencial(c, texts)
+    base = time.perf_counter() - t0
+    print(f"{'modo':>22} {'s':>7} {'x':>6} {'peticiones':>11} {'reintentos':>11}")
+    print(f"{'64 fijos, secuencial':>22} {base:>7.2f} {1.0:>6.1f} {c.calls:>11} {'-':>11}  (sin errores)")
+    for n in args.concurrency:
+        c = FakeClient(args.latency, args.per_token, args.error, args.seed)
+        d = EmbeddingDriver(c, "m", concurrency=n, tpm=0, rpm=0, max_retries=8, backoff=args.backoff)
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(open(os.devnull, "w")):   # sin el progreso por lote
+            out = d.run(texts)
+        dt = time.perf_counter() - t0
+        assert out.shape == (len(texts), DIM)
+        print(f"{f'driver, {n} a la vez':>22} {dt:>7.2f} {base / dt:>6.1f} {c.calls:>11} {d.retries:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# bench/bench_quant.py
+"""
+Benchmark de la primera pasada cuantizada (quant.py) frente a la búsqueda exacta.
+
+Genera vectores sintéticos agrupados (como bench_ann.py), los escribe como
+los deja ingest.py --quant (almacén float32 + códigos int8 / binarios, en
+una carpeta temporal, abiertos con memmap) y mide para cada tamaño:
+- MB de lo que se recorre en cada pregunta (float32 frente a los códigos);
+- recall@k frente a la búsqueda exacta, solo con los códigos ("sin re-punt.")
+  y re-puntuando listas cortas de k·rescore con los float32;
+- latencia p50/p99 por pregunta.
+
+Los datos sintéticos son pesimistas para binary: cientos de vectores casi
+iguales por grupo, así que el top-k son casi empates que el signo no separa.
+Con --store se mide sobre un almacén real (p. ej. el de una generación),
+con preguntas = filas del almacén más ruido.
+
+Uso:
+    python bench/bench_quant.py
+    python bench/bench_quant.py --sizes 100000 500000 --dim 1536 --rescore 2 4 8 16 32
+    python bench/bench_quant.py --store vecs/gen-XXXX/all_emb.vst
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search import VectorIndex, normalize_rows, top_k         # noqa: E402
+from vector_store import write_store, open_store, FLAG_NORMALIZED   # noqa: E402
+from quant import (QuantizedVectors, write_quantized, QUANT_KINDS,  # noqa: E402
+                   QUANT_RESCORE, QUANT_MIN_SHORTLIST)
+
+
+def synthetic(n, dim, clusters, rng):
+    """Vectores normalizados alrededor de `clusters` centros aleatorios."""
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    m = centers[labels] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return normalize_rows(m)
+
+
+def latencies(fn, queries):
+    out = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        out.append((time.perf_counter() - t0) * 1000)
+    return np.percentile(out, 50), np.percentile(out, 99)
+
+
+def recall(found, truth):
+    return np.mean([len(set(f.tolist()) & t) / len(t) for f, t in zip(found, truth)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20_000, 100_000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rescore", type=int, nargs="+", default=[4, 128, 1024])
+    parser.add_argument("--store", help="almacén de vectores real (.vst) en vez de datos sintéticos")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    real = open_store(args.store) if args.store else None
+    dim = real.dim if real else args.dim
+    print(f"dim={dim} k={args.k} preguntas={args.queries}" + (f" ({args.store})" if real else ""))
+    print(f"{'filas':>8} {'modo':>20} {'MB':>8} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8}")
+
+    for n in [len(real)] if real else args.sizes:
+        if real:
+            m = normalize_rows(real.matrix)
+            noise = 0.02
+        else:
+            m = synthetic(n, dim, clusters=max(8, n // 500), rng=rng)
+            noise = 0.3
+        queries = m[rng.choice(n, size=min(args.queries, n), replace=False)] \
+            + noise * rng.standard_normal((min(args.queries, n), dim)).astype(np.float32)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "all_emb.vst")
+            write_store(path, np.arange(n), m, flags=FLAG_NORMALIZED)
+            del m
+            store = open_store(path)
+
+            exact = VectorIndex(store.matrix, normalized=True)
+            truth = [set(exact.search(q, args.k)[0].tolist()) for q in queries]
+            p50, p99 = latencies(lambda q: exact.search(q, args.k), queries)
+            print(f"{n:>8} {'exacta float32':>20} {store.matrix.nbytes / 2**20:>8.1f} "
+                  f"{1.0:>9.3f} {p50:>8.2f} {p99:>8.2f}")
+
+            for kind in QUANT_KINDS:
+                write_quantized(store.matrix, store.ids, tmp, kind)
+                quant, _ = QuantizedVectors.load(tmp, kind)
+                mb = quant.nbytes / 2**20
+
+                Qn = normalize_rows(queries)
+                found = [top_k(quant.scores(q), args.k) for q in Qn]
+                p50, p99 = latencies(lambda q: top_k(quant.scores(q), args.k), Qn)
+                print(f"{'':>8} {f'{kind} sin re-punt.':>20} {mb:>8.1f} "
+                      f"{recall(found, truth):>9.3f} {p50:>8.2f} {p99:>8.2f}")
+
+                for r in args.rescore:
+                    quant.rescore = r
+                    idx = VectorIndex(store.matrix, normalized=True, quant=quant)
+                    found = [idx.search(q, args.k)[0] for q in queries]
+                    p50, p99 = latencies(lambda q: idx.search(q, args.k), queries)
+                    print(f"{'':>8} {f'{kind} k·{r}':>20} {mb:>8.1f} "
+                          f"{recall(found, truth):>9.3f} {p50:>8.2f} {p99:>8.2f}")
+            del exact, store, quant, idx
+        print(f"{'':>8} (lista corta mínima: {QUANT_MIN_SHORTLIST}; por defecto k·{QUANT_RESCORE})")
+
+
+if __name__ == "__main__":
+    main()
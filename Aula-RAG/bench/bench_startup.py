@@ -0,0 +1,105 @@
+# bench/bench_startup.py
+"""
+Benchmark del arranque en frío de la API.
+
+Cada medida se hace en un proceso nuevo (como un reinicio o un autoescalado):
+- import app / import api: lo que cuesta importar los módulos;
+- startup(): tablas de la BD + carga del índice (app.startup);
+- primera búsqueda: búsqueda léxica (BM25) sobre el índice recién cargado;
+- primera pregunta: POST /ask con el lifespan ya ejecutado (TestClient), con
+  todo el camino de la API (cachés, búsqueda, prompt, correcciones, audio).
+También indica si se han importado módulos pesados que la API no necesita
+(gradio, sklearn) o que solo necesita al cargar el índice (pandas).
+
+No llama a OpenAI: el cliente asíncrono es uno de mentira que responde al
+instante (embedding, chat y voz), así que lo medido es solo lo nuestro.
+El primer proceso deja el mp3 en audio/ y los siguientes lo encuentran en
+la caché, como pasaría tras un reinicio.
+
+Uso:
+    python bench/bench_startup.py
+    python bench/bench_startup.py --repeat 10
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PESADOS = ("gradio", "sklearn", "pandas")
+
+# Se ejecuta en el proceso hijo; imprime un JSON con los tiempos en ms
+HIJO = r"""
+import sys, time, json
+sys.path.insert(0, ".")
+out = {}
+t0 = time.perf_counter()
+import app
+out["import app"] = (time.perf_counter() - t0) * 1000
+pesados_app = [m for m in %(pesados)r if m in sys.modules]
+t0 = time.perf_counter()
+import api
+out["import api"] = (time.perf_counter() - t0) * 1000
+out["pesados"] = pesados_app
+t0 = time.perf_counter()
+snap = app.startup()
+out["startup()"] = (time.perf_counter() - t0) * 1000
+t0 = time.perf_counter()
+app._buscar_lexica(snap, "restas con llevadas", 3)
+out["primera búsqueda"] = (time.perf_counter() - t0) * 1000
+# Cliente de OpenAI de mentira (get_async_client devuelve app._aclient si ya existe)
+from types import SimpleNamespace as NS
+dim = snap.index.matrix.shape[1]
+async def _embedding(model, input, timeout=None):
+    return NS(data=[NS(embedding=[1.0] * dim)])
+async def _chat(timeout=None, **kw):
+    return NS(choices=[NS(message=NS(content="Una suma con llevadas  paso a paso."))])
+async def _voz(**kw):
+    return NS(content=b"mp3")
+async def _cerrar():
+    pass
+app._aclient = NS(embeddings=NS(create=_embedding), chat=NS(completions=NS(create=_chat)),
+                  audio=NS(speech=NS(create=_voz)), close=_cerrar)
+from fastapi.testclient import TestClient
+with TestClient(api.app) as c:
+    t0 = time.perf_counter()
+    r = c.post("/ask", json={"question": "¿Cómo se hace una resta con llevadas?"})
+    out["primera pregunta"] = (time.perf_counter() - t0) * 1000
+    assert r.status_code == 200, r.text
+print("@@" + json.dumps(out))
+"""
+
+
+def medir_una(env):
+    r = subprocess.run([sys.executable, "-c", HIJO % {"pesados": PESADOS}], cwd=APP_DIR,
+                       env=env, capture_output=True, text=True)
+    for line in r.stdout.splitlines():
+        if line.startswith("@@"):
+            return json.loads(line[2:])
+    raise RuntimeError(r.stderr[-2000:] or r.stdout[-2000:])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-bench")
+    env.setdefault("INDEX_POLL_INTERVAL", "0")
+
+    medidas = [medir_una(env) for _ in range(args.repeat)]
+    claves = [k for k in medidas[0] if k != "pesados"]
+    print(f"procesos: {args.repeat} (mediana y máximo, ms)")
+    for k in claves:
+        vals = [m[k] for m in medidas]
+        print(f"{k:>18} {statistics.median(vals):>9.1f} {max(vals):>9.1f}")
+    pesados = medidas[0]["pesados"]
+    print(f"{'módulos pesados':>18} {', '.join(pesados) if pesados else 'ninguno'} (tras import app)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# cache_utils.py
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """
+    Clave canónica de una pregunta: NFC, minúsculas, espacios colapsados y sin
+    signos sueltos al principio/final ("¿Cómo se suma llevando?" y
+    "cómo se suma llevando" comparten entrada).
+    """
+    t = unicodedata.normalize("NFC", text or "").lower()
+    t = _SPACES.sub(" ", t).strip()
+    return t.strip(" ¿?¡!.,;:")
+
+
+class LRUCache:
+    """
+    Caché en memoria con tamaño máximo (LRU) y caducidad opcional (TTL, segundos).
+    Segura entre hilos. Lleva contadores de aciertos/fallos.
+    """
+
+    def __init__(self, max_items: int = 1024, ttl: float | None = None):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._data = OrderedDict()        # clave → (expira_en, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires, value = item
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "items": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,154 @@
+# chunking.py
+import re
+
+CHUNK_MAX_CHARS = 600
+CHUNK_OVERLAP = 80
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*\S)\s*$")
+_FENCE = re.compile(r"^\s*```")
+_RULE = re.compile(r"^\s*(-{3,}|\*{3,}|_{3,})\s*$")
+
+
+# ---------- SECCIONES Y PÁRRAFOS ----------
+
+def _sections(text: str):
+    """
+    Parte el markdown por encabezados (#, ##, ...).
+    Devuelve lista de (ruta_de_encabezados, [párrafos]).
+    Los bloques ``` se tratan como un único párrafo y nunca se cortan por '#'.
+    """
+    path = []                 # [(nivel, título)]
+    out = []
+    paras, cur = [], []
+    in_fence = False
+
+    def close_para():
+        if cur:
+            paras.append("\n".join(cur).strip("\n"))
+            cur.clear()
+
+    def close_section():
+        close_para()
+        if paras:
+            out.append((" > ".join(t for _, t in path), list(paras)))
+            paras.clear()
+
+    for line in text.splitlines():
+        if _FENCE.match(line):
+            if not in_fence:
+                close_para()
+            cur.append(line)
+            in_fence = not in_fence
+            if not in_fence:
+                close_para()
+            continue
+        if in_fence:
+            cur.append(line)
+            continue
+
+        m = _HEADING.match(line)
+        if m:
+            close_section()
+            level = len(m.group(1))
+            path = [(lv, t) for lv, t in path if lv < level] + [(level, m.group(2))]
+            continue
+        # Separadores '---' sueltos; si van pegados a texto son parte de una operación
+        if not line.strip() or (_RULE.match(line) and not cur):
+            close_para()
+            continue
+        cur.append(line)
+
+    close_section()
+    return out
+
+
+def _hard_split(para: str, max_chars: int):
+    """
+    Corta un párrafo demasiado largo: primero por líneas, luego por palabras
+    y, si una palabra sola no cabe (URLs, tablas sin espacios), a tajos de max_chars.
+    """
+    pieces, cur = [], ""
+    for line in para.split("\n"):
+        if len(line) > max_chars:
+            if cur:
+                pieces.append(cur)
+                cur = ""
+            buf = ""
+            for w in line.split(" "):
+                while len(w) > max_chars:
+                    if buf:
+                        pieces.append(buf)
+                        buf = ""
+                    pieces.append(w[:max_chars])
+                    w = w[max_chars:]
+                if buf and len(buf) + 1 + len(w) > max_chars:
+                    pieces.append(buf)
+                    buf = w
+                else:
+                    buf = f"{buf} {w}" if buf else w
+            if buf:
+                pieces.append(buf)
+        elif cur and len(cur) + 1 + len(line) > max_chars:
+            pieces.append(cur)
+            cur = line
+        else:
+            cur = f"{cur}\n{line}" if cur else line
+    if cur:
+        pieces.append(cur)
+    return pieces
+
+
+def _tail(text: str, n: int) -> str:
+    """Últimos n caracteres, empezando en frontera de palabra."""
+    if n <= 0 or len(text) <= n:
+        return text if n > 0 else ""
+    t = text[-n:]
+    cut = t.find(" ")
+    return t[cut+1:] if 0 <= cut < len(t) - 1 else t
+
+
+# ---------- API ----------
+
+def split_markdown(text: str, max_chars: int = CHUNK_MAX_CHARS,
+                   overlap: int = CHUNK_OVERLAP):
+    """
+    Divide un texto markdown en trozos de como mucho ~max_chars caracteres,
+    respetando encabezados y párrafos. Cada trozo nuevo de una misma sección
+    arranca con los últimos `overlap` caracteres del anterior.
+    Devuelve lista de tuplas: (heading, text). El texto lleva delante
+    su encabezado para que el embedding tenga contexto.
+    """
+    chunks = []
+    for heading, paras in _sections(text or ""):
+        budget = max(max_chars - len(heading) - 1, max_chars // 2)
+
+        units = []
+        for p in paras:
+            units.extend([p] if len(p) <= budget else _hard_split(p, budget))
+
+        # El solape nunca se pierde: si no cabe junto a la unidad siguiente,
+        # se recorta la unidad y lo que sobra pasa al trozo de después
+        carry = min(overlap, budget // 2)
+        units.reverse()
+        body = ""
+        while units:
+            u = units.pop()
+            if body and len(body) + 2 + len(u) > budget:
+                chunks.append((heading, body))
+                prev = _tail(body, carry)
+                if not prev:
+                    body = u
+                    continue
+                room = budget - len(prev) - 2
+                if len(u) > room:
+                    first = _hard_split(u, room)[0]          # siempre es un prefijo de u
+                    rest = u[len(first):]
+                    units.append(rest[1:] if rest[:1] in ("\n", " ") else rest)
+                    u = first
+                body = f"{prev}\n\n{u}"
+            else:
+                body = f"{body}\n\n{u}" if body else u
+        if body:
+            chunks.append((heading, body))
+
+    return [(h, f"{h}\n{b}" if h else b) for h, b in chunks]
@@ -0,0 +1,396 @@
+# correcciones.py
+"""
+Correcciones de estilo de las respuestas de la profesora (limpiar_texto_respuesta).
+
+Las reglas están en correcciones.json (o en CORRECCIONES_PATH). Cada regla es:
+    {"nombre": ..., "patron": regex,
+     "reemplazo": texto            → sustituye todo lo que casa, o
+     "mapa": {clave: texto}        → texto según el grupo `grupo` (en minúsculas),
+     "grupo": nombre de un grupo del patrón (opcional),
+     "mayus": true                 → conserva la mayúscula inicial de `grupo`,
+     "ignorar_mayus": true}
+
+Cada patrón se compila UNA vez. Las reglas se aplican en el orden del archivo
+y cada una ve el resultado de las anteriores, igual que una cadena de re.sub.
+Para no pasar todas por cada respuesta, de cada regla se sacan los prefijos
+literales con los que puede empezar (hasta PREFIJO = 4 caracteres) y con
+todos ellos se construye un trie en una sola expresión: una pasada por el
+texto dice qué reglas pueden casar y solo esas se aplican (se vuelve a mirar
+cuando una regla cambia el texto). Por eso conviene que el patrón empiece por
+algo acotado (literal, alternativa o clase de caracteres como [ \\t] o \\d);
+si empieza por '.' o '\\w' la regla se aplica siempre, con su re.sub, y
+cuesta lo mismo que antes.
+
+Los prefijos se sacan con el analizador interno de `re`; si no está (o cambia
+y falla), todas las reglas se aplican así, una tras otra.
+
+Corrector.incremental() aplica las mismas reglas a un texto que llega a trozos.
+"""
+import os
+import re
+import json
+import unicodedata
+
+# Analizador interno de `re` (privado): solo se usa para sacar prefijos y,
+# si no está, las reglas se aplican con re.sub sin más (ver _prefijos_regla)
+try:
+    from re import _parser as _sre_parse, _constants as _c       # 3.11+
+except ImportError:
+    try:
+        import sre_parse as _sre_parse
+        import sre_constants as _c
+    except ImportError:
+        _sre_parse = _c = None
+
+_REPETICIONES = tuple(getattr(_c, n) for n in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+                      if hasattr(_c, n))
+
+_CATEGORIAS = {
+    _c.CATEGORY_DIGIT: "0123456789",
+    _c.CATEGORY_SPACE: " \t\n\r\f\v",
+} if _c is not None else {}
+
+RULES_PATH = os.getenv(
+    "CORRECCIONES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "correcciones.json"))
+
+PREFIJO = 4                 # longitud máxima de los prefijos literales
+MAX_PREFIJOS = 4096         # por regla; si hay más, se acortan
+CRIBA_MIN_REGLAS = 8        # con más reglas, una pasada previa descarta las que no pueden casar
+
+
+def _clase(items, ignorecase):
+    """Caracteres de una clase [..] o None si es demasiado amplia o negada."""
+    out = set()
+    for op, av in items:
+        if op is _c.LITERAL:
+            out.add(chr(av))
+        elif op is _c.RANGE and av[1] - av[0] < 128:
+            out.update(chr(x) for x in range(av[0], av[1] + 1))
+        elif op is _c.CATEGORY and av in _CATEGORIAS:
+            out.update(_CATEGORIAS[av])
+        else:
+            return None
+    return {ch.lower() for ch in out} if ignorecase else out
+
+
+def _prefijos(items, k, ignorecase):
+    """Prefijos literales (de hasta k caracteres) con los que puede empezar la secuencia.
+    Un "" en el resultado significa que por alguna rama no se sabe cómo empieza."""
+    if k == 0 or not items:
+        return {""}
+    op, av = items[0]
+    rest = items[1:]
+    if op is _c.AT:
+        return _prefijos(rest, k, ignorecase)
+    if op is _c.LITERAL:
+        ch = chr(av).lower() if ignorecase else chr(av)
+        return {ch + t for t in _prefijos(rest, k - 1, ignorecase)}
+    if op is _c.IN:
+        chars = _clase(av, ignorecase)
+        if chars is None:
+            return {""}
+        tails = _prefijos(rest, k - 1, ignorecase)
+        return {ch + t for ch in chars for t in tails}
+    if op is _c.SUBPATTERN:
+        return _prefijos(list(av[-1]) + rest, k, ignorecase)
+    if op is _c.BRANCH:
+        out = set()
+        for alt in av[1]:
+            out |= _prefijos(list(alt) + rest, k, ignorecase)
+        return out
+    if op in _REPETICIONES:
+        mn, mx, sub = av
+        if mx == 0:
+            return _prefijos(rest, k, ignorecase)
+        # se "desenrolla" una repetición: sub + (sub){mn-1, mx-1} + resto
+        mx2 = mx if mx == _c.MAXREPEAT else mx - 1
+        out = _prefijos(list(sub) + [(op, (max(mn - 1, 0), mx2, sub))] + rest, k, ignorecase)
+        if mn == 0:
+            out |= _prefijos(rest, k, ignorecase)
+        return out
+    # aserciones, referencias, '.', etc.: el prefijo acaba aquí
+    return {""}
+
+
+def _prefijos_regla(patron: str, flags: int, ignorecase: bool):
+    """
+    Prefijos (en minúsculas) con los que empieza cualquier coincidencia del
+    patrón, o None si no se pueden acotar: entonces la regla se prueba siempre.
+    """
+    if _sre_parse is None:
+        return None
+    try:
+        arbol = list(_sre_parse.parse(patron, flags))
+        for k in range(PREFIJO, 0, -1):
+            prefijos = _prefijos(arbol, k, ignorecase)
+            if len(prefijos) <= MAX_PREFIJOS:
+                break
+    except Exception:                       # API privada: si cambia, sin prefijos
+        return None
+    if "" in prefijos:
+        return None
+    return {p.lower() for p in prefijos}
+
+
+def _trie_regex(palabras) -> str:
+    """Expresión que casa cualquiera de `palabras` recorriendo un trie (coste ~ longitud, no número)."""
+    trie = {}
+    for w in palabras:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def _expr(node):
+        fin = "" in node
+        alts = []
+        for ch in sorted(k for k in node if k):
+            sub = _expr(node[ch])
+            alts.append(re.escape(ch) + sub)
+        if not alts:
+            return ""
+        if len(alts) == 1:
+            body = alts[0]
+            return f"(?:{body})?" if fin else body
+        body = "(?:" + "|".join(alts) + ")"
+        return body + "?" if fin else body
+
+    return _expr(trie)
+
+
+def _preserva_mayus(reemplazo: str, original: str) -> str:
+    """Conserva la capitalización inicial si el original empieza en mayúscula."""
+    return reemplazo.capitalize() if original and original[0].isupper() else reemplazo
+
+
+class _Posiciones:
+    """Trie de prefijos (en minúsculas) → índices de reglas: dónde puede empezar cada regla."""
+
+    def __init__(self, por_prefijo: dict[str, list[int]]):
+        self.por_prefijo = por_prefijo
+        trie = _trie_regex(por_prefijo)
+        self.rx = re.compile(trie) if trie else None
+        self.rx_i = re.compile(trie, re.IGNORECASE) if trie else None
+        self.longitudes = sorted({len(p) for p in por_prefijo})
+
+    def preparar(self, texto: str):
+        """(expresión del trie, texto sobre el que buscarla)."""
+        bajo = texto.lower()
+        if len(bajo) == len(texto):
+            return self.rx, bajo
+        return self.rx_i, texto             # algún carácter cambia de longitud al pasar a minúsculas
+
+    def primera(self, texto: str, pos: int = 0) -> int | None:
+        """Primera posición >= pos donde empieza algún prefijo."""
+        if self.rx is None:
+            return None
+        rx, bajo = self.preparar(texto)
+        hit = rx.search(bajo, pos)
+        return hit.start() if hit else None
+
+    def reglas(self, texto: str) -> set[int]:
+        """Reglas con algún prefijo en el texto."""
+        out = set()
+        if self.rx is None:
+            return out
+        rx, bajo = self.preparar(texto)
+        hit = rx.search(bajo)
+        while hit:
+            p = hit.start()
+            trozo = bajo[p:p + self.longitudes[-1]].lower()
+            for n in self.longitudes:
+                out.update(self.por_prefijo.get(trozo[:n], ()))
+            hit = rx.search(bajo, p + 1)
+        return out
+
+
+class _Regla:
+    """Una regla compilada: patrón, reemplazo y (si se pueden sacar) sus prefijos."""
+
+    def __init__(self, r: dict, i: int):
+        self.nombre = r.get("nombre", f"regla {i}")
+        if "reemplazo" not in r and "mapa" not in r:
+            raise ValueError(f"Regla de corrección '{self.nombre}': falta 'reemplazo' o 'mapa'")
+        ignorecase = r.get("ignorar_mayus", True)
+        flags = re.IGNORECASE if ignorecase else 0
+        try:
+            self.rx = re.compile(r["patron"], flags)
+        except (KeyError, re.error) as e:
+            raise ValueError(f"Regla de corrección '{self.nombre}' no válida: {e}") from e
+        self.prefijos = _prefijos_regla(r["patron"], flags, ignorecase)
+        self.posiciones = _Posiciones({p: [i] for p in self.prefijos}) if self.prefijos else None
+        self.mapa = {k.lower(): v for k, v in r["mapa"].items()} if "mapa" in r else None
+        self.grupo = r.get("grupo")
+        self.reemplazo = r.get("reemplazo")
+        self.mayus = r.get("mayus", self.grupo is not None)
+
+    def reemplazar(self, m: re.Match) -> str:
+        original = m.group(self.grupo) if self.grupo else m.group(0)
+        out = self.mapa.get(original.lower(), original) if self.mapa is not None else self.reemplazo
+        return _preserva_mayus(out, original) if self.mayus else out
+
+    def aplicar(self, texto: str) -> tuple[str, list[tuple[int, int]]]:
+        """re.sub de la regla; devuelve también dónde quedaron los reemplazos en el texto nuevo."""
+        zonas, piezas, pos, n = [], [], 0, 0
+        for m in self.buscar(texto):
+            out = self.reemplazar(m)
+            n += m.start() - pos
+            zonas.append((n, n + len(out)))
+            n += len(out)
+            piezas += (texto[pos:m.start()], out)
+            pos = m.end()
+        if not zonas:
+            return texto, zonas
+        piezas.append(texto[pos:])
+        return "".join(piezas), zonas
+
+    def buscar(self, texto: str, pos: int = 0):
+        """
+        Coincidencias de izquierda a derecha sin solaparse, como re.sub, pero
+        probando el patrón solo donde empieza alguno de sus prefijos.
+        """
+        if self.posiciones is None:
+            yield from self.rx.finditer(texto, pos)
+            return
+        rx, bajo = self.posiciones.preparar(texto)
+        hit = rx.search(bajo, pos)
+        while hit:
+            m = self.rx.match(texto, hit.start())
+            hit = rx.search(bajo, m.end() if m else hit.start() + 1)
+            if m:
+                yield m
+
+
+class Corrector:
+    def __init__(self, reglas: list[dict], margen: int = 64):
+        self.reglas = reglas
+        self.margen = margen
+        self._reglas = [_Regla(r, i) for i, r in enumerate(reglas)]
+        por_prefijo = {}                     # prefijo → índices de reglas (en orden)
+        for i, regla in enumerate(self._reglas):
+            for p in regla.prefijos or ():
+                por_prefijo.setdefault(p, []).append(i)
+        self._posiciones = _Posiciones(por_prefijo)
+        self._siempre = {i for i, regla in enumerate(self._reglas) if regla.prefijos is None}
+
+    @classmethod
+    def from_file(cls, path: str = RULES_PATH) -> "Corrector":
+        with open(path, encoding="utf-8") as f:
+            cfg = json.load(f)
+        corrector = cls(cfg["reglas"], margen=cfg.get("margen", 64))
+        print(f"[CORRECCIONES] {len(corrector.reglas)} reglas cargadas de {path}")
+        return corrector
+
+    def aplicar(self, texto: str) -> str:
+        """Igual que aplicar las reglas una tras otra con re.sub, saltándose las que no pueden casar."""
+        if texto is None:
+            return texto
+        texto = unicodedata.normalize("NFC", texto)
+        if len(self._reglas) <= CRIBA_MIN_REGLAS:
+            # Pocas reglas: cada una ya busca solo donde empiezan sus prefijos
+            for regla in self._reglas:
+                texto = regla.aplicar(texto)[0]
+            return texto
+        cands = self._posiciones.reglas(texto) | self._siempre
+        borde = self._posiciones.longitudes[-1] - 1 if self._posiciones.longitudes else 0
+        i = -1
+        while True:
+            pendientes = [j for j in cands if j > i]
+            if not pendientes:
+                return texto
+            i = min(pendientes)
+            texto, zonas = self._reglas[i].aplicar(texto)
+            # Un prefijo nuevo solo puede aparecer donde ha cambiado el texto
+            for a, b in zonas:
+                cands |= self._posiciones.reglas(texto[max(0, a - borde):b + borde])
+
+    def incremental(self) -> "CorrectorIncremental":
+        return CorrectorIncremental(self)
+
+
+class _Etapa:
+    """
+    Una regla sobre un texto que llega a trozos. Retiene desde la primera
+    posición de los últimos `margen` caracteres donde podría empezar la regla
+    (si no se sabe, los `margen` enteros) y nunca corta una coincidencia.
+    """
+
+    def __init__(self, regla: _Regla, margen: int):
+        self.regla = regla
+        self.margen = margen
+        self.posiciones = regla.posiciones
+        self._buf = ""
+        self._ctx = ""          # últimos caracteres ya entregados (para \b y similares)
+
+    def feed(self, trozo: str) -> str:
+        if not trozo:
+            return ""
+        self._buf += trozo
+        inicio = max(0, len(self._buf) - self.margen)
+        if self.posiciones is None:
+            corte = inicio
+        else:
+            # un prefijo a medias al final todavía no lo encuentra el trie
+            corte = max(0, len(self._buf) - self.posiciones.longitudes[-1] + 1)
+            hit = self.posiciones.primera(self._ctx + self._buf, len(self._ctx) + inicio)
+            if hit is not None:
+                corte = min(corte, hit - len(self._ctx))
+        return self._emitir(corte) if corte > 0 else ""
+
+    def flush(self) -> str:
+        return self._emitir(len(self._buf)) if self._buf else ""
+
+    def _emitir(self, corte: int) -> str:
+        """Corrige y entrega el buffer hasta `corte` (o antes, si una coincidencia lo cruza)."""
+        ctx = self._ctx
+        buf = ctx + self._buf
+        corte += len(ctx)
+        piezas, pos = [], len(ctx)
+        for m in self.regla.buscar(buf, pos):
+            if m.start() >= corte:
+                break
+            if m.end() > corte:
+                corte = m.start()
+                break
+            piezas.append(buf[pos:m.start()])
+            piezas.append(self.regla.reemplazar(m))
+            pos = m.end()
+        piezas.append(buf[pos:corte])
+        self._buf = buf[corte:]
+        self._ctx = buf[max(0, corte - self.margen):corte]
+        return "".join(piezas)
+
+
+class CorrectorIncremental:
+    """
+    Aplica las reglas a un texto que llega a trozos (streaming): una etapa por
+    regla, y cada una recibe lo que entrega la anterior, así que se encadenan
+    igual que en Corrector.aplicar. Cada etapa retiene lo que aún puede casar
+    (como mucho `margen` caracteres, lo más largo que puede casar una regla).
+    Lo entregado nunca cambia al llegar más texto.
+    """
+
+    def __init__(self, corrector: Corrector):
+        self.c = corrector
+        self._etapas = [_Etapa(r, corrector.margen) for r in corrector._reglas]
+        self._pend = ""         # texto sin normalizar aún (puede llegar una tilde suelta)
+
+    def feed(self, trozo: str) -> str:
+        texto = self._pend + (trozo or "")
+        # no separar un carácter de sus marcas combinantes: se queda el último
+        corte = len(texto) - 1
+        while corte > 0 and unicodedata.combining(texto[corte]):
+            corte -= 1
+        self._pend = texto[max(corte, 0):]
+        texto = unicodedata.normalize("NFC", texto[:max(corte, 0)])
+        for etapa in self._etapas:
+            texto = etapa.feed(texto)
+        return texto
+
+    def flush(self) -> str:
+        texto = unicodedata.normalize("NFC", self._pend)
+        self._pend = ""
+        for etapa in self._etapas:
+            texto = etapa.feed(texto) + etapa.flush()
+        return texto
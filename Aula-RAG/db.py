@@ -0,0 +1,103 @@
+# db.py
+"""
+Conexiones SQLite para la ruta de las peticiones.
+
+- Una conexión persistente por hilo (sqlite3 no permite compartirlas sin lock),
+  en modo WAL: los lectores no bloquean al escritor y se evitan los
+  'database is locked' con varias peticiones a la vez.
+- Cada conexión guarda en caché las sentencias preparadas (cached_statements).
+- El esquema se comprueba una sola vez por proceso.
+- Los id de usuario se cachean en memoria.
+- Tras un fork (workers de gunicorn con preload_app) el hijo no usa ni cierra
+  las conexiones del padre: cerrarlas podría hacer el checkpoint del WAL y
+  borrarlo mientras el padre u otro worker lo usa. Se abren otras nuevas.
+"""
+import os
+import sqlite3
+import threading
+
+DB_PATH = "db.sqlite"
+BUSY_TIMEOUT_MS = 5000
+
+_local = threading.local()
+_lock = threading.Lock()
+_schema_ready = set()
+_user_ids = {}
+_inherited = []        # objetos heredados del padre que el hijo no debe cerrar
+
+
+def on_fork_child(fn):
+    """Decorador: ejecuta `fn` en el proceso hijo justo después de un fork."""
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=fn)
+    return fn
+
+
+def keep_inherited(obj):
+    """Conserva (sin cerrar ni usar) una conexión abierta antes del fork."""
+    _inherited.append(obj)
+
+
+@on_fork_child
+def _after_fork():
+    global _local, _lock
+    keep_inherited(_local)
+    _local = threading.local()
+    _lock = threading.Lock()
+
+
+def get_conn(path: str = DB_PATH) -> sqlite3.Connection:
+    """Conexión de este hilo para `path` (se abre la primera vez y se reutiliza)."""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    con = conns.get(path)
+    if con is None:
+        con = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, cached_statements=256)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conns[path] = con
+    return con
+
+
+def close_conns():
+    """Cierra las conexiones del hilo actual."""
+    conns = getattr(_local, "conns", None) or {}
+    for con in conns.values():
+        con.close()
+    conns.clear()
+
+
+def ensure_schema(path: str = DB_PATH):
+    """Crea las tablas users e interactions si faltan. Solo hace trabajo la primera vez."""
+    if path in _schema_ready:
+        return
+    with _lock:
+        if path in _schema_ready:
+            return
+        con = get_conn(path)
+        with con:
+            con.execute("""CREATE TABLE IF NOT EXISTS users(
+                id INTEGER PRIMARY KEY, username TEXT UNIQUE, age INTEGER, grade TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP)""")
+            con.execute("""CREATE TABLE IF NOT EXISTS interactions(
+                id INTEGER PRIMARY KEY, user_id INTEGER, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                prompt TEXT, response TEXT, intent TEXT, topic TEXT, difficulty INTEGER, solved INTEGER)""")
+        _schema_ready.add(path)
+
+
+def get_user_id(username: str, age, grade, path: str = DB_PATH) -> int:
+    """id del usuario (lo crea si no existe). Tras la primera vez sale de memoria."""
+    key = (path, username)
+    uid = _user_ids.get(key)
+    if uid is not None:
+        return uid
+    ensure_schema(path)
+    con = get_conn(path)
+    with con:
+        con.execute("INSERT OR IGNORE INTO users(username,age,grade) VALUES(?,?,?)",
+                    (username, age, grade))
+        uid = con.execute("SELECT id FROM users WHERE username=?", (username,)).fetchone()[0]
+    _user_ids[key] = uid
+    return uid
@@ -0,0 +1,106 @@
+# docstore.py
+"""
+Filas del índice RAG en columnas compactas (sustituye al DataFrame DF_DOCS).
+
+- id / doc_id: arrays int64.
+- kind, title, topic, grade: categóricas; un código por fila (uint8/uint16/int32)
+  y la lista de valores distintos (cadenas internadas, una sola vez en memoria).
+- heading, text: todo el texto de la columna en un único buffer UTF-8 y un
+  array de offsets; la fila i es buf[off[i]:off[i+1]].
+
+Leer una fila es O(1) (un índice en un array y un slice) y no crea objetos de
+pandas: cuesta microsegundos por resultado. En memoria ocupa poco más que el
+propio texto, sin la cabecera de cada str de una columna object.
+Los NULL de SQLite se guardan como "" (y -1 en las numéricas).
+"""
+import sys
+import numpy as np
+
+CATEGORICAL = ("kind", "title", "topic", "grade")
+NUMERIC = ("id", "doc_id")
+
+
+def _codes_dtype(n: int):
+    if n <= 1 << 8:
+        return np.uint8
+    if n <= 1 << 16:
+        return np.uint16
+    return np.int32
+
+
+class DocStore:
+    def __init__(self, ids, numeric: dict, categorical: dict, packed: dict, columns: list[str]):
+        self.ids = ids                    # int64, ordenados (alineados con los vectores)
+        self._num = numeric               # columna → array int64
+        self._cat = categorical           # columna → (códigos, valores)
+        self._packed = packed             # columna → (buffer UTF-8, offsets int64 de n+1)
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, names, rows, categorical=CATEGORICAL) -> "DocStore":
+        """Construye el almacén a partir de filas (tuplas) con las columnas `names`."""
+        names = list(names)
+        cols = list(zip(*rows)) if rows else [()] * len(names)
+        num, cat, packed = {}, {}, {}
+        for name, values in zip(names, cols):
+            if name in NUMERIC:
+                num[name] = np.array([-1 if v is None else v for v in values], dtype=np.int64)
+            elif name in categorical:
+                lookup, uniques = {}, []
+                codes = []
+                for v in values:
+                    v = "" if v is None else str(v)
+                    c = lookup.get(v)
+                    if c is None:
+                        c = lookup[v] = len(uniques)
+                        uniques.append(sys.intern(v))
+                    codes.append(c)
+                cat[name] = (np.array(codes, dtype=_codes_dtype(len(uniques))), uniques)
+            else:
+                encoded = [("" if v is None else str(v)).encode("utf-8") for v in values]
+                offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+                np.cumsum([len(b) for b in encoded], out=offsets[1:])
+                packed[name] = (b"".join(encoded), offsets)
+        ids = num.get("id", np.arange(len(rows), dtype=np.int64))
+        return cls(ids, num, cat, packed, names)
+
+    @classmethod
+    def from_query(cls, con, sql: str, params=()) -> "DocStore":
+        cur = con.execute(sql, params)
+        names = [d[0] for d in cur.description]
+        return cls.from_rows(names, cur.fetchall())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get(self, i: int, col: str):
+        """Valor de la columna `col` en la fila i."""
+        if col in self._cat:
+            codes, values = self._cat[col]
+            return values[codes[i]]
+        if col in self._packed:
+            buf, off = self._packed[col]
+            return buf[off[i]:off[i + 1]].decode("utf-8")
+        return int(self._num[col][i])
+
+    def row(self, i: int) -> dict:
+        """Fila i como diccionario {columna: valor}."""
+        return {c: self.get(i, c) for c in self.columns}
+
+    def column(self, col: str) -> list:
+        """Columna completa como lista (para construir particiones al cargar)."""
+        if col in self._cat:
+            codes, values = self._cat[col]
+            return [values[c] for c in codes.tolist()]
+        if col in self._packed:
+            return [self.get(i, col) for i in range(len(self))]
+        return self._num[col].tolist()
+
+    def nbytes(self) -> int:
+        """Memoria aproximada de los datos (arrays, buffers y valores de las categóricas)."""
+        total = sum(a.nbytes for a in self._num.values())
+        for codes, values in self._cat.values():
+            total += codes.nbytes + sum(sys.getsizeof(v) for v in values)
+        for buf, off in self._packed.values():
+            total += len(buf) + off.nbytes
+        return total
@@ -0,0 +1,162 @@
+# emb_cache.py
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import weakref
+import numpy as np
+
+import db
+from cache_utils import LRUCache, normalize_query
+
+EMB_CACHE_PATH = "emb_cache.sqlite"
+
+# SQLite limita el número de parámetros por consulta
+_SQL_BATCH = 500
+
+_open_caches = weakref.WeakSet()      # para reabrir sus conexiones tras un fork
+
+
+def text_hash(text: str) -> str:
+    """sha256 del texto (utf-8). Es la clave de contenido de la caché."""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Caché persistente de embeddings en SQLite.
+    Clave: (modelo, sha256 del texto). Valor: vector float32 guardado como BLOB.
+    Sobrevive a `ingest.py --reset`: solo se recalcula lo que cambia.
+    """
+
+    def __init__(self, path: str = EMB_CACHE_PATH):
+        self.path = path
+        # La API la usa desde varios hilos: una conexión protegida con un lock
+        self.con = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        _open_caches.add(self)
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings(
+                model TEXT,
+                sha   TEXT,
+                dim   INTEGER,
+                vec   BLOB,
+                PRIMARY KEY(model, sha)
+            )
+        """)
+        self.con.commit()
+
+    def get_many(self, model: str, hashes) -> dict[str, np.ndarray]:
+        """Devuelve {sha: vector} para los hashes que ya están en caché."""
+        hashes = list(hashes)
+        out = {}
+        for i in range(0, len(hashes), _SQL_BATCH):
+            batch = hashes[i:i+_SQL_BATCH]
+            marks = ",".join("?" * len(batch))
+            with self._lock:
+                rows = self.con.execute(
+                    f"SELECT sha, vec FROM embeddings WHERE model=? AND sha IN ({marks})",
+                    (model, *batch)
+                ).fetchall()
+            for sha, blob in rows:
+                out[sha] = np.frombuffer(blob, dtype=np.float32)
+        return out
+
+    def put_many(self, model: str, hashes, embs):
+        """Guarda los vectores (n, d) bajo sus hashes, en una sola transacción."""
+        rows = [
+            (model, sha, int(len(v)), np.asarray(v, dtype=np.float32).tobytes())
+            for sha, v in zip(hashes, embs)
+        ]
+        with self._lock, self.con:
+            self.con.executemany(
+                "INSERT OR REPLACE INTO embeddings(model, sha, dim, vec) VALUES(?,?,?,?)",
+                rows
+            )
+
+    def close(self):
+        _open_caches.discard(self)
+        self.con.close()
+
+    def _reopen(self):
+        """En un worker recién creado: conexión propia (la del padre no se toca, ver db.py)."""
+        db.keep_inherited(self.con)
+        self.con = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+
+@db.on_fork_child
+def _after_fork():
+    for cache in list(_open_caches):
+        cache._reopen()
+
+
+class QueryEmbeddingCache:
+    """
+    Caché de embeddings de preguntas para la API, en dos niveles:
+      1. LRU en memoria (tamaño máximo + TTL).
+      2. Opcional: EmbeddingCache en SQLite, que sobrevive a reinicios.
+    Clave: (modelo, pregunta normalizada con normalize_query).
+    """
+
+    def __init__(self, max_items: int = 2048, ttl: float | None = 86400,
+                 persist_path: str | None = None):
+        self.memory = LRUCache(max_items=max_items, ttl=ttl)
+        self.disk = EmbeddingCache(persist_path) if persist_path else None
+        self.disk_hits = 0
+
+    @staticmethod
+    def key(text: str) -> str:
+        return normalize_query(text)
+
+    def get(self, model: str, key: str):
+        v = self.memory.get((model, key))
+        if v is None and self.disk is not None:
+            v = self._get_disk(model, key)
+        return v
+
+    def put(self, model: str, key: str, vec):
+        vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+        self.memory.put((model, key), vec)
+        if self.disk is not None:
+            self.disk.put_many(model, [text_hash(key)], [vec])
+
+    async def aget(self, model: str, key: str):
+        """Como get, desde el bucle de eventos: la memoria se mira aquí y SQLite en un hilo."""
+        v = self.memory.get((model, key))
+        if v is None and self.disk is not None:
+            v = await asyncio.to_thread(self._get_disk, model, key)
+        return v
+
+    async def aput(self, model: str, key: str, vec):
+        """Como put, desde el bucle de eventos (la escritura en SQLite va en un hilo)."""
+        vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+        self.memory.put((model, key), vec)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.put_many, model, [text_hash(key)], [vec])
+
+    def _get_disk(self, model: str, key: str):
+        v = self.disk.get_many(model, [text_hash(key)]).get(text_hash(key))
+        if v is not None:
+            self.disk_hits += 1
+            self.memory.put((model, key), v)
+        return v
+
+    def stats(self) -> dict:
+        """
+        Contadores de los dos niveles: un fallo en memoria que encuentra el
+        disco cuenta como acierto (hits = mem_hits + disk_hits).
+        """
+        st = self.memory.stats()
+        mem_hits = st["hits"]
+        misses = st["misses"] - self.disk_hits
+        total = mem_hits + self.disk_hits + misses
+        st.update(
+            hits=mem_hits + self.disk_hits,
+            misses=misses,
+            mem_hits=mem_hits,
+            disk_hits=self.disk_hits,
+            hit_ratio=round((mem_hits + self.disk_hits) / total, 4) if total else 0.0,
+            persistent=self.disk is not None,
+        )
+        return st
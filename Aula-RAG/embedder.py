@@ -0,0 +1,200 @@
+# embedder.py
+"""
+Embeddings por lotes para ingest.py: concurrentes, dentro de los límites de
+la API y reanudables.
+
+- Lotes por tokens estimados (tiktoken si está instalado; si no, ~3 caracteres
+  por token), con un máximo de textos por lote.
+- Hasta `concurrency` peticiones a la vez (hilos: el cliente síncrono de
+  OpenAI se puede compartir), sin pasar de los tokens y peticiones por minuto
+  de la cuenta (TokenBucket).
+- Los errores transitorios (429, 5xx, red, timeouts) se reintentan con espera
+  exponencial y aleatoria (respeta Retry-After si la API lo manda).
+- Cada lote terminado se entrega a `on_batch` en cuanto llega: ingest.py lo
+  guarda en la caché de embeddings (emb_cache.py), que hace de checkpoint.
+  Si el ingest se corta, al volver a ejecutarlo solo se piden los que faltan.
+"""
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "50000"))    # por petición (la API admite 300k)
+EMBED_BATCH_ITEMS = int(os.getenv("EMBED_BATCH_ITEMS", "512"))        # por petición (la API admite 2048)
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_TPM = int(os.getenv("EMBED_TPM", "1000000"))                    # tokens por minuto (0 = sin límite)
+EMBED_RPM = int(os.getenv("EMBED_RPM", "3000"))                       # peticiones por minuto (0 = sin límite)
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+
+_RETRY_STATUS = {408, 409, 429}
+_encoders = {}
+
+
+class EmbeddingError(RuntimeError):
+    """Un lote falló tras todos los reintentos (los anteriores ya están guardados)."""
+
+
+def estimate_tokens(texts, model: str = "text-embedding-3-small") -> list[int]:
+    """Tokens de cada texto: exactos con tiktoken; si no está, una estimación por exceso."""
+    enc = _encoders.get(model, False)
+    if enc is False:
+        try:
+            import tiktoken
+            try:
+                enc = tiktoken.encoding_for_model(model)
+            except KeyError:
+                enc = tiktoken.get_encoding("cl100k_base")
+        except Exception:              # sin tiktoken o sin sus tablas (p. ej. sin red)
+            enc = None
+        _encoders[model] = enc
+    if enc is None:
+        return [len(t) // 3 + 1 for t in texts]
+    return [len(enc.encode_ordinary(t)) for t in texts]
+
+
+def token_batches(tokens: list[int], max_tokens: int = EMBED_BATCH_TOKENS,
+                  max_items: int = EMBED_BATCH_ITEMS) -> list[tuple[int, int]]:
+    """Cortes [inicio, fin) consecutivos que no pasan de max_tokens ni de max_items."""
+    out, start, acc = [], 0, 0
+    for i, n in enumerate(tokens):
+        if i > start and (acc + n > max_tokens or i - start >= max_items):
+            out.append((start, i))
+            start, acc = i, 0
+        acc += n
+    if start < len(tokens):
+        out.append((start, len(tokens)))
+    return out
+
+
+class TokenBucket:
+    """Limitador de cubo de fichas: `rate` por minuto, con ráfagas de hasta un minuto."""
+
+    def __init__(self, rate_per_min: float):
+        self.rate = rate_per_min / 60.0
+        self.capacity = float(rate_per_min)
+        self.tokens = self.capacity
+        self._t = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, n: float = 1.0):
+        """Espera hasta poder gastar n fichas. Sin límite (rate 0) no espera nunca."""
+        if self.rate <= 0:
+            return
+        n = min(n, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self._t) * self.rate)
+                self._t = now
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                falta = (n - self.tokens) / self.rate
+            time.sleep(falta)
+
+
+def _transitorio(e: Exception) -> bool:
+    status = getattr(e, "status_code", None)
+    if status is not None:
+        return status in _RETRY_STATUS or status >= 500
+    name = type(e).__name__
+    return name in ("APIConnectionError", "APITimeoutError") or isinstance(e, (ConnectionError, TimeoutError))
+
+
+def _retry_after(e: Exception) -> float | None:
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class EmbeddingDriver:
+    def __init__(self, client, model: str, *, max_tokens: int = EMBED_BATCH_TOKENS,
+                 max_items: int = EMBED_BATCH_ITEMS, concurrency: int = EMBED_CONCURRENCY,
+                 tpm: int = EMBED_TPM, rpm: int = EMBED_RPM, max_retries: int = EMBED_MAX_RETRIES,
+                 backoff: float = 1.0):
+        self.client = client
+        self.model = model
+        self.max_tokens = max_tokens
+        self.max_items = max_items
+        self.concurrency = max(1, concurrency)
+        self.tpm = TokenBucket(tpm)
+        self.rpm = TokenBucket(rpm)
+        self.max_retries = max_retries
+        self.backoff = backoff           # espera del primer reintento (s); se dobla en cada uno
+        self.retries = 0
+
+    def _call(self, batch: list[str], tokens: int) -> np.ndarray:
+        for intento in range(self.max_retries + 1):
+            self.rpm.acquire(1)
+            self.tpm.acquire(tokens)
+            try:
+                resp = self.client.embeddings.create(model=self.model, input=batch)
+                return np.array([d.embedding for d in resp.data], dtype=np.float32)
+            except Exception as e:
+                if intento == self.max_retries or not _transitorio(e):
+                    raise
+                espera = _retry_after(e) or min(60.0, self.backoff * 2 ** intento) * (0.5 + random.random())
+                self.retries += 1
+                print(f"  ! Error transitorio ({type(e).__name__}); reintento {intento + 1} en {espera:.1f}s")
+                time.sleep(espera)
+
+    def run(self, texts: list[str], on_batch=None) -> np.ndarray:
+        """
+        Embeddings de `texts` en orden, forma (n, d). `on_batch(inicio, fin, embs)`
+        se llama (en este hilo) con cada lote en cuanto termina.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        tokens = estimate_tokens(texts, self.model)
+        cortes = token_batches(tokens, self.max_tokens, self.max_items)
+        out = [None] * len(cortes)
+        total = sum(tokens)
+        hechos = hechos_tok = 0
+        t0 = time.perf_counter()
+        print(f"  → {len(texts)} textos, ~{total} tokens, {len(cortes)} lotes, "
+              f"{self.concurrency} peticiones a la vez")
+
+        error = None
+        pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed")
+        try:
+            pendientes = {
+                pool.submit(self._call, texts[a:b], sum(tokens[a:b])): j
+                for j, (a, b) in enumerate(cortes)
+            }
+            while pendientes:
+                listos, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+                for fut in listos:
+                    j = pendientes.pop(fut)
+                    a, b = cortes[j]
+                    if fut.cancelled():
+                        continue
+                    try:
+                        out[j] = fut.result()
+                    except Exception as e:
+                        # No se lanzan más lotes; los que ya están en vuelo se guardan igualmente
+                        if error is None:
+                            error = (j, e)
+                            for f in pendientes:
+                                f.cancel()
+                        continue
+                    if on_batch is not None:
+                        on_batch(a, b, out[j])
+                    hechos += 1
+                    hechos_tok += sum(tokens[a:b])
+                    dt = time.perf_counter() - t0
+                    print(f"  → Lote {hechos}/{len(cortes)} ({b - a} textos) · "
+                          f"{hechos_tok / max(dt, 1e-9):,.0f} tokens/s")
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+        if error is not None:
+            j, e = error
+            raise EmbeddingError(
+                f"el lote {j + 1}/{len(cortes)} falló: {e}. Los {hechos} lotes terminados "
+                f"ya están guardados; vuelve a ejecutar el ingest para continuar"
+            ) from e
+        return np.vstack(out)
@@ -0,0 +1,45 @@
+# gunicorn.conf.py
+"""
+Varios workers que comparten un único índice cargado:
+
+    gunicorn api:app -c gunicorn.conf.py          (WEB_CONCURRENCY=16 para 16 workers)
+
+- preload_app: el proceso maestro importa api.py y carga el índice
+  (app.startup) UNA vez, y después crea los workers con fork. Los workers ven
+  esa memoria en copia-en-escritura: solo lo que se modifica se duplica.
+- Los vectores están en np.memmap (vector_store.py) y el BM25 en SQLite: en
+  cualquier caso son páginas de la caché del SO, compartidas por todos.
+- gc.freeze() antes del fork saca los objetos ya cargados de las pasadas del
+  recolector; si no, al recorrerlos tocaría sus páginas y el worker acabaría
+  copiándolas.
+- Los hilos en segundo plano (registro de interacciones, vigilancia de
+  vecs/CURRENT) y los clientes HTTP se crean en cada worker, en el lifespan de
+  api.py; las conexiones SQLite del maestro se sustituyen tras el fork (db.py).
+
+Cuando ingest.py publica una generación nueva, cada worker la carga por su
+cuenta (las filas dejan de compartirse hasta reiniciar gunicorn).
+Las métricas de /metrics son de cada worker.
+"""
+import gc
+import os
+
+bind = os.getenv("BIND", "127.0.0.1:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+
+def when_ready(server):
+    # api.py ya está importado (preload_app) y aún no hay workers: se carga el índice aquí
+    import app
+    app.startup()
+    gc.collect()
+    gc.freeze()
+    server.log.info("Índice precargado; %d objetos congelados para el GC", gc.get_freeze_count())
+
+
+def post_fork(server, worker):
+    server.log.info("Worker %s listo (comparte el índice del maestro)", worker.pid)
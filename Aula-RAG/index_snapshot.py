@@ -0,0 +1,218 @@
+# index_snapshot.py
+"""
+Generaciones del índice RAG y cambio en caliente (sin reiniciar la API).
+
+Disposición en disco:
+    vecs/CURRENT                 nombre de la generación activa
+    vecs/gen-20250101-120000/    una generación completa, que no se vuelve a tocar:
+        all_emb.vst              vectores normalizados (vector_store.py)
+        index.sqlite             copia de docs + chunks y su tabla FTS5
+        ivf.npz                  índice ANN (opcional)
+        manifest.json            filas, dimensión, modelo, fecha...
+
+ingest.py escribe la generación en una carpeta temporal, la renombra y solo
+entonces cambia CURRENT (os.replace, atómico). Vectores y filas viajan juntos,
+así que la API nunca ve unos vectores que no cuadren con los documentos.
+
+La API guarda el índice activo en un SnapshotManager: un hilo vigila CURRENT
+(o se fuerza con /admin/reload), carga la generación nueva en segundo plano y
+la cambia de golpe. Cada búsqueda toma el snapshot una vez al empezar, así que
+las peticiones en vuelo terminan con el que tenían.
+"""
+import os
+import json
+import time
+import shutil
+import threading
+
+CURRENT_FILE = "CURRENT"
+MANIFEST = "manifest.json"
+GEN_PREFIX = "gen-"
+KEEP_GENERATIONS = 3
+
+
+def _fsync_dir(path: str):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def current_generation(vecs_dir: str) -> str | None:
+    """Nombre de la generación activa, o None si no hay (índice antiguo sin generaciones)."""
+    try:
+        with open(os.path.join(vecs_dir, CURRENT_FILE), encoding="utf-8") as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    if name and os.path.isdir(os.path.join(vecs_dir, name)):
+        return name
+    return None
+
+
+def new_generation(vecs_dir: str) -> tuple[str, str]:
+    """Reserva un nombre de generación y crea su carpeta temporal. Devuelve (nombre, ruta temporal)."""
+    os.makedirs(vecs_dir, exist_ok=True)
+    base = GEN_PREFIX + time.strftime("%Y%m%d-%H%M%S")
+    name, n = base, 1
+    while os.path.exists(os.path.join(vecs_dir, name)):
+        n += 1
+        name = f"{base}-{n}"
+    tmp = os.path.join(vecs_dir, f".tmp-{name}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    return name, tmp
+
+
+def publish_generation(vecs_dir: str, name: str, tmp: str, manifest: dict,
+                       keep: int = KEEP_GENERATIONS) -> str:
+    """Cierra la generación (manifest), la renombra a su nombre final y apunta CURRENT a ella."""
+    manifest = {"generation": name, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), **manifest}
+    with open(os.path.join(tmp, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    _fsync_dir(tmp)
+    final = os.path.join(vecs_dir, name)
+    os.replace(tmp, final)
+
+    cur_tmp = os.path.join(vecs_dir, CURRENT_FILE + ".tmp")
+    with open(cur_tmp, "w", encoding="utf-8") as f:
+        f.write(name + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(cur_tmp, os.path.join(vecs_dir, CURRENT_FILE))
+    _fsync_dir(vecs_dir)
+    prune_generations(vecs_dir, keep)
+    return final
+
+
+def prune_generations(vecs_dir: str, keep: int = KEEP_GENERATIONS):
+    """
+    Borra las generaciones más antiguas (se conservan `keep`, incluida la activa).
+    Un proceso que aún tenga abierta una generación borrada sigue leyéndola
+    (los archivos abiertos / mapeados no desaparecen hasta cerrarse).
+    """
+    current = current_generation(vecs_dir)
+    gens = sorted(d for d in os.listdir(vecs_dir)
+                  if d.startswith(GEN_PREFIX) and os.path.isdir(os.path.join(vecs_dir, d)))
+    for d in gens[:max(0, len(gens) - keep)]:
+        if d != current:
+            shutil.rmtree(os.path.join(vecs_dir, d), ignore_errors=True)
+
+
+def read_manifest(gen_dir: str) -> dict:
+    try:
+        with open(os.path.join(gen_dir, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class IndexSnapshot:
+    """Todo lo que usa una búsqueda, de una misma generación: filas, vectores y BM25."""
+
+    def __init__(self, generation: str | None, docs, index, lexical=None, db_path: str | None = None):
+        self.generation = generation
+        self.docs = docs                 # DocStore con las filas (alineado con index)
+        self.index = index               # VectorIndex
+        self.lexical = lexical           # LexicalIndex o None
+        self.db_path = db_path
+        self.partitions = None           # se crean al primer filtro (ver app._particiones)
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.docs)
+
+    def info(self) -> dict:
+        return {"generation": self.generation, "rows": len(self.docs),
+                "docs_mb": round(self.docs.nbytes() / 2**20, 2),
+                "ann": self.index.ann is not None, "lexical": self.lexical is not None,
+                "quant": self.index.quant.kind if self.index.quant is not None else None,
+                "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.loaded_at))}
+
+
+class SnapshotManager:
+    """
+    Guarda el IndexSnapshot activo y lo sustituye cuando cambia CURRENT.
+    `loader(generation)` construye el snapshot (generation=None → índice antiguo).
+    Si la carga falla, se sigue con el snapshot anterior.
+    """
+
+    def __init__(self, loader, vecs_dir: str, interval: float = 10.0, on_swap=None):
+        self.loader = loader
+        self.vecs_dir = vecs_dir
+        self.interval = interval
+        self.on_swap = on_swap
+        self.current = None
+        self.reloads = 0
+        self.errors = 0
+        self._failed = None              # última generación que no se pudo cargar (no se reintenta sola)
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self) -> IndexSnapshot:
+        snap = self.current
+        if snap is None:
+            self.reload()
+            snap = self.current
+        return snap
+
+    def reload(self, force: bool = False) -> dict:
+        """Carga la generación de CURRENT si es distinta de la activa (o siempre, con force)."""
+        with self._load_lock:
+            prev = self.current
+            gen = current_generation(self.vecs_dir)
+            if prev is not None and not force and gen in (prev.generation, self._failed):
+                return {"changed": False, **prev.info()}
+            t0 = time.perf_counter()
+            try:
+                snap = self.loader(gen)
+            except Exception as e:
+                self.errors += 1
+                self._failed = gen
+                print(f"[INDEX] Error cargando la generación {gen}: {e}")
+                if prev is None:
+                    raise
+                return {"changed": False, "error": str(e), **prev.info()}
+            self.current = snap                  # cambio atómico: una sola asignación
+            self._failed = None
+            self.reloads += 1
+        print(f"[INDEX] Índice activo: {gen or 'sin generaciones'} ({len(snap)} filas, "
+              f"{time.perf_counter() - t0:.2f}s)")
+        if prev is not None and self.on_swap is not None:
+            self.on_swap(prev, snap)
+        return {"changed": prev is None or prev.generation != snap.generation or force,
+                "previous": prev.generation if prev else None, **snap.info()}
+
+    def start(self):
+        """Arranca el hilo que vigila CURRENT cada `interval` segundos."""
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="index-reload", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.reload()
+            except Exception as e:
+                print("[INDEX] Error vigilando generaciones:", e)
+
+    def stats(self) -> dict:
+        snap = self.current
+        return {**(snap.info() if snap else {}), "reloads": self.reloads, "errors": self.errors}
@@ -1,114 +1,100 @@
 # ingest.py (versión mejorada)
 import os
-import glob
 import sqlite3
 import numpy as np
-import pandas as pd
 import argparse
+import itertools
+import time
 
 from openai import OpenAI
 from dotenv import load_dotenv
+from emb_cache import EmbeddingCache, text_hash, EMB_CACHE_PATH
+from chunking import split_markdown, CHUNK_MAX_CHARS, CHUNK_OVERLAP
+from vector_store import VectorStoreWriter, open_store, write_store, FLAG_NORMALIZED
+from search import normalize_rows
+from ann import IVFIndex
+from quant import write_quantized, QUANT_KINDS
+from lexical import rebuild_fts
+from index_snapshot import new_generation, publish_generation
+from embedder import EmbeddingDriver, EMBED_CONCURRENCY
+from sources import iter_items, sources_bytes, default_workers
 
 load_dotenv()
 
 DB_PATH = "db.sqlite"
-VECS_DIR = "vecs"
-VECS_PATH = os.path.join(VECS_DIR, "all_emb.npy")
+VECS_DIR = "vecs"                 # cada ingest publica aquí una generación (ver index_snapshot.py)
+VECS_FILE = "all_emb.vst"         # ver vector_store.py
+INDEX_DB_FILE = "index.sqlite"    # docs + chunks + FTS5 de la generación
+ANN_FILE = "ivf.npz"              # índice aproximado (opcional)
+EMB_MODEL = "text-embedding-3-small"
+
+# Tamaños de lote del ingest en streaming (la memoria depende de esto, no del corpus)
+INSERT_BATCH = int(os.getenv("INGEST_INSERT_BATCH", "5000"))     # filas por transacción
+EMBED_WINDOW = int(os.getenv("INGEST_EMBED_WINDOW", "20000"))    # trozos por ventana de embeddings
 
 client = OpenAI()
 
 
 # ---------- EMBEDDINGS ----------
 
-def embed_texts(texts, batch_size=64):
+def embed_texts(texts, concurrency=EMBED_CONCURRENCY, on_batch=None):
     """
-    Genera embeddings para una lista de textos en batches.
+    Genera embeddings para una lista de textos: lotes por tokens, varias
+    peticiones a la vez y reintentos (ver embedder.py).
+    `on_batch(inicio, fin, embs)` recibe cada lote en cuanto termina.
     Devuelve un np.array de forma (n, d).
     """
-    all_embs = []
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i+batch_size]
-        print(f"  → Embedding batch {i}–{i+len(batch)-1} de {len(texts)}")
-        resp = client.embeddings.create(
-            model="text-embedding-3-small",
-            input=batch
-        )
-        embs = [d.embedding for d in resp.data]
-        all_embs.extend(embs)
-    return np.array(all_embs, dtype=np.float32)
+    driver = EmbeddingDriver(client, EMB_MODEL, concurrency=concurrency)
+    return driver.run(list(texts), on_batch=on_batch)
 
 
-# ---------- LECTURA DE FUENTES ----------
-
-def read_markdowns():
+def embed_with_cache(texts, cache, concurrency=EMBED_CONCURRENCY):
     """
-    Lee todos los .md en data/temas.
-    Devuelve lista de tuplas: (kind, title, topic, grade, text)
+    Como embed_texts, pero solo llama a la API para los textos que no están
+    en la caché (clave: modelo + sha256 del texto). Cada lote se guarda en la
+    caché al terminar: si el ingest se interrumpe, la siguiente ejecución
+    continúa donde se quedó.
+    Devuelve (np.array (n, d), hits, misses), contando filas.
     """
-    out = []
-    pattern = os.path.join("data", "temas", "*.md")
-    files = glob.glob(pattern)
+    hashes = [text_hash(t) for t in texts]
+    cached = cache.get_many(EMB_MODEL, set(hashes))
 
-    if not files:
-        print("No se han encontrado .md en data/temas/")
-        return out
+    # Textos nuevos o modificados (sin repetir los duplicados)
+    pending = {}
+    for sha, t in zip(hashes, texts):
+        if sha not in cached and sha not in pending:
+            pending[sha] = t
 
-    print(f"Encontrados {len(files)} archivos .md en data/temas/")
-    for fp in sorted(files):
-        with open(fp, "r", encoding="utf-8") as f:
-            text = f.read()
+    hits = sum(1 for sha in hashes if sha in cached)
+    misses = len(hashes) - hits
 
-        title = os.path.splitext(os.path.basename(fp))[0]
-        parts = title.split("_")
-        topic = parts[0] if parts else ""
-        grade = parts[-1] if len(parts) > 1 else ""
+    if pending:
+        keys = list(pending.keys())
 
-        out.append((
-            "teoria",
-            title,
-            topic,
-            grade,
-            text
-        ))
-    return out
+        def checkpoint(a, b, embs):
+            cache.put_many(EMB_MODEL, keys[a:b], embs)
+            cached.update(zip(keys[a:b], embs))
 
+        embed_texts(list(pending.values()), concurrency=concurrency, on_batch=checkpoint)
 
-def read_exercises():
-    """
-    Lee todos los .csv en data/ejercicios.
-    Devuelve lista de tuplas: (kind, title, topic, grade, text)
-    """
-    out = []
-    pattern = os.path.join("data", "ejercicios", "*.csv")
-    files = glob.glob(pattern)
-
-    if not files:
-        print("No se han encontrado .csv en data/ejercicios/")
-        return out
+    if not hashes:
+        return np.zeros((0, 0), dtype=np.float32), hits, misses
+    embs = np.vstack([cached[sha] for sha in hashes]).astype(np.float32, copy=False)
+    return embs, hits, misses
 
-    print(f"Encontrados {len(files)} archivos .csv en data/ejercicios/")
-    for fp in sorted(files):
-        # Por tu comentario, el CSV va con separador ;
-        df = pd.read_csv(fp, sep=';')
-        df.columns = [c.strip().lower() for c in df.columns]
 
-        for _, r in df.iterrows():
-            topic = r.get("topic", "") if not pd.isna(r.get("topic", "")) else ""
-            grade = r.get("grade", "") if not pd.isna(r.get("grade", "")) else ""
-            enun = r.get("enunciado", "")
-            sol = r.get("solucion", "")
-
-            title = f"Ejercicio: {topic}".strip()
-            text = f"Enunciado: {enun}\nSolucion: {sol}"
+# ---------- LECTURA DE FUENTES ----------
+# Los items se leen (en paralelo, ver sources.py), insertan y trocean por
+# lotes, sin tener nunca todo el contenido en memoria.
 
-            out.append((
-                "ejercicio",
-                title,
-                topic,
-                grade,
-                text
-            ))
-    return out
+def batched(iterable, n):
+    """Lista de hasta n elementos cada vez."""
+    it = iter(iterable)
+    while True:
+        batch = list(itertools.islice(it, n))
+        if not batch:
+            return
+        yield batch
 
 
 # ---------- BASE DE DATOS ----------
@@ -116,7 +102,7 @@ def read_exercises():
 def init_db(reset=False):
     """
     Crea la BD y la tabla docs. Si reset=True, borra antes el archivo DB.
-    Añade una UNIQUE constraint para evitar duplicados.
+    Cada documento es único por su clave de origen (`source`, ver sources.py).
     """
     if reset and os.path.exists(DB_PATH):
         print(f"Borrando base de datos existente: {DB_PATH}")
@@ -125,80 +111,321 @@ def init_db(reset=False):
     con = sqlite3.connect(DB_PATH)
     cur = con.cursor()
 
-    # UNIQUE para evitar insertar dos veces el mismo texto con mismos metadatos
+    # Tabla docs anterior (sin clave de origen, con duplicados de cada ejecución):
+    # se vacía, se vuelve a llenar desde las fuentes y los embeddings salen de la caché
+    cols = [r[1] for r in cur.execute("PRAGMA table_info(docs)")]
+    if cols and "source" not in cols:
+        print("Tabla docs sin clave de origen: se regenera desde data/")
+        with con:
+            cur.execute("DROP TABLE docs")
+            cur.execute("DROP TABLE IF EXISTS chunks")
+
+    # source: archivo y registro de origen; run: última ejecución que lo ha leído
     cur.execute("""
         CREATE TABLE IF NOT EXISTS docs(
             id INTEGER PRIMARY KEY,
-            kind  TEXT,
-            title TEXT,
-            topic TEXT,
-            grade TEXT,
-            text  TEXT,
-            UNIQUE(kind, title, topic, grade, text)
+            kind   TEXT,
+            title  TEXT,
+            topic  TEXT,
+            grade  TEXT,
+            text   TEXT,
+            source TEXT UNIQUE,
+            run    INTEGER
+        )
+    """)
+    # Trozos (chunks) de cada documento: son las filas que se indexan
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS chunks(
+            id      INTEGER PRIMARY KEY,
+            doc_id  INTEGER REFERENCES docs(id),
+            idx     INTEGER,
+            heading TEXT,
+            text    TEXT
         )
     """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks(doc_id)")
     con.commit()
     return con
 
 
-def insert_items(con, items):
+def insert_items(con, items, batch_size=INSERT_BATCH, stages=None, run=None):
     """
-    Inserta una lista de items en la tabla docs, ignorando duplicados.
+    Inserta o actualiza los items (lista o generador de tuplas
+    (kind, title, topic, grade, text, source)) en la tabla docs por su clave
+    de origen, en transacciones de `batch_size` filas: un documento editado
+    conserva su id. Todos quedan marcados con la ejecución `run`.
+    Con `stages` (Stages) separa el tiempo esperando a la lectura del de la BD.
+    Devuelve el número de items leídos.
     """
-    if not items:
+    cur = con.cursor()
+    if run is None:
+        run = next_run(con)
+    read = 0
+    t_read = t_db = 0.0
+    batches = batched(items, batch_size)
+    while True:
+        t0 = time.perf_counter()
+        batch = next(batches, None)
+        t1 = time.perf_counter()
+        t_read += t1 - t0
+        if batch is None:
+            break
+        with con:
+            cur.executemany("""
+                INSERT INTO docs(kind, title, topic, grade, text, source, run)
+                VALUES(?,?,?,?,?,?,?)
+                ON CONFLICT(source) DO UPDATE SET
+                    kind=excluded.kind, title=excluded.title, topic=excluded.topic,
+                    grade=excluded.grade, text=excluded.text, run=excluded.run
+            """, [item + (run,) for item in batch])
+        t_db += time.perf_counter() - t1
+        read += len(batch)
+    if stages is not None:
+        stages.add("lectura", t_read, read, "items")
+        stages.add("inserción", t_db, read, "items")
+
+    if not read:
         print("No hay items para insertar en la BD.")
         return 0
 
-    cur = con.cursor()
-    cur.executemany("""
-        INSERT OR IGNORE INTO docs(kind, title, topic, grade, text)
-        VALUES(?,?,?,?,?)
-    """, items)
-    con.commit()
-
     # Número real de filas en BD
     cur.execute("SELECT COUNT(*) FROM docs")
     total_rows = cur.fetchone()[0]
-    print(f"BD actualizada. Total de filas en docs: {total_rows}")
-    return total_rows
+    print(f"Items leídos: {read}. BD actualizada. Total de filas en docs: {total_rows}")
+    return read
+
+
+def next_run(con) -> int:
+    """Número de esta ejecución del ingest (marca las filas leídas en ella)."""
+    return con.execute("SELECT COALESCE(MAX(run), 0) + 1 FROM docs").fetchone()[0]
+
+
+def prune_docs(con, run) -> int:
+    """
+    Borra los documentos que no se han leído en la ejecución `run`
+    (archivos o registros que ya no están en data/). Devuelve cuántos.
+    """
+    with con:
+        n = con.execute("DELETE FROM docs WHERE run IS NOT ?", (run,)).rowcount
+    if n:
+        print(f"Documentos eliminados (ya no están en las fuentes): {n}")
+    return n
+
+
+def rebuild_chunks(con, max_chars=CHUNK_MAX_CHARS, overlap=CHUNK_OVERLAP):
+    """
+    Regenera la tabla chunks a partir de docs (es barato y determinista;
+    los embeddings de los trozos que no cambian salen de la caché).
+    """
+    def chunks():
+        # Cursor propio: se van leyendo documentos mientras se insertan trozos
+        for doc_id, text in con.cursor().execute("SELECT id, text FROM docs ORDER BY id"):
+            for idx, (heading, chunk) in enumerate(split_markdown(text or "", max_chars, overlap)):
+                yield (doc_id, idx, heading, chunk)
+
+    cur = con.cursor()
+    n = 0
+    with con:          # una sola transacción: la tabla nunca queda a medias
+        cur.execute("DELETE FROM chunks")
+        for batch in batched(chunks(), INSERT_BATCH):
+            cur.executemany(
+                "INSERT INTO chunks(doc_id, idx, heading, text) VALUES(?,?,?,?)",
+                batch
+            )
+            n += len(batch)
+    print(f"Trozos generados: {n} (máx. {max_chars} caracteres, solape {overlap})")
+    return n
 
 
 # ---------- MAIN ----------
 
-def main(reset_db=False):
+class Stages:
+    """Tiempo y unidades procesadas por etapa, para el resumen del ingest."""
+
+    def __init__(self):
+        self.stages = {}             # nombre → [segundos, cantidad, unidad, bytes]
+
+    def add(self, name, seconds, count, unit, nbytes=0):
+        st = self.stages.setdefault(name, [0.0, 0, unit, 0])
+        st[0] += seconds
+        st[1] += count
+        st[3] += nbytes
+
+    def timed(self, name, unit):
+        """Bloque cronometrado: `with stages.timed("troceado", "trozos") as st: st.count = n`."""
+        return _StageBlock(self, name, unit)
+
+    def report(self):
+        print("   → Etapas:")
+        for name, (sec, count, unit, nbytes) in self.stages.items():
+            rate = f"{count / sec:,.0f} {unit}/s" if sec > 0 else "-"
+            mb = f", {nbytes / 2**20 / sec:,.1f} MB/s" if nbytes and sec > 0 else ""
+            print(f"      {name:<12} {sec:>8.2f}s  {count:>10,} {unit:<7} {rate}{mb}")
+
+
+class _StageBlock:
+    def __init__(self, stages, name, unit):
+        self.stages, self.name, self.unit = stages, name, unit
+        self.count = 0
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stages.add(self.name, time.perf_counter() - self.t0, self.count, self.unit)
+
+
+def embed_chunks(con, writer_path, cache, concurrency=EMBED_CONCURRENCY, window=EMBED_WINDOW):
+    """
+    Embeddings de la tabla chunks por ventanas de `window` trozos (en orden de id),
+    normalizados y añadidos al archivo de vectores según se calculan.
+    Devuelve (filas, dim, hits, misses).
+    """
+    writer = None
+    rows = hits = misses = 0
+    dim = 0
+    cur = con.cursor().execute("SELECT id, text FROM chunks ORDER BY id")
+    try:
+        while True:
+            batch = cur.fetchmany(window)
+            if not batch:
+                break
+            ids = np.fromiter((r[0] for r in batch), dtype=np.int64, count=len(batch))
+            embs, h, m = embed_with_cache([r[1] or "" for r in batch], cache, concurrency=concurrency)
+            # Se guardan normalizados: la API busca con un simple producto escalar
+            embs = normalize_rows(embs)
+            if writer is None:
+                dim = embs.shape[1]
+                writer = VectorStoreWriter(writer_path, dim, flags=FLAG_NORMALIZED)
+            writer.append(ids, embs)
+            rows += len(batch)
+            hits += h
+            misses += m
+            print(f"  → {rows} trozos con embedding")
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    if writer is None:
+        write_store(writer_path, np.zeros(0, dtype=np.int64), np.zeros((0, 0), dtype=np.float32),
+                    flags=FLAG_NORMALIZED)
+    else:
+        writer.close()
+    return rows, dim, hits, misses
+
+
+def build_ann(matrix, path, nlist=None):
+    """Construye y guarda el índice IVF sobre los vectores ya normalizados."""
+    t0 = time.perf_counter()
+    ivf = IVFIndex.build(matrix, nlist=nlist)
+    ivf.save(path)
+    print(f"   → Índice ANN (IVF, {ivf.nlist} listas) ({time.perf_counter() - t0:.2f}s)")
+    return ivf.nlist
+
+
+def write_index_db(path, src_path=DB_PATH):
+    """
+    Copia docs y chunks de la BD principal a la BD de la generación y crea
+    su índice FTS5. Así la API lee filas y BM25 de la misma foto que los vectores,
+    aunque se vuelva a ejecutar ingest.py mientras tanto.
+    """
+    con = sqlite3.connect(path)
+    try:
+        con.execute("ATTACH DATABASE ? AS src", (src_path,))
+        with con:
+            for name in ("docs", "chunks"):
+                ddl = con.execute(
+                    "SELECT sql FROM src.sqlite_master WHERE type='table' AND name=?", (name,)
+                ).fetchone()
+                con.execute(ddl[0])
+                con.execute(f"INSERT INTO main.{name} SELECT * FROM src.{name}")
+        con.execute("DETACH DATABASE src")
+        return rebuild_fts(con)
+    finally:
+        con.close()
+
+
+def main(reset_db=False, chunk_size=CHUNK_MAX_CHARS, chunk_overlap=CHUNK_OVERLAP,
+         ann=False, ann_nlist=None, embed_concurrency=EMBED_CONCURRENCY, workers=None,
+         quant=()):
     print("Iniciando ingest...")
+    stages = Stages()
 
     # 1. Inicializar BD
     con = init_db(reset=reset_db)
 
-    # 2. Leer fuentes
-    md_items = read_markdowns()
-    ex_items = read_exercises()
-
-    items = md_items + ex_items
-    print(f"Total de items leídos: {len(items)}")
+    # 2-3. Leer fuentes (en `workers` procesos, en orden) e insertarlas en BD por lotes
+    #      (actualizando por clave de origen). La lectura va por delante mientras se inserta
+    total_bytes = sources_bytes()
+    workers = workers or default_workers(total_bytes)
+    print(f"Leyendo fuentes con {workers} proceso(s)...")
+    run = next_run(con)
+    n_items = insert_items(con, iter_items(workers), stages=stages, run=run)
+    stages.add("lectura", 0.0, 0, "items", nbytes=total_bytes)
 
-    if not items:
+    if not n_items:
         print("No hay contenido en data/temas o data/ejercicios. Abortando ingest.")
         con.close()
         return
 
-    # 3. Insertar en BD (evitando duplicados)
-    insert_items(con, items)
-
-    # 4. Cargar de DB para asegurar orden e IDs
-    df = pd.read_sql_query("SELECT * FROM docs ORDER BY id", con)
-    con.close()
-
-    print(f"Generando embeddings para {len(df)} documentos...")
+    # 3b. Quitar lo que ya no está en las fuentes (solo tras leerlas enteras)
+    prune_docs(con, run)
+
+    # 4. Trocear los documentos
+    with stages.timed("troceado", "trozos") as st:
+        n_chunks = st.count = rebuild_chunks(con, chunk_size, chunk_overlap)
+    n_docs = con.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    print(f"Generando embeddings para {n_chunks} trozos...")
+
+    # 5-6. Embeddings por ventanas (en orden de id): solo se calculan los textos
+    #      nuevos o modificados. Todo se escribe en una generación nueva
+    #      (carpeta temporal hasta publicarla)
+    gen, tmp = new_generation(VECS_DIR)
+    cache = EmbeddingCache(EMB_CACHE_PATH)
+    try:
+        with stages.timed("embeddings", "trozos") as st:
+            rows, dim, hits, misses = embed_chunks(con, os.path.join(tmp, VECS_FILE), cache,
+                                                   concurrency=embed_concurrency)
+            st.count = rows
+    finally:
+        cache.close()
+        con.close()
 
-    os.makedirs(VECS_DIR, exist_ok=True)
-    embs = embed_texts(df["text"].tolist(), batch_size=64)
-    np.save(VECS_PATH, embs)
+    # 7. Filas e índice léxico (FTS5, BM25) de la generación
+    with stages.timed("FTS5", "trozos") as st:
+        n_fts = st.count = write_index_db(os.path.join(tmp, INDEX_DB_FILE))
+
+    # 8. Índice aproximado opcional (sobre los vectores ya escritos, con memmap)
+    nlist = None
+    if ann and rows:
+        with stages.timed("ANN", "vectores") as st:
+            nlist = build_ann(open_store(os.path.join(tmp, VECS_FILE)).matrix,
+                              os.path.join(tmp, ANN_FILE), nlist=ann_nlist)
+            st.count = rows
+
+    # 8b. Vectores cuantizados opcionales (int8 / binary) para la primera pasada de la API
+    for kind in quant if rows else ():
+        with stages.timed(f"quant {kind}", "vectores") as st:
+            store = open_store(os.path.join(tmp, VECS_FILE))
+            nbytes = write_quantized(store.matrix, store.ids, tmp, kind)
+            st.count = rows
+        print(f"   → Vectores {kind}: {nbytes / 2**20:.1f} MB "
+              f"(float32: {rows * dim * 4 / 2**20:.1f} MB)")
+
+    # 9. Publicar: la API (si está en marcha) la carga sola y cambia de índice sin reiniciar
+    publish_generation(VECS_DIR, gen, tmp, {
+        "rows": int(rows), "docs": int(n_docs), "dim": int(dim),
+        "emb_model": EMB_MODEL, "chunk_size": chunk_size, "chunk_overlap": chunk_overlap,
+        "ann_nlist": nlist, "quant": list(quant) if rows else [],
+    })
 
     print(f"Ingest completado.")
-    print(f"   → Documentos en BD: {len(df)}")
-    print(f"   → Embeddings guardados en: {VECS_PATH}")
+    print(f"   → Documentos en BD: {n_docs} ({rows} trozos, {n_fts} en FTS5)")
+    print(f"   → Caché de embeddings: {hits} aciertos, {misses} fallos ({EMB_CACHE_PATH})")
+    print(f"   → Generación publicada: {os.path.join(VECS_DIR, gen)}")
+    stages.report()
 
 
 if __name__ == "__main__":
@@ -208,6 +435,50 @@ if __name__ == "__main__":
         action="store_true",
         help="Borra la BD y los embeddings antes de reingestar."
     )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CHUNK_MAX_CHARS,
+        help="Tamaño máximo de cada trozo, en caracteres."
+    )
+    parser.add_argument(
+        "--chunk-overlap",
+        type=int,
+        default=CHUNK_OVERLAP,
+        help="Caracteres que se repiten entre trozos consecutivos."
+    )
+    parser.add_argument(
+        "--ann",
+        action="store_true",
+        help="Construye también un índice aproximado IVF (para corpus grandes)."
+    )
+    parser.add_argument(
+        "--ann-nlist",
+        type=int,
+        default=None,
+        help="Número de listas del IVF (por defecto ~4·sqrt(n))."
+    )
+    parser.add_argument(
+        "--embed-concurrency",
+        type=int,
+        default=EMBED_CONCURRENCY,
+        help="Peticiones de embeddings en paralelo (límites: EMBED_TPM, EMBED_RPM)."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Procesos para leer y normalizar las fuentes (1 = sin procesos). Por defecto "
+             "INGEST_WORKERS o, si no está fijado, uno por CPU a partir de INGEST_PARALLEL_MIN_MB de fuentes."
+    )
+    parser.add_argument(
+        "--quant",
+        nargs="+",
+        choices=QUANT_KINDS,
+        default=[],
+        help="Escribe también vectores cuantizados (int8, binary) para la API (VECS_QUANT; "
+             "si la generación tiene --ann, la API usa el ANN y no estos)."
+    )
     args = parser.parse_args()
 
     if args.reset:
@@ -217,4 +488,6 @@ if __name__ == "__main__":
             import shutil
             shutil.rmtree(VECS_DIR, ignore_errors=True)
 
-    main(reset_db=args.reset)
\ No newline at end of file
+    main(reset_db=args.reset, chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap,
+         ann=args.ann, ann_nlist=args.ann_nlist, embed_concurrency=args.embed_concurrency,
+         workers=args.workers, quant=args.quant)
\ No newline at end of file
@@ -0,0 +1,108 @@
+# interaction_log.py
+import queue
+import threading
+import time
+
+import db
+
+_STOP = object()
+
+_INSERT = ("INSERT INTO interactions(user_id,prompt,response,intent,topic,difficulty) "
+           "VALUES(?,?,?,?,?,?)")
+
+
+class InteractionLogger:
+    """
+    Registro de interacciones en segundo plano.
+    La petición solo mete el evento en una cola acotada (nunca espera); un hilo
+    escritor lo vuelca con un único executemany por lote, cada `interval`
+    segundos o al juntar `batch_size` eventos. Si la cola se llena, el evento
+    se descarta y se cuenta en `dropped`.
+    """
+
+    def __init__(self, path: str = db.DB_PATH, max_queue: int = 10000,
+                 batch_size: int = 200, interval: float = 1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self._q = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.flushed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="interaction-log", daemon=True)
+                self._thread.start()
+
+    def log(self, user_id, prompt, response, intent, topic, difficulty) -> bool:
+        """Encola una interacción. Devuelve False si se ha descartado (cola llena)."""
+        if self._thread is None:
+            self.start()
+        try:
+            self._q.put_nowait((user_id, prompt, response, intent, topic, difficulty))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def stop(self, timeout: float = 10.0):
+        """Vacía la cola (escribe lo pendiente) y para el hilo escritor."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._q.put(_STOP)
+        self._thread.join(timeout)
+        print(f"[LOG] Registro parado: {self.flushed} escritas, {self.dropped} descartadas")
+
+    def _run(self):
+        db.ensure_schema(self.path)
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            if stopping:
+                # Lo que quede detrás del aviso de parada también se escribe
+                while True:
+                    try:
+                        item = self._q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+            if batch:
+                self._flush(batch)
+        db.close_conns()
+
+    def _flush(self, batch):
+        try:
+            con = db.get_conn(self.path)
+            with con:
+                con.executemany(_INSERT, batch)
+            self.flushed += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.errors += 1
+            self.dropped += len(batch)
+            print("[LOG] Error escribiendo interacciones:", e)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._q.qsize(),
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "errors": self.errors,
+        }
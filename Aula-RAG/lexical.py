@@ -0,0 +1,155 @@
+# lexical.py
+"""
+Búsqueda léxica (palabras clave) con SQLite FTS5 y BM25.
+
+- La tabla FTS tiene una fila por cada fila del índice vectorial (trozos de
+  `chunks` con título/tema/curso de su documento, o `docs` en BD antiguas),
+  con el mismo id como rowid. La mantiene ingest.py (rebuild_fts); la app solo
+  la crea si falta o no cuadra con las filas actuales (ensure_fts).
+- Las preguntas se convierten en una consulta FTS: sin palabras vacías, cada
+  término entre comillas y los plurales como prefijo ("restas" → "resta"*).
+- LexicalIndex.search indica además si la búsqueda es "segura": cuando TODOS
+  los términos aparecen juntos en al menos las filas que se piden (típico de
+  preguntas con palabras clave, p. ej. "restas con llevadas 1º primaria").
+"""
+import re
+import sqlite3
+import threading
+import numpy as np
+
+import db
+
+FTS_TABLE = "search_fts"
+# Peso de cada columna en BM25: title, topic, grade, heading, text
+BM25_WEIGHTS = (2.0, 2.0, 1.0, 1.5, 1.0)
+
+_TOKEN = re.compile(r"\w+")
+_fork_epoch = 0        # cambia en cada fork: las conexiones de antes son del padre
+_STOPWORDS = {
+    "a", "al", "como", "con", "cual", "cuales", "cuando", "de", "del", "donde", "el", "en",
+    "es", "esta", "este", "esto", "hay", "la", "las", "le", "lo", "los", "me", "mi", "mas",
+    "muy", "no", "o", "para", "pero", "por", "puedo", "que", "se", "si", "sin", "son", "su",
+    "sus", "te", "tu", "un", "una", "unas", "uno", "unos", "y", "ya", "yo",
+    "cómo", "cuál", "cuáles", "cuándo", "dónde", "más", "qué", "sí", "tú",
+}
+
+
+@db.on_fork_child
+def _after_fork():
+    global _fork_epoch
+    _fork_epoch += 1
+
+
+def _source_sql(con) -> str:
+    """SELECT con las filas que se indexan (las mismas que carga app._load_docs)."""
+    has_chunks = con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='chunks'"
+    ).fetchone()
+    if has_chunks:
+        return ("SELECT c.id, d.title, d.topic, d.grade, c.heading, c.text "
+                "FROM chunks c JOIN docs d ON d.id = c.doc_id")
+    return "SELECT id, title, topic, grade, '', text FROM docs"
+
+
+def rebuild_fts(con) -> int:
+    """(Re)crea la tabla FTS a partir de chunks/docs. Devuelve el número de filas."""
+    with con:
+        con.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        con.execute(f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+            title, topic, grade, heading, text,
+            tokenize='unicode61 remove_diacritics 2')""")
+        con.execute(f"INSERT INTO {FTS_TABLE}(rowid, title, topic, grade, heading, text) "
+                    + _source_sql(con))
+    return con.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}").fetchone()[0]
+
+
+def ensure_fts(con) -> int:
+    """Crea la tabla FTS si falta o si no tiene las mismas filas que la fuente."""
+    exists = con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (FTS_TABLE,)
+    ).fetchone()
+    expected = con.execute(f"SELECT COUNT(*) FROM ({_source_sql(con)})").fetchone()[0]
+    if exists and con.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}").fetchone()[0] == expected:
+        return expected
+    n = rebuild_fts(con)
+    print(f"[LEXICAL] Índice FTS5 regenerado: {n} filas")
+    return n
+
+
+def query_terms(text: str) -> list[str]:
+    """Términos de búsqueda de una pregunta (sin palabras vacías ni repetidos)."""
+    terms = []
+    for tok in _TOKEN.findall((text or "").lower()):
+        if tok in _STOPWORDS or (len(tok) < 2 and not tok.isdigit()):
+            continue
+        if tok not in terms:
+            terms.append(tok)
+    return terms
+
+
+def fts_query(terms: list[str], op: str = "OR") -> str:
+    """Consulta FTS5: cada término entre comillas; los plurales, como prefijo."""
+    parts = []
+    for t in terms:
+        if len(t) > 4 and t.endswith("s"):
+            parts.append(f'"{t[:-1]}"*')
+        else:
+            parts.append(f'"{t}"')
+    return f" {op} ".join(parts)
+
+
+class LexicalIndex:
+    """
+    BM25 sobre la tabla FTS. Con `ids` (ids ordenados de las filas del índice
+    vectorial), search devuelve posiciones de fila en vez de rowid, para poder
+    mezclar los resultados con los de VectorIndex.
+    Cada hilo abre su propia conexión de lectura, que se cierra al desechar el
+    índice (p. ej. al cambiar de generación, ver index_snapshot.py). Tras un
+    fork, el hijo abre conexiones nuevas (ver db.py).
+    """
+
+    def __init__(self, path: str = db.DB_PATH, ids=None, weights=BM25_WEIGHTS):
+        self.path = path
+        self.ids = None if ids is None else np.asarray(ids)
+        self._rank = f"bm25({FTS_TABLE}, {', '.join(str(float(w)) for w in weights)})"
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None or self._local.epoch != _fork_epoch:
+            if con is not None:
+                db.keep_inherited(con)
+            con = self._local.con = sqlite3.connect(
+                self.path, timeout=db.BUSY_TIMEOUT_MS / 1000, cached_statements=64)
+            self._local.epoch = _fork_epoch
+        return con
+
+    def _query(self, match: str, k: int):
+        con = self._conn()
+        return con.execute(
+            f"SELECT rowid, {self._rank} AS score FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH ? ORDER BY score LIMIT ?",
+            (match, k),
+        ).fetchall()
+
+    def search(self, text: str, k: int, min_hits: int | None = None):
+        """
+        Devuelve (filas, puntuaciones, segura) con hasta k filas. Las puntuaciones
+        son -bm25 (mayor es mejor). `segura` = todos los términos aparecen juntos
+        en al menos `min_hits` filas (por defecto k).
+        """
+        terms = query_terms(text)
+        if not terms:
+            return [], [], False
+        hits = self._query(fts_query(terms, "AND"), k)
+        confident = len(hits) >= (min_hits or k)
+        if not confident:
+            hits = self._query(fts_query(terms, "OR"), k)
+        rows = [r for r, _ in hits]
+        scores = [-s for _, s in hits]
+        if self.ids is not None and rows:
+            pos = np.searchsorted(self.ids, rows)
+            ok = (pos < len(self.ids)) & (self.ids[np.minimum(pos, len(self.ids) - 1)] == rows)
+            rows = [int(p) for p, good in zip(pos, ok) if good]
+            scores = [s for s, good in zip(scores, ok) if good]
+        return rows, scores, confident
@@ -0,0 +1,145 @@
+# metrics.py
+"""
+Métricas del servicio en formato de texto de Prometheus (para /metrics).
+
+- timed("etapa"): mide la duración de una etapa del pipeline y la guarda en
+  el histograma aula_stage_seconds{stage="etapa"}.
+- Cada petición lleva un id (cabecera X-Request-Id) guardado en un ContextVar;
+  al acabar se imprime una línea con las etapas de esa petición.
+- register_gauges(fn): fn() devuelve una lista de (nombre, ayuda, {etiquetas}, valor)
+  y se evalúa al pedir /metrics (ratios de caché, etc.).
+"""
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Cubos en segundos: de 1 ms a 60 s
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_ID = contextvars.ContextVar("request_id", default=None)
+_STAGES = contextvars.ContextVar("stages", default=None)
+
+_lock = threading.Lock()
+
+
+def _esc(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_esc(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = {}           # etiquetas → [cuentas por cubo, suma, total]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            for key, (counts, total, n) in sorted(self._series.items()):
+                labels = dict(key)
+                for b, c in zip(self.buckets, counts):
+                    out.append(f"{self.name}_bucket{_labels({**labels, 'le': b})} {c}")
+                out.append(f"{self.name}_bucket{_labels({**labels, 'le': '+Inf'})} {n}")
+                out.append(f"{self.name}_sum{_labels(labels)} {total:.6f}")
+                out.append(f"{self.name}_count{_labels(labels)} {n}")
+        return out
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with _lock:
+            for key, v in sorted(self._values.items()):
+                out.append(f"{self.name}{_labels(dict(key))} {v}")
+        return out
+
+
+STAGE_SECONDS = Histogram("aula_stage_seconds", "Duración de cada etapa del pipeline RAG.")
+REQUEST_SECONDS = Histogram("aula_request_seconds", "Duración total de cada petición HTTP.")
+REQUESTS = Counter("aula_requests_total", "Peticiones HTTP atendidas.")
+ERRORS = Counter("aula_errors_total", "Errores por etapa o ruta.")
+RETRIEVALS = Counter("aula_retrieval_total", "Búsquedas de contexto por modo (hybrid, lexical, lexical_fallback, vector).")
+
+_gauge_fns = []
+
+
+def register_gauges(fn):
+    _gauge_fns.append(fn)
+    return fn
+
+
+@contextmanager
+def timed(stage: str):
+    """Mide la etapa; si lanza excepción, cuenta también un error de esa etapa."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(stage=stage)
+        raise
+    finally:
+        dt = time.perf_counter() - t0
+        STAGE_SECONDS.observe(dt, stage=stage)
+        stages = _STAGES.get()
+        if stages is not None:
+            stages.append((stage, dt))
+
+
+def start_request(request_id: str):
+    """Asocia un id y una lista de etapas vacía al contexto de la petición."""
+    REQUEST_ID.set(request_id)
+    _STAGES.set([])
+
+
+def request_stages() -> list:
+    return list(_STAGES.get() or [])
+
+
+def render() -> str:
+    lines = []
+    for m in (REQUESTS, ERRORS, RETRIEVALS, REQUEST_SECONDS, STAGE_SECONDS):
+        lines.extend(m.render())
+
+    gauges = {}                 # nombre → (ayuda, [(etiquetas, valor)])
+    for fn in _gauge_fns:
+        try:
+            for name, help, labels, value in fn():
+                gauges.setdefault(name, (help, []))[1].append((labels, value))
+        except Exception as e:
+            print("[METRICS] Error en gauges:", e)
+    for name, (help, series) in sorted(gauges.items()):
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in series:
+            lines.append(f"{name}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
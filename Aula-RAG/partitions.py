@@ -0,0 +1,61 @@
+# partitions.py
+import numpy as np
+
+
+class RowPartitions:
+    """
+    Particiones de las filas del índice por metadatos (tema, curso...).
+    Para cada columna y valor (normalizado) se guardan, al cargar el índice,
+    las posiciones de fila como int64 ordenado. Filtrar es intersecar unas
+    pocas listas y la búsqueda solo puntúa esas filas.
+    Las filas sin valor en una columna (p. ej. sin curso) entran en cualquier
+    filtro de esa columna: no se pierden por falta de metadatos.
+    """
+
+    def __init__(self, columns: dict, normalizers: dict | None = None):
+        self.normalizers = normalizers or {}
+        self.rows = 0
+        self._parts = {}             # columna → {valor: filas}
+        self._blank = {}             # columna → filas sin valor
+        for col, values in columns.items():
+            norm = self.normalizers.get(col, _default_norm)
+            keys = np.array([norm(v) for v in values], dtype=object)
+            self.rows = len(keys)
+            uniques, inverse = np.unique(keys.astype(str), return_inverse=True)
+            order = np.argsort(inverse, kind="stable").astype(np.int64)
+            bounds = np.concatenate([[0], np.cumsum(np.bincount(inverse, minlength=len(uniques)))])
+            parts = {str(u): order[bounds[i]:bounds[i + 1]] for i, u in enumerate(uniques)}
+            blank = parts.pop("", np.zeros(0, dtype=np.int64))
+            self._blank[col] = blank
+            self._parts[col] = {u: np.union1d(r, blank) for u, r in parts.items()}
+
+    @classmethod
+    def from_store(cls, store, columns, normalizers: dict | None = None):
+        """Particiones de las columnas `columns` de un DocStore."""
+        return cls({c: store.column(c) for c in columns}, normalizers)
+
+    def values(self, col: str) -> list[str]:
+        return sorted(self._parts.get(col, {}))
+
+    def select(self, **filters) -> np.ndarray | None:
+        """
+        Filas (ordenadas) que cumplen todos los filtros no vacíos, p. ej.
+        select(topic="restas", grade="1º"). None si no hay ningún filtro.
+        """
+        out = None
+        for col, value in filters.items():
+            if value is None or col not in self._parts:
+                continue
+            key = self.normalizers.get(col, _default_norm)(value)
+            if not key:
+                continue
+            rows = self._parts[col].get(key, self._blank[col])
+            out = rows if out is None else np.intersect1d(out, rows, assume_unique=True)
+        return out
+
+    def stats(self) -> dict:
+        return {col: {v: len(r) for v, r in parts.items()} for col, parts in self._parts.items()}
+
+
+def _default_norm(value) -> str:
+    return "" if value is None else str(value).strip().lower()
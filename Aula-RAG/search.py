@@ -0,0 +1,105 @@
+# search.py
+"""
+Núcleo de búsqueda por similitud coseno.
+
+Los vectores se normalizan una sola vez (en ingest o al cargar), así que
+la similitud coseno es un simple producto escalar: una multiplicación
+matriz·vector por pregunta, o matriz·matriz para un lote de preguntas.
+"""
+import numpy as np
+
+# Con un filtro de filas (partitions.py) de hasta este tamaño se puntúa el
+# subconjunto entero aunque haya índice ANN: es exacto y ya es barato.
+EXACT_SUBSET_MAX = 50000
+
+
+def normalize_rows(m) -> np.ndarray:
+    """Devuelve una copia float32 con cada fila de norma 1 (las filas nulas quedan a 0)."""
+    m = np.asarray(m, dtype=np.float32)
+    norms = np.linalg.norm(m, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (m / norms).astype(np.float32, copy=False)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Índices de los k mayores valores, ordenados de mayor a menor (O(n) con argpartition)."""
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < n:
+        part = np.argpartition(-scores, k - 1)[:k]
+    else:
+        part = np.arange(n)
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+class VectorIndex:
+    """
+    Búsqueda exacta por producto escalar sobre vectores normalizados.
+    Si la matriz ya viene normalizada (memmap escrito por ingest), no se copia.
+    Con `ann` (ann.IVFIndex) la búsqueda pasa a ser aproximada y solo se
+    puntúan las `nprobe` listas más cercanas.
+    Con `quant` (quant.QuantizedVectors) la primera pasada se hace sobre los
+    códigos int8/binarios y solo la lista corta se puntúa con la matriz.
+    `ann` y `quant` son excluyentes (el IVF ya solo lee unas pocas listas).
+    Con `rows` (filas ordenadas, p. ej. de un tema y curso) solo se puntúan esas.
+    """
+
+    def __init__(self, matrix, normalized: bool = False, ann=None, nprobe: int = 16, quant=None):
+        if ann is not None and quant is not None:
+            raise ValueError("VectorIndex: usa ann o quant, no los dos")
+        self.matrix = matrix if normalized else normalize_rows(matrix)
+        self.ann = ann
+        self.nprobe = nprobe
+        self.quant = quant
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def search(self, qv, k: int = 3, rows=None):
+        """Devuelve (filas, puntuaciones) de los k vectores más parecidos a qv."""
+        if self.ann is not None and (rows is None or len(rows) > EXACT_SUBSET_MAX):
+            return self.ann.search(self.matrix, qv, k, self.nprobe, rows=rows)
+        if self.quant is not None:
+            return self.quant.search(self.matrix, qv, k, rows=rows)
+        q = normalize_rows(np.asarray(qv).reshape(1, -1))[0]
+        if rows is not None:
+            scores = np.asarray(self.matrix[rows], dtype=np.float32) @ q
+            top = top_k(scores, k)
+            return rows[top], scores[top]
+        scores = self.matrix @ q
+        top = top_k(scores, k)
+        return top, scores[top]
+
+    def search_many(self, Q, k: int = 3, rows=None):
+        """Como search, pero para un lote de preguntas (una sola multiplicación de matrices)."""
+        Q = normalize_rows(np.atleast_2d(Q))
+        if self.ann is not None and (rows is None or len(rows) > EXACT_SUBSET_MAX):
+            return [self.ann.search(self.matrix, q, k, self.nprobe, rows=rows) for q in Q]
+        if self.quant is not None:
+            return [self.quant.search(self.matrix, q, k, rows=rows) for q in Q]
+        sub = self.matrix if rows is None else np.asarray(self.matrix[rows], dtype=np.float32)
+        scores = Q @ sub.T
+        out = []
+        for row in scores:
+            top = top_k(row, k)
+            out.append((top if rows is None else rows[top], row[top]))
+        return out
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60, limit: int | None = None):
+    """
+    Mezcla varias listas de filas ordenadas (p. ej. vectorial y BM25) con RRF:
+    cada fila suma 1 / (k + posición) en cada lista donde aparece.
+    Devuelve (filas, puntuaciones) de mayor a menor.
+    """
+    scores = {}
+    for ranking in rankings:
+        for pos, row in enumerate(ranking):
+            row = int(row)
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + pos + 1)
+    fused = sorted(scores.items(), key=lambda x: -x[1])
+    if limit is not None:
+        fused = fused[:limit]
+    return [r for r, _ in fused], [s for _, s in fused]
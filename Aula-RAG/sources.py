@@ -0,0 +1,187 @@
+# sources.py
+"""
+Lectura de las fuentes del ingest: data/temas/*.md y data/ejercicios/*.csv.
+
+Las fuentes se parten en tareas independientes: cada .md es una tarea y cada
+.csv se lee por bloques de unos INGEST_CSV_BLOCK_MB (cortados en un fin de
+línea que no esté dentro de comillas), con su cabecera delante. Con
+workers > 1 las tareas se reparten en un ProcessPoolExecutor y los
+resultados se entregan en el orden de las tareas: los ids de docs salen
+igual que leyendo en secuencia. Como mucho hay 2·workers tareas en vuelo,
+así que la memoria no depende del tamaño de las fuentes. Por defecto
+(default_workers) solo se reparte si las fuentes pasan de
+INGEST_PARALLEL_MIN_MB: con los temas y ejercicios de siempre, un proceso.
+
+Cada item lleva su clave de origen ("temas/x.md#0", "ejercicios/y.csv#41":
+archivo y número de registro dentro de él). ingest.py actualiza por esa
+clave, así que editar una lección cambia su fila en vez de añadir otra.
+
+Este módulo no importa openai ni la BD: es lo que cargan los procesos.
+"""
+import io
+import os
+import glob
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+TEMAS_DIR = os.path.join("data", "temas")
+EJERCICIOS_DIR = os.path.join("data", "ejercicios")
+CSV_BLOCK_BYTES = int(float(os.getenv("INGEST_CSV_BLOCK_MB", "8")) * 2**20)
+# 0 = automático (ver default_workers); 1 = sin procesos
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0"))
+INGEST_PARALLEL_MIN_BYTES = int(float(os.getenv("INGEST_PARALLEL_MIN_MB", "64")) * 2**20)
+
+
+def source_files():
+    """(archivos .md, archivos .csv), ordenados."""
+    return (sorted(glob.glob(os.path.join(TEMAS_DIR, "*.md"))),
+            sorted(glob.glob(os.path.join(EJERCICIOS_DIR, "*.csv"))))
+
+
+# ---------- TAREAS (se ejecutan en los procesos) ----------
+
+def parse_markdown(fp):
+    """Un .md de data/temas → [(kind, title, topic, grade, text)]."""
+    with open(fp, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    title = os.path.splitext(os.path.basename(fp))[0]
+    parts = title.split("_")
+    topic = parts[0] if parts else ""
+    grade = parts[-1] if len(parts) > 1 else ""
+    return [("teoria", title, topic, grade, text)]
+
+
+def parse_csv_block(header: bytes, data: bytes):
+    """Un bloque de líneas de un CSV de ejercicios (sin cabecera) → lista de items."""
+    # Por tu comentario, el CSV va con separador ;
+    # Todo como texto y las celdas vacías como "" (nada de NaN ni de 1.0 por 1)
+    part = pd.read_csv(io.BytesIO(header + data), sep=';', dtype=str, keep_default_na=False)
+    return list(exercise_items(part))
+
+
+def exercise_items(part):
+    """Items de un bloque del CSV de ejercicios (columnas topic, grade, enunciado, solucion)."""
+    part.columns = [c.strip().lower() for c in part.columns]
+    empty = pd.Series("", index=part.index)
+    topic = part["topic"] if "topic" in part else empty
+    grade = part["grade"] if "grade" in part else empty
+    enun = part["enunciado"] if "enunciado" in part else empty
+    sol = part["solucion"] if "solucion" in part else empty
+
+    title = ("Ejercicio: " + topic).str.strip()
+    text = "Enunciado: " + enun + "\nSolucion: " + sol
+    for t, tp, g, x in zip(title, topic, grade, text):
+        yield ("ejercicio", t, tp, g, x)
+
+
+# ---------- REPARTO EN TAREAS ----------
+
+def _cut(buf: bytes) -> int:
+    """Posición tras el último fin de línea de `buf` que no queda dentro de comillas (-1 si no hay)."""
+    end = buf.rfind(b"\n")
+    while end >= 0:
+        if buf.count(b'"', 0, end) % 2 == 0:
+            return end + 1
+        end = buf.rfind(b"\n", 0, end)
+    return -1
+
+
+def csv_blocks(fp, block_bytes: int = CSV_BLOCK_BYTES):
+    """Genera (cabecera, bloque) de un CSV: bloques de ~block_bytes que acaban en fin de registro."""
+    with open(fp, "rb") as f:
+        header = f.readline()
+        if header and not header.endswith(b"\n"):
+            header += b"\n"
+        rest = b""
+        while True:
+            data = f.read(block_bytes)
+            if not data:
+                break
+            buf = rest + data
+            cut = _cut(buf)
+            if cut <= 0:             # un registro más largo que el bloque: se sigue leyendo
+                rest = buf
+                continue
+            yield header, buf[:cut]
+            rest = buf[cut:]
+        if rest.strip():
+            yield header, rest
+
+
+def source_name(fp) -> str:
+    """Nombre del archivo relativo a data/ (parte de la clave de origen de sus items)."""
+    return os.path.relpath(fp, os.path.dirname(TEMAS_DIR)).replace(os.sep, "/")
+
+
+def source_tasks(block_bytes: int = CSV_BLOCK_BYTES):
+    """
+    Tareas (archivo, función, argumentos) en el orden de lectura: primero
+    los .md, luego los .csv.
+    """
+    md_files, csv_files = source_files()
+    if md_files:
+        print(f"Encontrados {len(md_files)} archivos .md en {TEMAS_DIR}/")
+    else:
+        print(f"No se han encontrado .md en {TEMAS_DIR}/")
+    for fp in md_files:
+        yield source_name(fp), parse_markdown, (fp,)
+
+    if csv_files:
+        print(f"Encontrados {len(csv_files)} archivos .csv en {EJERCICIOS_DIR}/")
+    else:
+        print(f"No se han encontrado .csv en {EJERCICIOS_DIR}/")
+    for fp in csv_files:
+        for header, data in csv_blocks(fp, block_bytes):
+            yield source_name(fp), parse_csv_block, (header, data)
+
+
+def iter_items(workers: int = 1, block_bytes: int = CSV_BLOCK_BYTES):
+    """
+    Todos los items de las fuentes, en orden determinista, como
+    (kind, title, topic, grade, text, clave de origen).
+    Con workers > 1 se procesan en paralelo (ver la cabecera del módulo).
+    """
+    seen = {}                       # archivo → registros ya entregados
+
+    def keyed(name, items):
+        start = seen.get(name, 0)
+        seen[name] = start + len(items)
+        return [item + (f"{name}#{start + i}",) for i, item in enumerate(items)]
+
+    tasks = source_tasks(block_bytes)
+    if workers <= 1:
+        for name, fn, args in tasks:
+            yield from keyed(name, fn(*args))
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window = deque()
+        for name, fn, args in tasks:
+            window.append((name, pool.submit(fn, *args)))
+            if len(window) >= 2 * workers:
+                name, fut = window.popleft()
+                yield from keyed(name, fut.result())
+        while window:
+            name, fut = window.popleft()
+            yield from keyed(name, fut.result())
+
+
+def default_workers(total_bytes: int | None = None) -> int:
+    """
+    Procesos para leer las fuentes: INGEST_WORKERS si está fijado; si no,
+    uno por CPU solo cuando las fuentes pasan de INGEST_PARALLEL_MIN_MB.
+    Con pocas fuentes, arrancar el pool cuesta más que leerlas en secuencia.
+    """
+    if INGEST_WORKERS > 0:
+        return INGEST_WORKERS
+    if total_bytes is None:
+        total_bytes = sources_bytes()
+    return (os.cpu_count() or 1) if total_bytes >= INGEST_PARALLEL_MIN_BYTES else 1
+
+
+def sources_bytes() -> int:
+    """Tamaño total de las fuentes (para el throughput de lectura)."""
+    md_files, csv_files = source_files()
+    return sum(os.path.getsize(fp) for fp in md_files + csv_files)
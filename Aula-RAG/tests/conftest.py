@@ -0,0 +1,6 @@
+# tests/conftest.py
+# Los módulos de Aula-RAG se importan por nombre (como hacen app.py y los bench)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
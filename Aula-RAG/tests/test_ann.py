@@ -0,0 +1,48 @@
+# tests/test_ann.py
+import numpy as np
+
+from ann import IVFIndex
+from search import VectorIndex, normalize_rows
+
+
+def _datos(n=3000, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((20, dim)).astype(np.float32)
+    m = centers[rng.integers(0, 20, size=n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    return normalize_rows(m), rng
+
+
+def test_todas_las_listas_igual_que_la_busqueda_exacta():
+    m, rng = _datos()
+    ivf = IVFIndex.build(m, nlist=40, iters=5)
+    assert ivf.rows == len(m)
+    assert sorted(ivf.order.tolist()) == list(range(len(m)))       # cada fila en una sola lista
+    exact = VectorIndex(m, normalized=True)
+    for q in rng.standard_normal((50, m.shape[1])).astype(np.float32):
+        ids, scores = ivf.search(m, q, k=5, nprobe=ivf.nlist)
+        ids_e, scores_e = exact.search(q, k=5)
+        assert ids.tolist() == ids_e.tolist()
+        np.testing.assert_allclose(scores, scores_e, rtol=1e-5, atol=1e-6)
+
+
+def test_con_filtro_de_filas():
+    m, rng = _datos(seed=1)
+    ivf = IVFIndex.build(m, nlist=30, iters=5)
+    exact = VectorIndex(m, normalized=True)
+    rows = np.sort(rng.choice(len(m), size=400, replace=False))
+    for q in rng.standard_normal((20, m.shape[1])).astype(np.float32):
+        ids, _ = ivf.search(m, q, k=5, nprobe=ivf.nlist, rows=rows)
+        assert set(ids.tolist()) <= set(rows.tolist())
+        assert ids.tolist() == exact.search(q, k=5, rows=rows)[0].tolist()
+
+
+def test_guardar_y_cargar(tmp_path):
+    m, _ = _datos(n=500)
+    ivf = IVFIndex.build(m, nlist=10, iters=3)
+    path = str(tmp_path / "ivf.npz")
+    ivf.save(path)
+    again = IVFIndex.load(path)
+    np.testing.assert_array_equal(again.order, ivf.order)
+    np.testing.assert_array_equal(again.offsets, ivf.offsets)
+    q = m[7]
+    assert again.search(m, q, k=3, nprobe=3)[0].tolist() == ivf.search(m, q, k=3, nprobe=3)[0].tolist()
@@ -0,0 +1,61 @@
+# tests/test_answer_cache.py
+import numpy as np
+
+from answer_cache import AnswerCache
+
+
+def _vec(seed, dim=16):
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+
+def test_exacta_normaliza_la_pregunta():
+    c = AnswerCache()
+    c.put("¿Cómo se hace una suma?", "sumas", "v1", "así")
+    assert c.get("  ¿cómo se hace una SUMA? ", "sumas", "v1") == "así"
+    assert c.get("¿Cómo se hace una suma?", "restas", "v1") is None
+    assert c.get("¿Cómo se hace una suma?", "sumas", "v2") is None
+
+
+def test_semantica_mismo_tema_y_numeros():
+    c = AnswerCache(threshold=0.95)
+    v = _vec(0)
+    c.put("¿cuánto es 27+46?", "sumas", "v1", "73", v)
+    casi = v + 0.01 * _vec(1)
+    assert c.get("cuanto da 27 + 46", "sumas", "v1", casi) == "73"
+    assert c.semantic_hits == 1
+    # Otros números, otro tema u otro vector: no vale la respuesta guardada
+    assert c.get("¿cuánto es 27+45?", "sumas", "v1", casi) is None
+    assert c.get("cuanto da 27 + 46", "restas", "v1", casi) is None
+    assert c.get("cuanto da 27 + 46", "sumas", "v1", _vec(2)) is None
+    assert c.get("cuanto da 27 + 46", "sumas", "v1") is None           # sin vector, solo exacta
+
+
+def test_expulsa_la_menos_usada():
+    c = AnswerCache(max_items=3)
+    vs = [_vec(i) for i in range(4)]
+    for i in range(3):
+        c.put(f"pregunta {'abc'[i]}", "t", "v", f"r{i}", vs[i])
+    assert c.get("otra a", "t", "v", vs[0]) == "r0"                    # la 0 pasa a ser reciente
+    c.put("pregunta d", "t", "v", "r3", vs[3])                         # expulsa la 1
+    assert c.stats()["semantic_items"] == 3
+    assert c.get("otra b", "t", "v", vs[1]) is None
+    for i in (0, 2, 3):
+        assert c.get(f"otra {'abcd'[i]}", "t", "v", vs[i]) == f"r{i}"
+    # El nivel exacto lleva su propio orden: un acierto semántico no lo refresca
+    assert c.get("pregunta a", "t", "v") is None
+    assert c.get("pregunta d", "t", "v") == "r3"
+
+
+def test_reemplazo_y_ttl(monkeypatch):
+    import answer_cache
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "monotonic", lambda: now[0])
+    c = AnswerCache(ttl=10)
+    v = _vec(0)
+    c.put("pregunta", "t", "v", "vieja", v)
+    c.put("pregunta", "t", "v", "nueva", v)
+    assert c.stats()["semantic_items"] == 1
+    assert c.get("parecida", "t", "v", v) == "nueva"
+    now[0] += 11
+    assert c.get("parecida", "t", "v", v) is None
+    assert c.stats()["semantic_items"] == 0
@@ -0,0 +1,71 @@
+# tests/test_chunking.py
+import random
+
+import pytest
+
+from chunking import split_markdown, _tail
+
+PALABRAS = ["suma", "resta", "llevando", "unidades", "decenas", "27", "+", "=", "x" * 150]
+
+
+def _texto(rng):
+    partes = []
+    for i in range(rng.randint(1, 4)):
+        partes.append("#" * rng.randint(1, 3) + f" Tema {i} " + rng.choice(PALABRAS))
+        for _ in range(rng.randint(1, 6)):
+            lineas = [" ".join(rng.choice(PALABRAS) for _ in range(rng.randint(1, 40)))
+                      for _ in range(rng.randint(1, 3))]
+            partes.append("\n".join(lineas))
+    return "\n\n".join(partes)
+
+
+def _cuerpos(chunks):
+    """Cuerpo de cada trozo (sin el encabezado que lleva delante), agrupado por encabezado."""
+    out = {}
+    for heading, text in chunks:
+        out.setdefault(heading, []).append(text[len(heading) + 1:] if heading else text)
+    return out
+
+
+@pytest.mark.parametrize("max_chars,overlap", [(60, 0), (100, 20), (200, 40), (600, 80)])
+def test_tamano_y_solape(max_chars, overlap):
+    rng = random.Random(max_chars)
+    for _ in range(300):
+        chunks = split_markdown(_texto(rng), max_chars, overlap)
+        assert chunks
+        for heading, cuerpos in _cuerpos(chunks).items():
+            budget = max(max_chars - len(heading) - 1, max_chars // 2)
+            assert all(0 < len(c) <= budget for c in cuerpos)
+            # cada trozo de una misma sección empieza con el final del anterior
+            for prev, cur in zip(cuerpos, cuerpos[1:]):
+                if overlap:
+                    assert cur.startswith(_tail(prev, min(overlap, budget // 2)) + "\n\n")
+
+
+def test_no_se_pierde_texto():
+    rng = random.Random(1)
+    for _ in range(200):
+        texto = _texto(rng)
+        chunks = split_markdown(texto, 200, 40)
+        palabras = set(" ".join(t for _, t in chunks).split())
+        assert {w for w in texto.split() if len(w) <= 50 and not w.startswith("#")} <= palabras
+
+
+def test_palabra_mas_larga_que_el_trozo():
+    chunks = split_markdown("x" * 1000, 100, 20)
+    assert len(chunks) > 1
+    assert all(len(t) <= 100 for _, t in chunks)
+    assert sum(len(t) for _, t in chunks) >= 1000
+
+
+def test_bloque_de_codigo_no_se_corta_por_almohadilla():
+    texto = "# Tema\n\n```\n# no es un encabezado\n1 + 1\n```\n\nFin"
+    chunks = split_markdown(texto, 600, 80)
+    assert [h for h, _ in chunks] == ["Tema"]
+    assert "# no es un encabezado" in chunks[0][1]
+
+
+def test_encabezados_anidados():
+    chunks = split_markdown("# A\ntexto a\n## B\ntexto b\n# C\ntexto c")
+    assert [h for h, _ in chunks] == ["A", "A > B", "C"]
+    assert chunks[1][1] == "A > B\ntexto b"
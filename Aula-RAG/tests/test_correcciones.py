@@ -0,0 +1,157 @@
+# tests/test_correcciones.py
+import random
+import re
+import unicodedata
+
+import pytest
+
+import correcciones
+from correcciones import Corrector
+
+
+# limpiar_texto_respuesta tal y como estaba en app.py antes de correcciones.json
+def _preserva_mayus(reemplazo, original):
+    return reemplazo.capitalize() if original and original[0].isupper() else reemplazo
+
+
+def limpiar_antiguo(texto):
+    if texto is None:
+        return texto
+    texto = unicodedata.normalize("NFC", texto)
+
+    def _rep_suma_resta(m):
+        op = m.group("op")
+        out = {
+            "suma": "suma llevando",
+            "sumas": "sumas llevando",
+            "resta": "resta llevando",
+            "restas": "restas llevando"
+        }.get(op.lower(), op)
+        return _preserva_mayus(out, op)
+
+    texto = re.sub(
+        r"\b(?P<op>suma|sumas|resta|restas)\s+con\s+(?:llamada|llamadas|llamado|llamados|llevada|llevadas)\b",
+        _rep_suma_resta, texto, flags=re.IGNORECASE)
+    texto = re.sub(
+        r"\b(?P<verbo>reiniciar|reinicias|reiniciamos|reinician|"
+        r"quitar|quitas|quitamos|quitan|"
+        r"eliminar|eliminas|eliminamos|eliminan|"
+        r"retirar|retiras|retiramos|retiran)\b"
+        r"([^.\n]{0,20}\d+[^.\n]{0,20})?",
+        lambda m: _preserva_mayus("restar", m.group("verbo")), texto, flags=re.IGNORECASE)
+    texto = re.sub(r"[ \t]{2,}", " ", texto)
+    texto = re.sub(r"[ \t]+\n", "\n", texto)
+    return texto
+
+
+PIEZAS = ["suma", "Sumas", "resta", "RESTAS", "con", "llevadas", "llamada", "llamados",
+          "eliminan", "Quitar", "retiramos", "reinicias", "27", "3", ".", "\n", " ", "  ",
+          "\t", "é", "é", "hola", "unidades", "x"]
+
+
+def corpus(n=3000, seed=0):
+    rng = random.Random(seed)
+    fijos = [
+        "eliminan Quitar 27 \t restas con llevadas eliminan 3",
+        "¡Muy bien! Vamos a hacer una suma con llevadas paso a paso.  Quitamos 5 de 12.\t\t\n",
+        "Sumas con llamadas   \ny restas con\nllevadas",
+        "",
+    ]
+    return fijos + [" ".join(rng.choice(PIEZAS) for _ in range(rng.randint(1, 30))) for _ in range(n)]
+
+
+def en_trozos(corrector, texto, rng):
+    inc = corrector.incremental()
+    out, i = [], 0
+    while i < len(texto):
+        n = rng.randint(1, 7)
+        out.append(inc.feed(texto[i:i + n]))
+        i += n
+    out.append(inc.flush())
+    return "".join(out)
+
+
+@pytest.fixture(scope="module")
+def corrector():
+    return Corrector.from_file()
+
+
+def test_igual_que_la_funcion_antigua(corrector):
+    for texto in corpus():
+        assert corrector.aplicar(texto) == limpiar_antiguo(texto), texto
+
+
+def test_con_criba_igual_que_la_funcion_antigua(corrector, monkeypatch):
+    # El camino de muchas reglas (pasada previa + zonas cambiadas) con las reglas reales
+    monkeypatch.setattr(correcciones, "CRIBA_MIN_REGLAS", 0)
+    for texto in corpus(seed=1):
+        assert corrector.aplicar(texto) == limpiar_antiguo(texto), texto
+
+
+def test_incremental_igual_que_de_una_vez(corrector):
+    rng = random.Random(2)
+    for texto in corpus(1000, seed=2):
+        assert en_trozos(corrector, texto, rng) == corrector.aplicar(texto), texto
+
+
+def test_none_y_vacio(corrector):
+    assert corrector.aplicar(None) is None
+    assert corrector.aplicar("") == ""
+    assert corrector.incremental().flush() == ""
+
+
+def test_reglas_encadenadas(monkeypatch):
+    # Cada regla crea lo que casa la siguiente; ".q" no tiene prefijo y se prueba siempre
+    reglas = [
+        {"patron": r"\bab\b", "reemplazo": "cd"},
+        {"patron": r"c(d)+", "reemplazo": "xyz"},
+        {"patron": r"yz\s+q", "reemplazo": "Q"},
+        {"patron": r".q", "reemplazo": "DOT"},
+        {"patron": r"Q\w", "reemplazo": "ab"},
+    ]
+    rng = random.Random(3)
+    textos = ["".join(rng.choice(["ab", " ", "cd", "d", "q", "Q", "x", "yz", "\n"])
+                      for _ in range(rng.randint(1, 30))) for _ in range(2000)]
+    esperado = []
+    for t in textos:
+        for r in reglas:
+            t = re.sub(r["patron"], r["reemplazo"], t, flags=re.IGNORECASE)
+        esperado.append(t)
+
+    for criba in (0, 8):
+        monkeypatch.setattr(correcciones, "CRIBA_MIN_REGLAS", criba)
+        c = Corrector(reglas, margen=16)
+        for t, e in zip(textos, esperado):
+            assert c.aplicar(t) == e, t
+            assert en_trozos(c, t, rng) == e, t
+
+
+def test_sin_analizador_interno(corrector, monkeypatch):
+    # Sin re._parser (API privada) las reglas se aplican con re.sub, una tras otra
+    monkeypatch.setattr(correcciones, "_sre_parse", None)
+    c = Corrector(corrector.reglas, margen=corrector.margen)
+    assert all(r.prefijos is None for r in c._reglas)
+    rng = random.Random(4)
+    for texto in corpus(500, seed=4):
+        assert c.aplicar(texto) == limpiar_antiguo(texto), texto
+        assert en_trozos(c, texto, rng) == limpiar_antiguo(texto), texto
+
+
+def test_si_el_analizador_falla(corrector, monkeypatch):
+    class Roto:
+        @staticmethod
+        def parse(*a, **k):
+            raise AttributeError("API interna distinta")
+
+    monkeypatch.setattr(correcciones, "_sre_parse", Roto)
+    c = Corrector(corrector.reglas, margen=corrector.margen)
+    assert all(r.prefijos is None for r in c._reglas)
+    texto = corpus()[0]
+    assert c.aplicar(texto) == limpiar_antiguo(texto)
+
+
+def test_regla_mal_escrita():
+    with pytest.raises(ValueError):
+        Corrector([{"patron": "(sin cerrar", "reemplazo": "x"}])
+    with pytest.raises(ValueError):
+        Corrector([{"patron": "abc"}])
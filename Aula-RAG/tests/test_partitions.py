@@ -0,0 +1,48 @@
+# tests/test_partitions.py
+import numpy as np
+
+from partitions import RowPartitions
+
+TOPICS = ["Sumas", "restas", "sumas ", "", "restas", "sumas", None]
+GRADES = ["1º", "2º", "", "1º", "1º", "2º", "1º"]
+
+
+def _brute(topic=None, grade=None):
+    """Filas que cumplen los filtros (las que no tienen valor entran en cualquiera)."""
+    norm = lambda v: "" if v is None else str(v).strip().lower()   # noqa: E731
+    ok = []
+    for i, (t, g) in enumerate(zip(TOPICS, GRADES)):
+        if topic and norm(t) not in ("", norm(topic)):
+            continue
+        if grade and norm(g) not in ("", norm(grade)):
+            continue
+        ok.append(i)
+    return ok
+
+
+def test_select_igual_que_filtrar_fila_a_fila():
+    p = RowPartitions({"topic": TOPICS, "grade": GRADES})
+    assert p.rows == len(TOPICS)
+    assert p.values("topic") == ["restas", "sumas"]
+    for topic in (None, "sumas", "RESTAS", "fracciones"):
+        for grade in (None, "1º", "2º", "3º"):
+            got = p.select(topic=topic, grade=grade)
+            if topic is None and grade is None:
+                assert got is None
+                continue
+            assert got.dtype == np.int64
+            assert got.tolist() == _brute(topic, grade), (topic, grade)
+
+
+def test_filtros_vacios_o_desconocidos():
+    p = RowPartitions({"topic": TOPICS})
+    assert p.select() is None
+    assert p.select(topic="") is None
+    assert p.select(curso="1º") is None                   # columna que no existe: se ignora
+    assert p.select(topic="fracciones").tolist() == [3, 6]  # solo las filas sin tema
+
+
+def test_normalizador_por_columna():
+    p = RowPartitions({"topic": ["suma", "sumas", "resta"]},
+                      normalizers={"topic": lambda v: str(v).strip().lower().rstrip("s")})
+    assert p.select(topic="Sumas").tolist() == [0, 1]
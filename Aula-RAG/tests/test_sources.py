@@ -0,0 +1,61 @@
+# tests/test_sources.py
+import pytest
+
+import sources
+from sources import _cut, csv_blocks, parse_csv_block
+
+HEADER = "topic;grade;enunciado;solucion\n"
+FILAS = [
+    'sumas;1º;"Suma:\n27 + 46";73\n',
+    'restas;2º;"Quita 5; luego 3";"Queda ""2"""\n',
+    'problemas;;"Ana tiene 3 cromos\ny le dan 4.\n¿Cuántos tiene?";7\n',
+    'sumas;1º;Sin comillas;10\n',
+] * 25
+
+
+def _items(blocks):
+    return [item for header, data in blocks for item in parse_csv_block(header, data)]
+
+
+def test_cut_no_corta_dentro_de_comillas():
+    assert _cut(b'a;"b\nc";d\ne') == len(b'a;"b\nc";d\n')
+    assert _cut(b'a;"b\nc') == -1
+    assert _cut(b"sin fin de linea") == -1
+
+
+@pytest.mark.parametrize("block_bytes", [1, 7, 64, 1000, 1 << 20])
+def test_bloques_igual_que_el_archivo_entero(tmp_path, block_bytes):
+    fp = tmp_path / "ej.csv"
+    fp.write_bytes((HEADER + "".join(FILAS)).encode("utf-8"))
+    blocks = list(csv_blocks(str(fp), block_bytes))
+
+    for header, data in blocks:
+        assert header == HEADER.encode()
+        assert data.count(b'"') % 2 == 0          # ningún bloque parte un campo entre comillas
+    assert _items(blocks) == _items(list(csv_blocks(str(fp), 1 << 30)))
+    assert len(_items(blocks)) == len(FILAS)
+    assert _items(blocks)[0][4] == "Enunciado: Suma:\n27 + 46\nSolucion: 73"
+    assert _items(blocks)[1][4] == 'Enunciado: Quita 5; luego 3\nSolucion: Queda "2"'
+
+
+def test_bom_y_sin_salto_final(tmp_path):
+    fp = tmp_path / "ej.csv"
+    fp.write_bytes(b"\xef\xbb\xbf" + (HEADER + "".join(FILAS[:3])).encode("utf-8").rstrip(b"\n"))
+    items = _items(csv_blocks(str(fp), 16))
+    assert [i[2] for i in items] == ["sumas", "restas", "problemas"]     # columna topic con BOM
+    assert items[2][3] == ""                                            # celda vacía, no NaN
+    assert items[2][4].endswith("Solucion: 7")
+
+
+def test_claves_de_origen_por_archivo(tmp_path, monkeypatch):
+    temas, ejercicios = tmp_path / "temas", tmp_path / "ejercicios"
+    temas.mkdir()
+    ejercicios.mkdir()
+    (temas / "sumas_1.md").write_text("# Sumas\nTexto", encoding="utf-8")
+    (ejercicios / "ej.csv").write_text(HEADER + "".join(FILAS[:6]), encoding="utf-8")
+    monkeypatch.setattr(sources, "TEMAS_DIR", str(temas))
+    monkeypatch.setattr(sources, "EJERCICIOS_DIR", str(ejercicios))
+
+    items = list(sources.iter_items(workers=1, block_bytes=32))
+    assert [i[5] for i in items] == ["temas/sumas_1.md#0"] + [f"ejercicios/ej.csv#{i}" for i in range(6)]
+    assert items[0][:4] == ("teoria", "sumas_1", "sumas", "1")
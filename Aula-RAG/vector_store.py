@@ -0,0 +1,149 @@
+# vector_store.py
+"""
+Almacén de vectores en disco, pensado para abrirse con np.memmap.
+
+Formato (little-endian):
+  [cabecera de 64 bytes]  magic, versión, dim, dtype, flags, filas,
+                          offset de la matriz, offset de los ids
+  [matriz filas x dim]    contigua, alineada a 64 bytes
+  [ids int64 x filas]     id de docs/chunks de cada fila (mapeo fila → id)
+
+Abrirlo no copia nada: la matriz vive en la caché de páginas del sistema
+operativo y la comparten todos los procesos (workers) que abren el archivo.
+Los ids van al final para poder escribir la matriz en streaming.
+"""
+import os
+import shutil
+import struct
+import numpy as np
+
+MAGIC = b"AULAVEC1"
+VERSION = 1
+_HEADER = struct.Struct("<8sIIIIQQQ")     # 48 bytes, se rellena hasta 64
+HEADER_SIZE = 64
+_ALIGN = 64
+
+FLAG_NORMALIZED = 1                      # filas con norma 1 (coseno = producto escalar)
+FLAG_PACKED_BITS = 2                     # signos empaquetados, 8 por byte (quant.py, binary)
+
+_DTYPES = {0: np.float32, 1: np.float16, 2: np.int8, 3: np.uint8}
+_DTYPE_CODES = {np.dtype(v): k for k, v in _DTYPES.items()}
+
+
+def _align(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class VectorStore:
+    """Vista de solo lectura sobre un archivo de vectores."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            raw = f.read(HEADER_SIZE)
+        if len(raw) < HEADER_SIZE:
+            raise ValueError(f"Archivo de vectores incompleto: {path}")
+        magic, version, dim, dtype_code, flags, rows, data_off, ids_off = \
+            _HEADER.unpack(raw[:_HEADER.size])
+        if magic != MAGIC:
+            raise ValueError(f"No es un archivo de vectores válido: {path}")
+        if version != VERSION:
+            raise ValueError(f"Versión de archivo no soportada ({version}): {path}")
+
+        self.path = path
+        self.dim = dim
+        self.dtype = np.dtype(_DTYPES[dtype_code])
+        self.flags = flags
+        self.rows = rows
+        if rows:
+            self.matrix = np.memmap(path, dtype=self.dtype, mode="r",
+                                    offset=data_off, shape=(rows, dim))
+            self.ids = np.memmap(path, dtype=np.int64, mode="r",
+                                 offset=ids_off, shape=(rows,))
+        else:
+            self.matrix = np.zeros((0, dim), dtype=self.dtype)
+            self.ids = np.zeros(0, dtype=np.int64)
+
+    @property
+    def normalized(self) -> bool:
+        return bool(self.flags & FLAG_NORMALIZED)
+
+    def __len__(self):
+        return self.rows
+
+
+class VectorStoreWriter:
+    """
+    Escribe un archivo de vectores fila a fila (append) en un temporal y lo
+    publica con os.replace al cerrar, así nadie lee nunca un archivo a medias.
+    Los ids se van guardando en otro temporal y se copian al final: la memoria
+    no crece con el número de filas.
+    """
+
+    def __init__(self, path: str, dim: int, dtype=np.float32, flags: int = 0):
+        self.path = path
+        self.tmp = f"{path}.tmp"
+        self.dim = int(dim)
+        self.dtype = np.dtype(dtype)
+        self.flags = flags
+        self.rows = 0
+        self._data_off = _align(HEADER_SIZE)
+        self._f = open(self.tmp, "wb")
+        self._f.write(b"\0" * self._data_off)
+        self._ids_tmp = f"{path}.ids.tmp"
+        self._ids_f = open(self._ids_tmp, "wb")
+
+    def append(self, ids, vecs):
+        vecs = np.ascontiguousarray(vecs, dtype=self.dtype)
+        if vecs.ndim != 2 or vecs.shape[1] != self.dim:
+            raise ValueError(f"Se esperaban vectores (n, {self.dim}), llegan {vecs.shape}")
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) != len(vecs):
+            raise ValueError("ids y vectores deben tener la misma longitud")
+        self._f.write(vecs.tobytes())
+        self._ids_f.write(ids.tobytes())
+        self.rows += len(vecs)
+
+    def close(self):
+        ids_off = _align(self._data_off + self.rows * self.dim * self.dtype.itemsize)
+        self._f.write(b"\0" * (ids_off - self._f.tell()))
+        self._ids_f.close()
+        with open(self._ids_tmp, "rb") as ids_f:
+            shutil.copyfileobj(ids_f, self._f, 1 << 20)
+        os.remove(self._ids_tmp)
+        header = _HEADER.pack(MAGIC, VERSION, self.dim, _DTYPE_CODES[self.dtype],
+                              self.flags, self.rows, self._data_off, ids_off)
+        self._f.seek(0)
+        self._f.write(header.ljust(HEADER_SIZE, b"\0"))
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        os.replace(self.tmp, self.path)
+
+    def abort(self):
+        self._f.close()
+        self._ids_f.close()
+        for p in (self.tmp, self._ids_tmp):
+            if os.path.exists(p):
+                os.remove(p)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_store(path: str, ids, matrix, flags: int = 0):
+    """Guarda de una vez una matriz (n, d) con sus ids."""
+    matrix = np.asarray(matrix)
+    dim = matrix.shape[1] if matrix.ndim == 2 else 0
+    with VectorStoreWriter(path, dim, matrix.dtype if matrix.size else np.float32, flags) as w:
+        if len(matrix):
+            w.append(ids, matrix)
+
+
+def open_store(path: str) -> VectorStore:
+    return VectorStore(path)
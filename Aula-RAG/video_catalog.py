@@ -0,0 +1,135 @@
+# video_catalog.py
+import os
+import time
+import threading
+
+NGRAM = 3
+
+
+def _grams(s: str, n: int = NGRAM) -> set[str]:
+    """Todos los fragmentos de 1..n caracteres de s."""
+    return {s[i:i + k] for k in range(1, n + 1) for i in range(len(s) - k + 1)}
+
+
+class VideoCatalog:
+    """
+    Catálogo en memoria de la carpeta de vídeos.
+    - Se construye una vez (listado + stat de cada archivo) y guarda, por vídeo,
+      el nombre normalizado, la fecha de modificación y la ruta.
+    - Índice invertido de n-gramas de caracteres del nombre normalizado: buscar
+      qué nombres CONTIENEN un texto (misma semántica que `texto in nombre`)
+      solo mira los vídeos que comparten sus n-gramas, no toda la carpeta.
+    - Si cambia la fecha de modificación de la carpeta (altas o bajas), se
+      actualiza de forma incremental: solo se hace stat de los archivos nuevos.
+      La carpeta se comprueba como mucho cada `check_interval` segundos.
+    """
+
+    def __init__(self, directory: str, exts, norm, check_interval: float = 2.0):
+        self.dir = directory
+        self.exts = tuple(e.lower() for e in exts)
+        self.norm = norm
+        self.check_interval = check_interval
+        self._entries = {}           # archivo → (nombre normalizado, mtime, ruta)
+        self._index = {}             # n-grama → {archivo}
+        self._dir_mtime = None
+        self._newest = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.exists = False
+        self.refresh(force=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Sincroniza con la carpeta si ha cambiado. Devuelve True si se ha actualizado."""
+        now = time.monotonic()
+        if not force and now - self._checked < self.check_interval:
+            return False
+        with self._lock:
+            self._checked = now
+            try:
+                dir_mtime = os.stat(self.dir).st_mtime
+            except OSError:
+                self.exists = False
+                self._entries.clear()
+                self._index.clear()
+                self._dir_mtime = None
+                self._newest = None
+                return False
+            self.exists = True
+            if not force and dir_mtime == self._dir_mtime:
+                return False
+
+            try:
+                names = set(os.listdir(self.dir))
+            except OSError as e:
+                print("[VIDEO] No se pudo listar carpeta:", e)
+                return False
+
+            removed = [f for f in self._entries if f not in names]
+            for f in removed:
+                self._remove(f)
+            added = 0
+            for f in names - self._entries.keys():
+                name_no_ext, ext = os.path.splitext(f)
+                if ext.lower() not in self.exts:
+                    continue
+                path = os.path.join(self.dir, f)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if not os.path.isfile(path):
+                    continue
+                self._add(f, self.norm(name_no_ext), st.st_mtime, path)
+                added += 1
+            self._dir_mtime = dir_mtime
+            self._newest = None
+        print(f"[VIDEO] Catálogo: {len(self._entries)} vídeos (+{added} -{len(removed)})")
+        return True
+
+    def _add(self, f, name_norm, mtime, path):
+        self._entries[f] = (name_norm, mtime, path)
+        for g in _grams(name_norm):
+            self._index.setdefault(g, set()).add(f)
+
+    def _remove(self, f):
+        name_norm = self._entries.pop(f)[0]
+        for g in _grams(name_norm):
+            s = self._index.get(g)
+            if s is not None:
+                s.discard(f)
+                if not s:
+                    del self._index[g]
+
+    def _containing(self, text: str) -> set[str]:
+        """Archivos cuyo nombre normalizado contiene `text`."""
+        if len(text) <= NGRAM:
+            return set(self._index.get(text, ()))
+        grams = sorted((text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)),
+                       key=lambda g: len(self._index.get(g, ())))
+        found = set(self._index.get(grams[0], ()))
+        for g in grams[1:]:
+            if not found:
+                break
+            found &= self._index.get(g, set())
+        # los n-gramas no garantizan el orden: se confirma con la subcadena
+        return {f for f in found if text in self._entries[f][0]}
+
+    def matches(self, texts) -> dict[str, tuple[str, float, str]]:
+        """Vídeos cuyo nombre contiene alguno de `texts`: archivo → (nombre, mtime, ruta)."""
+        self.refresh()
+        with self._lock:
+            found = set()
+            for t in texts:
+                if t:
+                    found |= self._containing(t)
+            return {f: self._entries[f] for f in found}
+
+    def newest(self) -> tuple[str, float, str] | None:
+        """El vídeo más reciente (el que gana cuando ningún nombre coincide)."""
+        with self._lock:
+            if self._newest is None and self._entries:
+                self._newest = max(self._entries.values(), key=lambda e: e[1])
+            return self._newest